@@ -0,0 +1,206 @@
+"""Local JSON API for the dashboard's aggregates and forecasts (no Streamlit needed)
+
+    python api.py --port 8502
+
+Endpoints (GET):
+    /health
+    /parks?year=2566&month=มกราคม        ค่าเฉลี่ย/สูงสุด/ต่ำสุด/วันเกินมาตรฐาน แยกตามสวน
+    /exceedance?location=...&year=...     วันเกินมาตรฐานแยกตามเดือน
+    /forecast?location=...                ประสิทธิภาพโมเดลและการพยากรณ์ 4 ปี
+    /forecast/parks?model=...             การพยากรณ์รายสวน (ค่าเริ่มต้น: โมเดลที่ดีที่สุด)
+    /metrics                              ตัวชี้วัดของโปรเซสในรูปแบบ Prometheus
+
+ทุก response มี ETag และรองรับ If-None-Match (ตอบ 304 เมื่อข้อมูลไม่เปลี่ยน)
+"""
+import argparse
+import hashlib
+import json
+import math
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from forecasting import MODEL_NAMES, get_forecast, get_park_forecasts
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from metrics import render as render_metrics
+from park_data import DATA_PATH, MONTH_ORDER, filter_park_data, load_processed_data, location_summary
+from shared_cache import get_shared_cache
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _to_json(value):
+    """Convert numpy/pandas values into plain JSON-compatible Python values"""
+    if isinstance(value, pd.DataFrame):
+        return [{k: _to_json(v) for k, v in row.items()} for row in value.to_dict(orient="records")]
+    if isinstance(value, np.ndarray):
+        return [_to_json(v) for v in value.tolist()]
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if math.isnan(value) else float(value)
+    return value
+
+
+def _param(query, name, default='ทั้งหมด'):
+    return query.get(name, [default])[0]
+
+
+def _check_location(df, location):
+    if location != 'ทั้งหมด' and location not in set(df['สถานที่']):
+        raise ApiError(404, f"ไม่พบสถานที่: {location}")
+
+
+def handle_parks(df, version, query):
+    year, month = _param(query, "year"), _param(query, "month")
+    if month != 'ทั้งหมด' and month not in MONTH_ORDER:
+        raise ApiError(400, f"เดือนไม่ถูกต้อง: {month}")
+    filtered = filter_park_data(df, 'ทั้งหมด', year, month)
+    summary = location_summary(filtered, version, ('ทั้งหมด', year, month))
+    return {"year": year, "month": month, "parks": _to_json(summary)}
+
+
+def handle_exceedance(df, version, query):
+    location, year = _param(query, "location"), _param(query, "year")
+    _check_location(df, location)
+    filtered = filter_park_data(df, location, year, 'ทั้งหมด')
+    by_month = filtered.groupby('เดือน', observed=True)['จำนวนวันเกินมาตรฐาน'].sum()
+    by_month = by_month.reindex(MONTH_ORDER).dropna().reset_index()
+    return {
+        "location": location,
+        "year": year,
+        "total": _to_json(filtered['จำนวนวันเกินมาตรฐาน'].sum()),
+        "months": _to_json(by_month),
+    }
+
+
+def handle_forecast(df, version, query):
+    location = _param(query, "location")
+    _check_location(df, location)
+    forecast = get_forecast(df, version, location)
+    return {
+        "location": location,
+        "best_model": forecast["best_model"],
+        "metrics": _to_json(forecast["results"]),
+        "years": _to_json(forecast["future_years"]),
+        "forecasts": {name: _to_json(preds) for name, preds in forecast["future_preds"].items()},
+    }
+
+
+def handle_park_forecasts(df, version, query):
+    forecast = get_forecast(df, version)
+    model = _param(query, "model", forecast["best_model"])
+    if model not in MODEL_NAMES:
+        raise ApiError(400, f"โมเดลไม่ถูกต้อง: {model}")
+    table = get_park_forecasts(df, version, model, forecast["future_years"])
+    return {"model": model, "years": _to_json(forecast["future_years"]), "parks": _to_json(table)}
+
+
+ROUTES = {
+    "/parks": handle_parks,
+    "/exceedance": handle_exceedance,
+    "/forecast": handle_forecast,
+    "/forecast/parks": handle_park_forecasts,
+}
+
+
+def render(path, query, data_path=DATA_PATH):
+    """Return (status, etag, body bytes) for a request, cached per dataset version"""
+    if path == "/health":
+        body = json.dumps({"status": "ok", "cache": get_shared_cache().stats()}).encode("utf-8")
+        return 200, None, body
+    handler = ROUTES.get(path)
+    if handler is None:
+        raise ApiError(404, f"ไม่พบ endpoint: {path}")
+
+    df, version = load_processed_data(data_path)
+    key = ("api", version, path, tuple(sorted((k, tuple(v)) for k, v in query.items())))
+
+    def compute():
+        payload = handler(df, version, query)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return {"etag": '"' + hashlib.sha1(body).hexdigest() + '"', "body": body}
+
+    response = get_shared_cache().get_or_compute(key, compute)
+    return 200, response["etag"], response["body"]
+
+
+def _etag_matches(etag, header):
+    """If-None-Match comparison: comma-separated tags, weak (W/) prefix ignored, * matches anything"""
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    data_path = DATA_PATH
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.rstrip("/") == "/metrics":
+            return self._send(200, render_metrics().encode("utf-8"), content_type=METRICS_CONTENT_TYPE)
+        try:
+            status, etag, body = render(url.path.rstrip("/") or "/", query, self.data_path)
+        except ApiError as e:
+            return self._send(e.status, json.dumps({"error": e.message}, ensure_ascii=False).encode("utf-8"))
+        except ValueError as e:
+            return self._send(400, json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8"))
+        except FileNotFoundError:
+            return self._send(503, json.dumps({"error": "ไม่พบไฟล์ข้อมูล"}, ensure_ascii=False).encode("utf-8"))
+
+        if etag is not None and _etag_matches(etag, self.headers.get("If-None-Match", "")):
+            return self._send(304, b"", etag)
+        self._send(status, body, etag)
+
+    def _send(self, status, body, etag=None, content_type="application/json; charset=utf-8"):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local JSON API for PM2.5 aggregates and forecasts")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--data", default=DATA_PATH, help="path ของ AllParkYear.csv")
+    parser.add_argument("--prewarm", action="store_true", help="คำนวณชุดข้อมูล ตารางสรุป และโมเดลไว้ก่อนเปิดรับ request")
+    args = parser.parse_args(argv)
+
+    if args.prewarm:
+        # import ตอนใช้: prewarm ดึงโมดูลของแดชบอร์ดทั้งหมด
+        from prewarm import prewarm
+        print("prewarm:")
+        prewarm(args.data, root=None)
+
+    ApiHandler.data_path = args.data
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    print(f"PM2.5 API: http://{args.host}:{args.port}/parks")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
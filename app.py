@@ -6,15 +6,24 @@ import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
 import pydeck as pdk
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.svm import SVR
-from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
 
 
-from park_coordinates import PARK_COORDINATES, create_map_data
+from park_coordinates import PARK_COORDINATES
+from park_data import (DATA_PATH, MONTH_ORDER, MONTHS_THAI, filter_park_data, filter_period, get_quality_report,
+                       load_processed_data, location_summary, period_key, period_label, yearly_means)
+from forecasting import (HOLDOUT_MONTHS, MODEL_NAMES, MONTHLY_MODEL_NAMES, get_forecast, get_monthly_forecast,
+                         get_park_forecasts, monthly_series)
+from partitioned_data import list_partitions, load_partitioned_data, partition_locations, prune_partitions
+from sql_engine import EXAMPLE_QUERIES, MAX_ROWS, QueryError, run_query
+from sql_engine import available as sql_available
+from shared_cache import get_shared_cache
+from metrics import start_exporter, timed
+from figures import box_figure, line_figure, log_payload, scatter_figure, similarity_heatmap
+from map_layers import (DENSE_THRESHOLD, MAP_MODES, RISK_LABELS, cluster_deck, forecast_layer,
+                        get_forecast_map_table, get_station_index, risk_codes, station_deck, station_values)
+from park_similarity import MIN_MONTHS, SIMILARITY_METRICS, get_clusters, get_similarity
+from park_trends import MIN_TREND_MONTHS, ROLLING_WINDOWS, get_trends, trend_frame
+from exceedance_sim import DAILY_STANDARD, annual_exceed_probability, get_exceedance_simulation
 
 st.set_page_config(
     page_title="Park PM2.5 in BKK Dashboard",
@@ -24,64 +33,132 @@ st.set_page_config(
 )
 
 def main():
+    # export metrics ตาม PM25_METRICS_PORT / PM25_METRICS_TEXTFILE (เริ่มครั้งเดียวต่อโปรเซส)
+    start_exporter()
+
+    pages = {
+        "รายงานวิเคราะห์": show_park_report,
+        "การพยากรณ์ 4 ปีข้างหน้า": show_forecast_page,
+        "คิวรี SQL": show_sql_page,
+    }
     st.sidebar.title("เมนูหลัก")
-    page = st.sidebar.radio("เลือกหน้า", ["รายงานวิเคราะห์", "การพยากรณ์ 4 ปีข้างหน้า"])
+    page = st.sidebar.radio("เลือกหน้า", list(pages))
 
-    if page == "รายงานวิเคราะห์":
-        show_park_report()
-    elif page == "การพยากรณ์ 4 ปีข้างหน้า":
-        show_forecast_page()
+    # เวลา rerun ต่อหน้า (histogram pm25_rerun_seconds ใน metrics)
+    with timed("pm25_rerun_seconds", page=pages[page].__name__):
+        pages[page]()
 
-def show_park_report():
-    st.header("รายงานการวิเคราะห์ PM2.5 สวนสาธารณะกรุงเทพฯ")
-    st.markdown("รายงานค่า PM2.5 ของสวนสาธารณะต่างๆ ในกรุงเทพมหานคร พร้อมระบบกรองข้อมูลตามสถานที่และเวลา")
+    show_cache_status()
+
+def show_cache_status():
+    """Display shared cache counters in the sidebar"""
+    stats = get_shared_cache().stats()
+    with st.sidebar.expander("สถานะแคช"):
+        st.caption(
+            f"ใช้ {stats['used_mb']:.1f}/{stats['budget_mb']:.0f} MB · {stats['entries']} รายการ\n\n"
+            f"hit {stats['hits']} · miss {stats['misses']} · evict {stats['evictions']} "
+            f"(hit ratio {stats['hit_ratio']:.0%})"
+        )
+
+def show_chart(fig, name):
+    """Render a Plotly figure, logging its payload size"""
+    st.plotly_chart(log_payload(fig, name), use_container_width=True)
+
+def load_park_data(partitions=None, city='ทั้งหมด', year='ทั้งหมด'):
+    """Load the shared processed dataset, showing errors in the page
     
-    # Load AllParkYear.csv
+    เมื่อมีข้อมูลแบบ partition จะอ่านเฉพาะเมือง/ปีที่เลือก มิฉะนั้นใช้ AllParkYear.csv ทั้งไฟล์
+    """
     try:
-        df = pd.read_csv("Group_file/AllParkYear.csv")
+        if partitions is not None and not partitions.empty:
+            return load_partitioned_data(city, year)
+        return load_processed_data(DATA_PATH)
     except FileNotFoundError:
         st.error("ไม่พบไฟล์ AllParkYear.csv ในโฟลเดอร์ Group_file")
-        return
+    except Exception as e:
+        st.error(f"Error processing data: {str(e)}")
+    return None, None
+
+def show_park_report():
+    st.header("รายงานการวิเคราะห์ PM2.5 สวนสาธารณะกรุงเทพฯ")
+    st.markdown("รายงานค่า PM2.5 ของสวนสาธารณะต่างๆ ในกรุงเทพมหานคร พร้อมระบบกรองข้อมูลตามสถานที่และเวลา")
     
-    # Data preprocessing
-    df_processed = preprocess_park_data(df)
+    # Filters in sidebar
+    st.sidebar.header("Filter")
     
-    if df_processed.empty:
+    partitions = list_partitions()
+    if partitions.empty:
+        # Load AllParkYear.csv (processed once per process, shared by all sessions)
+        df_processed, version = load_park_data()
+        if df_processed is None:
+            return
+        years = sorted(df_processed['ปี'].unique().tolist())
+        locations = sorted(df_processed['สถานที่'].unique().tolist())
+    else:
+        # City filter: อยู่นอกฟอร์มเพราะเป็นตัวกำหนดตัวเลือกช่วงเวลาและสถานที่
+        available_cities = sorted(partitions['city'].unique().tolist())
+        selected_city = st.sidebar.selectbox(
+            "เลือกเมือง/จังหวัด",
+            available_cities
+        )
+        city_partitions = prune_partitions(partitions, selected_city)
+        years = city_partitions['year'].tolist()
+        locations = partition_locations(city_partitions)
+    
+    if not years:
         st.error("ไม่สามารถประมวลผลข้อมูลได้")
         return
+
+    # ตัวกรองทั้งหมดอยู่ในฟอร์มเดียว: rerun ครั้งเดียวเมื่อกด "ใช้ตัวกรอง"
+    with st.sidebar.form("report_filters"):
+        # ช่วงเวลาเลือกข้ามปีได้ (เช่น ฤดูฝุ่น พ.ย. 2564 - มี.ค. 2565)
+        periods = list(range(period_key(years[0], 1), period_key(years[-1], 12) + 1))
+        period_start, period_end = st.select_slider(
+            "ช่วงเวลา",
+            options=periods,
+            value=(periods[0], periods[-1]),
+            format_func=period_label
+        )
+        
+        # Location filter
+        available_locations = ['ทั้งหมด'] + list(locations)
+        selected_location = st.selectbox(
+            "เลือกสถานที่",
+            available_locations
+        )
+        
+        # Month filter
+        available_months = ['ทั้งหมด'] + list(MONTHS_THAI.values())
+        selected_month = st.selectbox(
+            "เลือกเดือน",
+            available_months
+        )
+        
+        st.form_submit_button("ใช้ตัวกรอง", type="primary")
     
-    # Filters in sidebar
-    st.sidebar.header("Filter")
-    
-    # Location filter
-    available_locations = ['ทั้งหมด'] + sorted(df_processed['สถานที่'].unique().tolist())
-    selected_location = st.sidebar.selectbox(
-        "เลือกสถานที่",
-        available_locations
-    )
+    # 'ทั้งหมด' เมื่อเลือกทั้งช่วง มิฉะนั้นเป็น (เดือนแรก, เดือนสุดท้าย) ใช้เป็นส่วนหนึ่งของ cache key
+    full_range = (period_start, period_end) == (periods[0], periods[-1])
+    selected_period = 'ทั้งหมด' if full_range else (period_start, period_end)
     
-    # Year filter
-    available_years = ['ทั้งหมด'] + [str(year) for year in sorted(df_processed['ปี'].unique().tolist())]
-    selected_year = st.sidebar.selectbox(
-        "เลือกปี",
-        available_years
-    )
+    if not partitions.empty:
+        # อ่านเฉพาะ partition ของปีเดียวเมื่อช่วงเวลาอยู่ในปีเดียว
+        single_year = period_start // 12 == period_end // 12
+        load_year = str(period_start // 12) if single_year and not full_range else 'ทั้งหมด'
+        df_processed, version = load_park_data(partitions, selected_city, load_year)
+        if df_processed is None:
+            return
     
-    # Month filter
-    months_thai = {
-        'jan': 'มกราคม', 'feb': 'กุมภาพันธ์', 'mar': 'มีนาคม',
-        'apr': 'เมษายน', 'may': 'พฤษภาคม', 'jun': 'มิถุนายน',
-        'jul': 'กรกฎาคม', 'aug': 'สิงหาคม', 'sep': 'กันยายน',
-        'oct': 'ตุลาคม', 'nov': 'พฤศจิกายน', 'dec': 'ธันวาคม'
-    }
+    if df_processed.empty:
+        st.error("ไม่สามารถประมวลผลข้อมูลได้")
+        return
     
-    available_months = ['ทั้งหมด'] + list(months_thai.values())
-    selected_month = st.sidebar.selectbox(
-        "เลือกเดือน",
-        available_months
-    )
+    if partitions.empty:
+        show_data_quality(get_quality_report(DATA_PATH))
     
-    filtered_df = filter_park_data(df_processed, selected_location, selected_year, selected_month)
+    # ช่วงเวลาเป็น binary search บน index ที่เรียงตาม ปี*12 + เดือน (ไม่สแกนชื่อเดือน)
+    if not full_range:
+        df_processed = filter_period(df_processed, version, period_start, period_end)
+    filtered_df = filter_park_data(df_processed, selected_location, 'ทั้งหมด', selected_month)
     
     if filtered_df.empty:
         st.warning("ไม่พบข้อมูลตามเงื่อนไขที่เลือก")
@@ -89,75 +166,31 @@ def show_park_report():
     
     show_park_metrics(filtered_df)
     
-    show_park_visualizations(filtered_df, selected_location, selected_year, selected_month)
+    show_park_visualizations(filtered_df, selected_location, selected_period, selected_month, version)
     
     show_park_data_table(filtered_df)
 
-def preprocess_park_data(df):
-    """Preprocess park data for analysis"""
-    try:
-        # Clean data
-        df_clean = df.copy()
-        
-        # Convert to long format for easier analysis
-        data_rows = []
+def show_data_quality(report):
+    """Display the data quality report produced at load time"""
+    issues = report["issues"]
+    label = "คุณภาพข้อมูล" + (f" ({len(issues)} รายการที่ต้องตรวจสอบ)" if len(issues) else " (ผ่านทุกการตรวจสอบ)")
+    with st.expander(label):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("แถวในไฟล์", report["rows"])
+        col2.metric("เดือนที่มีการตรวจวัด", report["months"])
+        col3.metric("รายการที่ต้องตรวจสอบ", len(issues))
         
-        months = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 
-                 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+        if report["missing_columns"]:
+            st.error("ไม่พบคอลัมน์: " + ", ".join(report["missing_columns"]))
+        if report["extra_columns"]:
+            st.warning("คอลัมน์ที่ไม่รู้จัก: " + ", ".join(report["extra_columns"]))
         
-        months_thai = {
-            'jan': 'มกราคม', 'feb': 'กุมภาพันธ์', 'mar': 'มีนาคม',
-            'apr': 'เมษายน', 'may': 'พฤษภาคม', 'jun': 'มิถุนายน',
-            'jul': 'กรกฎาคม', 'aug': 'สิงหาคม', 'sep': 'กันยายน',
-            'oct': 'ตุลาคม', 'nov': 'พฤศจิกายน', 'dec': 'ธันวาคม'
-        }
-        
-        for _, row in df_clean.iterrows():
-            location = row['Dis_trict']
-            year = int(row['ปี'])
-            
-            for month in months:
-                try:
-                    lowest = float(row[f'{month}_lowest_PM2.5']) if pd.notnull(row[f'{month}_lowest_PM2.5']) else 0
-                    highest = float(row[f'{month}_highest_PM2.5']) if pd.notnull(row[f'{month}_highest_PM2.5']) else 0
-                    average = float(row[f'{month}_average_PM2.5']) if pd.notnull(row[f'{month}_average_PM2.5']) else 0
-                    exceeding = float(row[f'{month}_day_exceeding_month']) if pd.notnull(row[f'{month}_day_exceeding_month']) else 0
-                    
-                    data_rows.append({
-                        'สถานที่': location,
-                        'ปี': year,
-                        'เดือน': months_thai[month],
-                        'เดือนอังกฤษ': month,
-                        'ค่าต่ำสุด': lowest,
-                        'ค่าสูงสุด': highest,
-                        'ค่าเฉลี่ย': average,
-                        'จำนวนวันเกินมาตรฐาน': exceeding
-                    })
-                except (ValueError, TypeError):
-                    # Skip problematic data
-                    continue
-        
-        return pd.DataFrame(data_rows)
-    
-    except Exception as e:
-        st.error(f"Error processing data: {str(e)}")
-        return pd.DataFrame()
-
-def filter_park_data(df, location, year, month):
-    """Filter park data based on user selections"""
-    filtered = df.copy()
-    
-    if location != 'ทั้งหมด':
-        filtered = filtered[filtered['สถานที่'] == location]
-    
-    if year != 'ทั้งหมด':
-        year_int = int(year)
-        filtered = filtered[filtered['ปี'] == year_int]
-    
-    if month != 'ทั้งหมด':
-        filtered = filtered[filtered['เดือน'] == month]
-    
-    return filtered
+        if len(issues):
+            st.dataframe(
+                pd.DataFrame(list(report["summary"].items()), columns=["ประเภท", "จำนวน"]),
+                use_container_width=True
+            )
+            st.dataframe(issues, use_container_width=True)
 
 def show_park_metrics(df):
     """Display summary metrics"""
@@ -185,18 +218,20 @@ def show_park_metrics(df):
     except Exception as e:
         st.error(f"ข้อผิดพลาดในการแสดงสถิติ: {str(e)}")
 
-def show_park_visualizations(df, location, year, month):
+def show_park_visualizations(df, location, period, month, version=None):
     """Display park visualizations"""
     st.subheader("กราฟการวิเคราะห์")
     
     # Create tabs for different visualizations
-    tab1, tab2, tab3, tab4, tab5,tab6 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5,tab6, tab7, tab8 = st.tabs([
         "ค่าเฉลี่ย PM2.5", 
         "แนวโน้มรายเดือน", 
         "เปรียบเทียบสถานที่", 
         "Box Plot วิเคราะห์", 
         "วันเกินมาตรฐาน",
-        "แผนที่"
+        "แผนที่",
+        "กลุ่มสวนที่คล้ายกัน",
+        "แนวโน้มและฤดูกาล"
     ])
     
     with tab1:
@@ -206,7 +241,7 @@ def show_park_visualizations(df, location, year, month):
                 df_numeric = df.copy()
                 df_numeric['ค่าเฉลี่ย'] = pd.to_numeric(df_numeric['ค่าเฉลี่ย'], errors='coerce')
                 
-                avg_by_location = df_numeric.groupby('สถานที่')['ค่าเฉลี่ย'].mean().reset_index()
+                avg_by_location = df_numeric.groupby('สถานที่', observed=True)['ค่าเฉลี่ย'].mean().reset_index()
                 avg_by_location = avg_by_location.dropna()
                 avg_by_location = avg_by_location.sort_values('ค่าเฉลี่ย', ascending=True)
                 
@@ -219,7 +254,7 @@ def show_park_visualizations(df, location, year, month):
                                 color='ค่าเฉลี่ย',
                                 color_continuous_scale='RdYlGn_r')
                     fig.update_layout(height=600)
-                    st.plotly_chart(fig, use_container_width=True)
+                    show_chart(fig, "avg_by_location")
                 else:
                     st.warning("ไม่มีข้อมูลที่สามารถแสดงกราฟได้")
             else:
@@ -227,7 +262,7 @@ def show_park_visualizations(df, location, year, month):
                 df_numeric = df.copy()
                 df_numeric['ค่าเฉลี่ย'] = pd.to_numeric(df_numeric['ค่าเฉลี่ย'], errors='coerce')
                 
-                monthly_data = df_numeric.groupby('เดือน')['ค่าเฉลี่ย'].mean().reset_index()
+                monthly_data = df_numeric.groupby('เดือน', observed=True)['ค่าเฉลี่ย'].mean().reset_index()
                 monthly_data = monthly_data.dropna()
                 
                 if not monthly_data.empty:
@@ -236,12 +271,12 @@ def show_park_visualizations(df, location, year, month):
                     monthly_data['เดือน'] = pd.Categorical(monthly_data['เดือน'], categories=month_order, ordered=True)
                     monthly_data = monthly_data.sort_values('เดือน')
                     
-                    fig = px.line(monthly_data, 
+                    fig = line_figure(monthly_data, 
                                  x='เดือน', 
                                  y='ค่าเฉลี่ย',
                                  title=f'แนวโน้ม PM2.5 รายเดือน - {location}',
                                  markers=True)
-                    st.plotly_chart(fig, use_container_width=True)
+                    show_chart(fig, "monthly_location")
                 else:
                     st.warning("ไม่มีข้อมูลที่สามารถแสดงกราฟได้")
         except Exception as e:
@@ -254,7 +289,7 @@ def show_park_visualizations(df, location, year, month):
                 df_numeric = df.copy()
                 df_numeric['ค่าเฉลี่ย'] = pd.to_numeric(df_numeric['ค่าเฉลี่ย'], errors='coerce')
                 
-                monthly_trend = df_numeric.groupby(['เดือน', 'ปี'])['ค่าเฉลี่ย'].mean().reset_index()
+                monthly_trend = df_numeric.groupby(['เดือน', 'ปี'], observed=True)['ค่าเฉลี่ย'].mean().reset_index()
                 monthly_trend = monthly_trend.dropna()
                 
                 month_order = ['มกราคม', 'กุมภาพันธ์', 'มีนาคม', 'เมษายน', 'พฤษภาคม', 'มิถุนายน',
@@ -262,13 +297,13 @@ def show_park_visualizations(df, location, year, month):
                 monthly_trend['เดือน'] = pd.Categorical(monthly_trend['เดือน'], categories=month_order, ordered=True)
                 monthly_trend = monthly_trend.sort_values('เดือน')
                 
-                fig = px.line(monthly_trend, 
+                fig = line_figure(monthly_trend, 
                              x='เดือน', 
                              y='ค่าเฉลี่ย',
                              color='ปี',
                              title='แนวโน้ม PM2.5 รายเดือนแยกตามปี',
                              markers=True)
-                st.plotly_chart(fig, use_container_width=True)
+                show_chart(fig, "monthly_trend")
             else:
                 st.info("ต้องมีข้อมูลมากกว่า 1 ปีเพื่อแสดงแนวโน้ม")
         except Exception as e:
@@ -279,12 +314,7 @@ def show_park_visualizations(df, location, year, month):
         # Location comparison scatter plot
         try:
             if len(df['สถานที่'].unique()) > 1:
-                location_data = df.groupby('สถานที่').agg({
-                    'ค่าเฉลี่ย': 'mean',
-                    'ค่าสูงสุด': 'max',
-                    'ค่าต่ำสุด': 'min',
-                    'จำนวนวันเกินมาตรฐาน': 'sum'
-                }).reset_index()
+                location_data = location_summary(df, version, (location, period, month))
                 
                 # Convert to numeric
                 for col in ['ค่าเฉลี่ย', 'ค่าสูงสุด', 'ค่าต่ำสุด', 'จำนวนวันเกินมาตรฐาน']:
@@ -292,7 +322,7 @@ def show_park_visualizations(df, location, year, month):
                 
                 location_data = location_data.dropna()
                 
-                fig = px.scatter(location_data,
+                fig = scatter_figure(location_data,
                                x='ค่าเฉลี่ย',
                                y='จำนวนวันเกินมาตรฐาน',
                                size='ค่าสูงสุด',
@@ -300,94 +330,14 @@ def show_park_visualizations(df, location, year, month):
                                title='เปรียบเทียบสถานที่: PM2.5 เฉลี่ย vs วันเกินมาตรฐาน',
                                color='ค่าเฉลี่ย',
                                color_continuous_scale='RdYlGn_r')
-                st.plotly_chart(fig, use_container_width=True)
+                show_chart(fig, "location_scatter")
             else:
                 st.info("ต้องเลือก 'ทั้งหมด' ในสถานที่เพื่อเปรียบเทียบ")
         except Exception as e:
             st.error(f"ข้อผิดพลาดในการสร้างกราฟเปรียบเทียบ: {str(e)}")
     
     with tab4:
-        # Box Plot Analysis - NEW FEATURE
-        try:
-            st.subheader("Box Plot Analysis - การวิเคราะห์การกระจายของข้อมูล")
-            
-            # Create different box plot options
-            box_option = st.selectbox(
-                "เลือกประเภท Box Plot:",
-                ["PM2.5 แยกตามสถานที่", "PM2.5 แยกตามเดือน", "PM2.5 แยกตามปี"]
-            )
-            
-            df_numeric = df.copy()
-            for col in ['ค่าเฉลี่ย', 'ค่าสูงสุด', 'ค่าต่ำสุด']:
-                df_numeric[col] = pd.to_numeric(df_numeric[col], errors='coerce')
-            df_numeric = df_numeric.dropna(subset=['ค่าเฉลี่ย'])
-            
-            if box_option == "PM2.5 แยกตามสถานที่" and len(df_numeric['สถานที่'].unique()) > 1:
-                fig = px.box(df_numeric, 
-                            x='สถานที่', 
-                            y='ค่าเฉลี่ย',
-                            title='Box Plot: การกระจายค่า PM2.5 แยกตามสถานที่',
-                            color='สถานที่')
-                fig.update_xaxes(tickangle=45)
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Statistical interpretation
-                st.info("""
-                **การตีความ Box Plot:**
-                - กล่อง (Box): แสดงความแตกต่างระหว่างควอไทล์ที่ 1 และ 3 (50% ของข้อมูล)
-                - เส้นกลาง: ค่ามัธยฐาน (Median)
-                - หนวด (Whiskers): ช่วงข้อมูลปกติ
-                - จุดพิเศษ: ค่าผิดปกติ (Outliers)
-                """)
-                
-            elif box_option == "PM2.5 แยกตามเดือน":
-                month_order = ['มกราคม', 'กุมภาพันธ์', 'มีนาคม', 'เมษายน', 'พฤษภาคม', 'มิถุนายน',
-                              'กรกฎาคม', 'สิงหาคม', 'กันยายน', 'ตุลาคม', 'พฤศจิกายน', 'ธันวาคม']
-                df_numeric['เดือน'] = pd.Categorical(df_numeric['เดือน'], categories=month_order, ordered=True)
-                
-                fig = px.box(df_numeric, 
-                            x='เดือน', 
-                            y='ค่าเฉลี่ย',
-                            title='Box Plot: การกระจายค่า PM2.5 แยกตามเดือน',
-                            color='เดือน')
-                fig.update_xaxes(tickangle=45)
-                st.plotly_chart(fig, use_container_width=True)
-                
-            elif box_option == "PM2.5 แยกตามปี" and len(df_numeric['ปี'].unique()) > 1:
-                fig = px.box(df_numeric, 
-                            x='ปี', 
-                            y='ค่าเฉลี่ย',
-                            title='Box Plot: การกระจายค่า PM2.5 แยกตามปี',
-                            color='ปี')
-                st.plotly_chart(fig, use_container_width=True)
-                
-            else:
-                st.warning("ไม่สามารถสร้าง Box Plot ได้ เนื่องจากข้อมูลไม่เพียงพอ")
-                
-            # Additional box plot showing all three metrics
-            st.subheader("เปรียบเทียบค่า PM2.5 (ต่ำสุด, เฉลี่ย, สูงสุด)")
-            
-            # Reshape data for multiple metrics comparison
-            metrics_data = []
-            for _, row in df_numeric.iterrows():
-                metrics_data.extend([
-                    {'สถานที่': row['สถานที่'], 'ค่า PM2.5': row['ค่าต่ำสุด'], 'ประเภท': 'ค่าต่ำสุด'},
-                    {'สถานที่': row['สถานที่'], 'ค่า PM2.5': row['ค่าเฉลี่ย'], 'ประเภท': 'ค่าเฉลี่ย'},
-                    {'สถานที่': row['สถานที่'], 'ค่า PM2.5': row['ค่าสูงสุด'], 'ประเภท': 'ค่าสูงสุด'}
-                ])
-            
-            metrics_df = pd.DataFrame(metrics_data)
-            
-            if not metrics_df.empty:
-                fig = px.box(metrics_df, 
-                            x='ประเภท', 
-                            y='ค่า PM2.5',
-                            title='Box Plot: เปรียบเทียบค่า PM2.5 ประเภทต่างๆ',
-                            color='ประเภท')
-                st.plotly_chart(fig, use_container_width=True)
-                
-        except Exception as e:
-            st.error(f"ข้อผิดพลาดในการสร้าง Box Plot: {str(e)}")
+        show_box_plots(df)
     
     with tab5:
         # Exceeding days analysis
@@ -395,7 +345,7 @@ def show_park_visualizations(df, location, year, month):
             df_numeric = df.copy()
             df_numeric['จำนวนวันเกินมาตรฐาน'] = pd.to_numeric(df_numeric['จำนวนวันเกินมาตรฐาน'], errors='coerce')
             
-            exceeding_data = df_numeric.groupby(['เดือน'])['จำนวนวันเกินมาตรฐาน'].sum().reset_index()
+            exceeding_data = df_numeric.groupby(['เดือน'], observed=True)['จำนวนวันเกินมาตรฐาน'].sum().reset_index()
             exceeding_data = exceeding_data.dropna()
             
             month_order = ['มกราคม', 'กุมภาพันธ์', 'มีนาคม', 'เมษายน', 'พฤษภาคม', 'มิถุนายน',
@@ -409,68 +359,230 @@ def show_park_visualizations(df, location, year, month):
                         title='จำนวนวันที่ค่า PM2.5 เกินมาตรฐานแยกตามเดือน',
                         color='จำนวนวันเกินมาตรฐาน',
                         color_continuous_scale='Reds')
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig, "exceeding_days")
         except Exception as e:
             st.error(f"ข้อผิดพลาดในการสร้างกราฟวันเกินมาตรฐาน: {str(e)}")
 
     with tab6:
-            st.header("แผนที่สวนสาธารณะในกรุงเทพฯ พร้อมระดับความเสี่ยง")
+        show_park_map(df)
+
+    with tab7:
+        show_park_clusters(df, version, location, period, month)
+
+    with tab8:
+        show_park_trends(df, version, location, period, month)
+
+# widget ในแต่ละแท็บอยู่ใน fragment: เปลี่ยนค่าแล้ว rerun เฉพาะแท็บนั้น ไม่ใช่ทั้งหน้า
+@st.fragment
+def show_box_plots(df):
+    """Box plot tab (fragment-scoped)"""
+    # Box Plot Analysis - NEW FEATURE
+    try:
+        st.subheader("Box Plot Analysis - การวิเคราะห์การกระจายของข้อมูล")
+
+        # Create different box plot options
+        box_option = st.selectbox(
+            "เลือกประเภท Box Plot:",
+            ["PM2.5 แยกตามสถานที่", "PM2.5 แยกตามเดือน", "PM2.5 แยกตามปี"]
+        )
+
+        df_numeric = df.copy()
+        for col in ['ค่าเฉลี่ย', 'ค่าสูงสุด', 'ค่าต่ำสุด']:
+            df_numeric[col] = pd.to_numeric(df_numeric[col], errors='coerce')
+        df_numeric = df_numeric.dropna(subset=['ค่าเฉลี่ย'])
+
+        if box_option == "PM2.5 แยกตามสถานที่" and len(df_numeric['สถานที่'].unique()) > 1:
+            fig = box_figure(df_numeric, 
+                        x='สถานที่', 
+                        y='ค่าเฉลี่ย',
+                        title='Box Plot: การกระจายค่า PM2.5 แยกตามสถานที่')
+            fig.update_xaxes(tickangle=45)
+            show_chart(fig, "box_location")
+
+            # Statistical interpretation
+            st.info("""
+            **การตีความ Box Plot:**
+            - กล่อง (Box): แสดงความแตกต่างระหว่างควอไทล์ที่ 1 และ 3 (50% ของข้อมูล)
+            - เส้นกลาง: ค่ามัธยฐาน (Median)
+            - หนวด (Whiskers): ช่วงข้อมูลปกติ
+            - จุดพิเศษ: ค่าผิดปกติ (Outliers)
+            """)
+
+        elif box_option == "PM2.5 แยกตามเดือน":
+            month_order = ['มกราคม', 'กุมภาพันธ์', 'มีนาคม', 'เมษายน', 'พฤษภาคม', 'มิถุนายน',
+                          'กรกฎาคม', 'สิงหาคม', 'กันยายน', 'ตุลาคม', 'พฤศจิกายน', 'ธันวาคม']
+            df_numeric['เดือน'] = pd.Categorical(df_numeric['เดือน'], categories=month_order, ordered=True)
 
-    # สร้างข้อมูลแผนที่
-            df_map = create_map_data()
+            fig = box_figure(df_numeric, 
+                        x='เดือน', 
+                        y='ค่าเฉลี่ย',
+                        title='Box Plot: การกระจายค่า PM2.5 แยกตามเดือน')
+            fig.update_xaxes(tickangle=45)
+            show_chart(fig, "box_month")
 
-    # คำนวณค่า PM2.5 เฉลี่ยของแต่ละสวน
-            avg_pm = df.groupby("สถานที่")["ค่าเฉลี่ย"].mean().reset_index()
-            avg_pm.rename(columns={"ค่าเฉลี่ย": "pm25_avg"}, inplace=True)
+        elif box_option == "PM2.5 แยกตามปี" and len(df_numeric['ปี'].unique()) > 1:
+            fig = box_figure(df_numeric, 
+                        x='ปี', 
+                        y='ค่าเฉลี่ย',
+                        title='Box Plot: การกระจายค่า PM2.5 แยกตามปี')
+            show_chart(fig, "box_year")
 
-    # รวมเข้ากับพิกัด
-            df_map = df_map.merge(avg_pm, left_on="name", right_on="สถานที่", how="left")
+        else:
+            st.warning("ไม่สามารถสร้าง Box Plot ได้ เนื่องจากข้อมูลไม่เพียงพอ")
+
+        # Additional box plot showing all three metrics
+        st.subheader("เปรียบเทียบค่า PM2.5 (ต่ำสุด, เฉลี่ย, สูงสุด)")
+
+        # Reshape data for multiple metrics comparison
+        metrics_df = df_numeric.melt(
+            id_vars=['สถานที่'],
+            value_vars=['ค่าต่ำสุด', 'ค่าเฉลี่ย', 'ค่าสูงสุด'],
+            var_name='ประเภท',
+            value_name='ค่า PM2.5'
+        )
 
-    # จัดระดับ
-      # จัดระดับความเสี่ยง
-            def classify_risk(val):
-               if pd.isna(val):
-                  return "ไม่มีข้อมูล"
-               elif val <= 25:
-                return "🟢 ดี"
-               elif val <= 50:
-                return "🟡 ปานกลาง"
-               else:
-                return "🔴 เสี่ยงสูง"
+        if not metrics_df.empty:
+            fig = box_figure(metrics_df, 
+                        x='ประเภท', 
+                        y='ค่า PM2.5',
+                        title='Box Plot: เปรียบเทียบค่า PM2.5 ประเภทต่างๆ')
+            show_chart(fig, "box_metrics")
 
-    df_map["ระดับความเสี่ยง"] = df_map["pm25_avg"].apply(classify_risk)
+    except Exception as e:
+        st.error(f"ข้อผิดพลาดในการสร้าง Box Plot: {str(e)}")
+
+@st.fragment
+def show_park_map(df):
+    """Risk map tab (fragment-scoped)"""
+    st.header("แผนที่สวนสาธารณะในกรุงเทพฯ พร้อมระดับความเสี่ยง")
+
+    # พิกัดเตรียมไว้ครั้งเดียว เปลี่ยนตัวกรองแล้วคำนวณใหม่เฉพาะค่าเฉลี่ยของแต่ละสวน
+    stations = get_station_index()
+    values = station_values(df, stations)
+    codes = risk_codes(values)
 
     # แสดงผลเป็นตารางสรุป
-    st.dataframe(df_map[["name", "pm25_avg", "ระดับความเสี่ยง"]])
+    st.dataframe(pd.DataFrame({
+        "name": stations["name"],
+        "pm25_avg": values,
+        "ระดับความเสี่ยง": RISK_LABELS[codes]
+    }))
 
-    # ใช้ pydeck ในการแสดงผลแผนที่พร้อมสี
+    default_mode = 0 if len(stations["name"]) <= DENSE_THRESHOLD else 1
+    map_mode = st.radio("รูปแบบแผนที่", MAP_MODES, index=default_mode, horizontal=True)
+    st.pydeck_chart(station_deck(stations, values, map_mode))
 
-    color_map = {
-        "🟢 ดี": [0, 200, 0],
-        "🟡 ปานกลาง": [255, 215, 0],
-        "🔴 เสี่ยงสูง": [255, 0, 0],
-        "ไม่มีข้อมูล": [200, 200, 200],
-    }
+@st.fragment
+def show_park_clusters(df, version, location, period, month):
+    """Park similarity tab (fragment-scoped)"""
+    # สวนที่มีรูปแบบ PM2.5 รายเดือนคล้ายกัน (ต้องใช้ข้อมูลทุกสวนและทุกเดือน)
+    try:
+        if location != 'ทั้งหมด' or month != 'ทั้งหมด':
+            st.info("ต้องเลือก 'ทั้งหมด' ในสถานที่และเดือนเพื่อเปรียบเทียบรูปแบบรายเดือนของสวน")
+        elif len(df['สถานที่'].unique()) < 3:
+            st.info("ต้องมีข้อมูลอย่างน้อย 3 สถานที่เพื่อจัดกลุ่ม")
+        else:
+            col1, col2 = st.columns(2)
+            metric_label = col1.selectbox("วัดความคล้ายด้วย", list(SIMILARITY_METRICS))
+            metric = SIMILARITY_METRICS[metric_label]
+            similarity = get_similarity(df, version, period, metric)
+            if len(similarity["parks"]) < 3:
+                st.info(f"ต้องมีอย่างน้อย 3 สถานที่ที่มีข้อมูล {MIN_MONTHS} เดือนขึ้นไปในช่วงเวลาที่เลือก")
+                return
+            n_clusters = col2.slider("จำนวนกลุ่ม", 2, min(10, len(similarity["parks"])), min(4, len(similarity["parks"])))
+            clusters = get_clusters(df, version, period, metric, n_clusters)
 
-    df_map["color"] = df_map["ระดับความเสี่ยง"].apply(lambda x: color_map[x])
+            fig = similarity_heatmap(
+                similarity["matrix"], similarity["parks"], similarity["order"], clusters['กลุ่ม'],
+                title=f'ระยะห่างระหว่างสวน ({metric_label})'
+            )
+            show_chart(fig, "similarity_heatmap")
 
-    layer = pdk.Layer(
-        "ScatterplotLayer",
-        data=df_map,
-        get_position=["lon", "lat"],
-        get_fill_color="color",
-        get_radius=200,
-        pickable=True,
-    )
+            st.pydeck_chart(cluster_deck(clusters, get_station_index()))
 
-    view_state = pdk.ViewState(
-        latitude=df_map["lat"].mean(),
-        longitude=df_map["lon"].mean(),
-        zoom=11
-    )
+            # รูปแบบรายเดือนเฉลี่ยของแต่ละกลุ่ม
+            profiles = similarity["profiles"].join(clusters.set_index('สถานที่'))
+            cluster_profiles = profiles.groupby('กลุ่ม').mean().reset_index().melt(
+                id_vars='กลุ่ม', var_name='เดือน', value_name='ค่าเฉลี่ย'
+            )
+            cluster_profiles['กลุ่ม'] = cluster_profiles['กลุ่ม'].astype(str)
+            fig = line_figure(cluster_profiles, x='เดือน', y='ค่าเฉลี่ย', color='กลุ่ม',
+                              title='รูปแบบ PM2.5 รายเดือนเฉลี่ยของแต่ละกลุ่ม', markers=True)
+            show_chart(fig, "cluster_profiles")
 
-    r = pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip={"text": "{name}\nค่าเฉลี่ย PM2.5: {pm25_avg:.1f}\n{ระดับความเสี่ยง}"})
-    st.pydeck_chart(r)
+            st.dataframe(clusters.sort_values(['กลุ่ม', 'สถานที่']), use_container_width=True, hide_index=True)
+    except Exception as e:
+        st.error(f"ข้อผิดพลาดในการจัดกลุ่มสวน: {str(e)}")
+
+@st.fragment
+def show_park_trends(df, version, location, period, month):
+    """Moving averages, YoY and trend/seasonal decomposition tab (fragment-scoped)"""
+    # ต้องใช้อนุกรมรายเดือนต่อเนื่องอย่างน้อย 2 ปี จึงใช้ได้เมื่อไม่ได้กรองเดือน
+    try:
+        if month != 'ทั้งหมด':
+            st.info("ต้องเลือก 'ทั้งหมด' ในเดือนเพื่อดูแนวโน้มต่อเนื่องหลายปี")
+            return
+        if period != 'ทั้งหมด' and period[1] - period[0] + 1 < MIN_TREND_MONTHS:
+            st.info(f"ต้องเลือกช่วงเวลาอย่างน้อย {MIN_TREND_MONTHS} เดือนเพื่อแยก trend และฤดูกาล")
+            return
+
+        # คำนวณทุกสวนในช่วงเวลาที่เลือกพร้อมกันครั้งเดียว (แคชร่วมกันทุก session)
+        trends = get_trends(df, version, location, period)
+        summary = trends["summary"]
+
+        col1, col2 = st.columns(2)
+        window = col1.radio("ค่าเฉลี่ยเคลื่อนที่", ROLLING_WINDOWS, index=len(ROLLING_WINDOWS) - 1,
+                            format_func=lambda w: f"{w} เดือน", horizontal=True)
+        if location == 'ทั้งหมด':
+            parks = summary.sort_values('trend เปลี่ยนแปลง', ascending=False)['สถานที่'].tolist()
+            park = col2.selectbox("สถานที่ที่ต้องการดูรายละเอียด", parks)
+
+            all_trends = pd.DataFrame({
+                'สถานที่': np.repeat(trends["parks"], len(trends["t"])),
+                'ช่วงเวลา': np.tile([f"{t // 12}-{t % 12 + 1:02d}" for t in trends["t"]], len(trends["parks"])),
+                'trend': trends["trend"].ravel(),
+            }).dropna()
+            fig = line_figure(all_trends, x='ช่วงเวลา', y='trend', color='สถานที่',
+                              title='Trend ของ PM2.5 (หักฤดูกาลแล้ว) ทุกสถานที่')
+            fig.update_layout(height=500)
+            show_chart(fig, "trend_all_parks")
+
+            st.dataframe(summary.sort_values('trend เปลี่ยนแปลง', ascending=False).round(2),
+                         use_container_width=True, hide_index=True)
+        else:
+            park = location
+
+        frame = trend_frame(trends, park, window)
+        moving = f'ค่าเฉลี่ยเคลื่อนที่ {window} เดือน'
+
+        fig = line_figure(
+            frame.melt(id_vars='ช่วงเวลา', value_vars=['ค่าเฉลี่ย', moving, 'trend'],
+                       var_name='ชุดข้อมูล', value_name='PM2.5').dropna(),
+            x='ช่วงเวลา', y='PM2.5', color='ชุดข้อมูล',
+            title=f'ค่าเฉลี่ยรายเดือน ค่าเฉลี่ยเคลื่อนที่ และ trend - {park}'
+        )
+        show_chart(fig, "trend_park")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            yoy = frame.dropna(subset=['YoY'])
+            fig = px.bar(yoy, x='ช่วงเวลา', y='YoY', color='YoY', color_continuous_scale='RdYlGn_r',
+                         color_continuous_midpoint=0, title='เปลี่ยนแปลงเทียบเดือนเดียวกันของปีก่อน (μg/m³)')
+            show_chart(fig, "trend_yoy")
+        with col2:
+            profile = frame.dropna(subset=['seasonal']).groupby('เดือนที่')['seasonal'].mean()
+            profile = profile.reindex(range(1, 13)).reset_index()
+            profile['เดือน'] = [MONTH_ORDER[m - 1] for m in profile['เดือนที่']]
+            fig = px.bar(profile, x='เดือน', y='seasonal', title='องค์ประกอบฤดูกาล (ส่วนต่างจาก trend)')
+            show_chart(fig, "trend_seasonal")
+
+        row = summary[summary['สถานที่'] == park].iloc[0]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("ความแรงของ trend", f"{row['ความแรงของ trend']:.2f}")
+        col2.metric("ความแรงของฤดูกาล", f"{row['ความแรงของฤดูกาล']:.2f}")
+        col3.metric("YoY ล่าสุด", f"{row['YoY ล่าสุด']:+.1f} μg/m³")
+    except Exception as e:
+        st.error(f"ข้อผิดพลาดในการวิเคราะห์แนวโน้ม: {str(e)}")
 
 def show_park_data_table(df):
     """Display detailed data table"""
@@ -520,30 +632,48 @@ def show_forecast_page():
     st.header("การทำนายผล PM2.5 ล่วงหน้า 4 ปี")
     st.markdown("ใช้ข้อมูลจาก AllParkYear.csv เพื่อทำนายแนวโน้มค่าเฉลี่ย PM2.5 ของสวนสาธารณะในอนาคต")
 
-    try:
-        df = pd.read_csv("Group_file/AllParkYear.csv")
-    except FileNotFoundError:
-        st.error("ไม่พบไฟล์ AllParkYear.csv ในโฟลเดอร์ Group_file")
+    # เลือกโมเดลที่จะใช้ทำนาย
+    st.sidebar.header("ตั้งค่าการพยากรณ์")
+
+    # การพยากรณ์ใช้ข้อมูลทุกปีของเมืองที่เลือก
+    partitions = list_partitions()
+    forecast_city = 'ทั้งหมด'
+    if not partitions.empty:
+        forecast_city = st.sidebar.selectbox(
+            "เลือกเมือง/จังหวัด",
+            sorted(partitions['city'].unique().tolist())
+        )
+
+    df_processed, version = load_park_data(partitions, forecast_city)
+    if df_processed is None:
         return
 
-    df_processed = preprocess_park_data(df)
     if df_processed.empty:
         st.error("ไม่สามารถประมวลผลข้อมูลได้")
         return
-
-    # เลือกโมเดลที่จะใช้ทำนาย
-    st.sidebar.header("ตั้งค่าการพยากรณ์")
     
-    available_locations = ['ทั้งหมด'] + sorted(df_processed['สถานที่'].unique().tolist())
-    forecast_location = st.sidebar.selectbox(
-        "เลือกสถานที่สำหรับการพยากรณ์",
-        available_locations
-    )
-    
-    model_choice = st.sidebar.selectbox(
-        "เลือกโมเดลที่ต้องการใช้",
-        ["Linear Regression", "Random Forest", "Gradient Boosting", "SVM (RBF)", "แสดงทุกโมเดล"]
-    )
+    # ความละเอียดอยู่นอกฟอร์มเพราะเป็นตัวกำหนดรายชื่อโมเดล
+    resolution = st.sidebar.radio("ความละเอียดของข้อมูล", ["รายปี", "รายเดือน"], horizontal=True)
+    model_names = MODEL_NAMES if resolution == "รายปี" else MONTHLY_MODEL_NAMES
+
+    # สถานที่และโมเดลเลือกพร้อมกันในฟอร์ม แล้วคำนวณครั้งเดียวเมื่อกดยืนยัน
+    with st.sidebar.form("forecast_settings"):
+        available_locations = ['ทั้งหมด'] + sorted(df_processed['สถานที่'].unique().tolist())
+        forecast_location = st.selectbox(
+            "เลือกสถานที่สำหรับการพยากรณ์",
+            available_locations
+        )
+        
+        model_choice = st.selectbox(
+            "เลือกโมเดลที่ต้องการใช้",
+            model_names + ["แสดงทุกโมเดล"]
+        )
+        
+        st.form_submit_button("ใช้การตั้งค่า", type="primary")
+
+    if resolution == "รายเดือน":
+        show_monthly_forecast(df_processed, version, forecast_location, model_choice)
+        return
 
     # กรองข้อมูลตามสถานที่
     if forecast_location != 'ทั้งหมด':
@@ -552,8 +682,7 @@ def show_forecast_page():
         df_filtered = df_processed.copy()
 
     # ใช้ค่าเฉลี่ย PM2.5 ต่อปี
-    df_yearly = df_filtered.groupby("ปี")["ค่าเฉลี่ย"].mean().reset_index()
-    df_yearly["ค่าเฉลี่ย"] = pd.to_numeric(df_yearly["ค่าเฉลี่ย"], errors="coerce")
+    df_yearly = yearly_means(df_processed, version, forecast_location)
 
     st.subheader(f"ข้อมูลค่าเฉลี่ย PM2.5 ต่อปี - {forecast_location}")
     
@@ -568,70 +697,28 @@ def show_forecast_page():
     
     st.dataframe(df_yearly, use_container_width=True)
 
-    # แบ่งข้อมูล train/test
-    X = df_yearly[["ปี"]]
-    y = df_yearly["ค่าเฉลี่ย"]
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
-
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-
-    models = {
-        "Linear Regression": LinearRegression(),
-        "Random Forest": RandomForestRegressor(random_state=42),
-        "Gradient Boosting": GradientBoostingRegressor(random_state=42),
-        "SVM (RBF)": SVR(kernel="rbf")
-    }
-
-    results = []
-    future_preds = {}
-    last_year = int(df_yearly["ปี"].max())
-    future_years = np.array([last_year + i for i in range(1, 5)]).reshape(-1, 1)
-    future_scaled = scaler.transform(future_years)
-
-    # เก็บข้อมูลการทำนายทั้งหมด
-    all_predictions = {}
-    
-    for name, model in models.items():
-        model.fit(X_train_scaled, y_train)
-        y_pred = model.predict(X_test_scaled)
-
-        r2 = r2_score(y_test, y_pred)
-        mae = mean_absolute_error(y_test, y_pred)
-        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-
-        results.append({
-            "Model": name,
-            "R² Score": r2,
-            "MAE": mae,
-            "RMSE": rmse
-        })
-
-        # ทำนาย 4 ปีข้างหน้า
-        future_preds[name] = model.predict(future_scaled)
-        
-        # ทำนายข้อมูลทั้งหมด (อดีต + อนาคต)
-        all_years = np.array(list(X['ปี']) + list(future_years.flatten())).reshape(-1, 1)
-        all_scaled = scaler.transform(all_years)
-        all_predictions[name] = model.predict(all_scaled)
+    # โมเดลที่ฝึกแล้วใช้ร่วมกันทุก session (ฝึกครั้งเดียวต่อชุดข้อมูลและสถานที่)
+    forecast = get_forecast(df_processed, version, forecast_location)
+    future_preds = forecast["future_preds"]
+    last_year = forecast["last_year"]
+    future_years = forecast["future_years"]
 
     st.subheader("Test 20%")
-    results_df = pd.DataFrame(results).sort_values(by="R² Score", ascending=False)
+    results_df = forecast["results"]
     st.dataframe(results_df, use_container_width=True)
     
-    best_model = results_df.iloc[0]['Model']
+    best_model = forecast["best_model"]
     # st.success(f"โมเดลที่ดีที่สุด: **{best_model}** (R² Score: {results_df.iloc[0]['R² Score']:.4f})")
 
     # สร้าง Tabs สำหรับกราฟต่างๆ
-    tab1, tab2, tab3, tab4, tab5,tab6 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5,tab6, tab7 = st.tabs([
         "การพยากรณ์โดยรวม",
         "เปรียบเทียบโมเดล",
         "แนวโน้มรายเดือน",
         "การพยากรณ์แต่ละสถานที่",
         "แผนที่",
-        "ตารางข้อมูล"
+        "ตารางข้อมูล",
+        "วันเกินมาตรฐาน (จำลอง)"
     ])
 
     with tab1:
@@ -639,7 +726,7 @@ def show_forecast_page():
         
         # เลือกโมเดลที่จะแสดง
         if model_choice == "แสดงทุกโมเดล":
-            selected_models = list(models.keys())
+            selected_models = list(MODEL_NAMES)
         else:
             selected_models = [model_choice]
         
@@ -677,7 +764,7 @@ def show_forecast_page():
             height=500
         )
         
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart(fig, "forecast_trend")
 
     with tab2:
         st.subheader("เปรียบเทียบการทำนายของโมเดลต่างๆ")
@@ -698,7 +785,7 @@ def show_forecast_page():
             title='เปรียบเทียบค่าพยากรณ์ของแต่ละโมเดล',
         )
         fig.update_layout(height=500)
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart(fig, "forecast_models")
         
         # แสดงค่าเฉลี่ยของการพยากรณ์
         avg_forecast = forecast_df[list(future_preds.keys())].mean(axis=1)
@@ -709,7 +796,7 @@ def show_forecast_page():
         
         try:
             # คำนวณค่าเฉลี่ยรายเดือนในอดีต
-            monthly_avg = df_filtered.groupby('เดือน')['ค่าเฉลี่ย'].mean().reset_index()
+            monthly_avg = df_filtered.groupby('เดือน', observed=True)['ค่าเฉลี่ย'].mean().reset_index()
             
             month_order = ['มกราคม', 'กุมภาพันธ์', 'มีนาคม', 'เมษายน', 'พฤษภาคม', 'มิถุนายน',
                           'กรกฎาคม', 'สิงหาคม', 'กันยายน', 'ตุลาคม', 'พฤศจิกายน', 'ธันวาคม']
@@ -735,7 +822,7 @@ def show_forecast_page():
             future_monthly_df = pd.DataFrame(future_monthly)
             
             # กราฟแนวโน้มรายเดือน
-            fig = px.line(
+            fig = line_figure(
                 future_monthly_df,
                 x='เดือน',
                 y='PM2.5_พยากรณ์',
@@ -744,7 +831,7 @@ def show_forecast_page():
                 markers=True
             )
             fig.update_layout(height=500)
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig, "forecast_monthly")
             
         except Exception as e:
             st.warning(f"ไม่สามารถสร้างกราฟรายเดือนได้: {str(e)}")
@@ -753,37 +840,10 @@ def show_forecast_page():
         st.subheader("การพยากรณ์แยกตามสถานที่")
         
         if forecast_location == 'ทั้งหมด':
-            # คำนวณการพยากรณ์สำหรับทุกสถานที่
-            location_forecasts = []
+            # คำนวณการพยากรณ์สำหรับทุกสถานที่ (แคชร่วมกันทุก session)
+            loc_forecast_df = get_park_forecasts(df_processed, version, best_model, future_years)
             
-            for location in df_processed['สถานที่'].unique():
-                df_loc = df_processed[df_processed['สถานที่'] == location].copy()
-                df_loc_yearly = df_loc.groupby("ปี")["ค่าเฉลี่ย"].mean().reset_index()
-                
-                if len(df_loc_yearly) >= 3:  # ต้องมีข้อมูลอย่างน้อย 3 ปี
-                    X_loc = df_loc_yearly[["ปี"]]
-                    y_loc = df_loc_yearly["ค่าเฉลี่ย"]
-                    
-                    X_loc_scaled = scaler.fit_transform(X_loc)
-                    
-                    # ใช้โมเดลที่ดีที่สุด
-                    best_model_obj = models[best_model]
-                    best_model_obj.fit(X_loc_scaled, y_loc)
-                    
-                    future_loc_scaled = scaler.transform(future_years)
-                    future_loc_pred = best_model_obj.predict(future_loc_scaled)
-                    
-                    location_forecasts.append({
-                        'สถานที่': location,
-                        'ปี_2026': future_loc_pred[0] if len(future_loc_pred) > 0 else 0,
-                        'ปี_2027': future_loc_pred[1] if len(future_loc_pred) > 1 else 0,
-                        'ปี_2028': future_loc_pred[2] if len(future_loc_pred) > 2 else 0,
-                        'ปี_2029': future_loc_pred[3] if len(future_loc_pred) > 3 else 0,
-                        'ค่าเฉลี่ย_พยากรณ์': future_loc_pred.mean()
-                    })
-            
-            if location_forecasts:
-                loc_forecast_df = pd.DataFrame(location_forecasts)
+            if not loc_forecast_df.empty:
                 loc_forecast_df = loc_forecast_df.sort_values('ค่าเฉลี่ย_พยากรณ์', ascending=False)
                 
                 # กราฟเปรียบเทียบสถานที่
@@ -797,7 +857,7 @@ def show_forecast_page():
                     color_continuous_scale='RdYlGn_r'
                 )
                 fig.update_layout(height=600)
-                st.plotly_chart(fig, use_container_width=True)
+                show_chart(fig, "forecast_parks")
                 
                 st.dataframe(loc_forecast_df, use_container_width=True)
         else:
@@ -807,57 +867,17 @@ def show_forecast_page():
         st.subheader("แผนที่พยากรณ์ PM2.5")
 
         if forecast_location == "ทั้งหมด":
-            if 'forecast_table' not in locals() or forecast_table.empty:
-                st.warning("กรุณารันการพยากรณ์ในแท็บก่อนหน้าเพื่อแสดงผลบนแผนที่")
-            else:
-                latest_year = forecast_table['ปี'].max()
-                st.info(f"แสดงผลพยากรณ์สำหรับปี {latest_year}")
+            # ตารางพยากรณ์รายสวนที่ join พิกัดแล้ว (คำนวณครั้งเดียวต่อชุดข้อมูลและโมเดล)
+            forecast_map = get_forecast_map_table(df_processed, version, best_model, future_years)
+            forecast_table = forecast_map["table"]
 
-                if 'lat' not in df_processed.columns or 'lon' not in df_processed.columns:
-                    st.error("ไม่พบคอลัมน์ lat/lon ในข้อมูล")
-                else:
-                    merged = forecast_table.merge(
-                        df_processed[['สถานที่', 'lat', 'lon']].drop_duplicates(),
-                        on='สถานที่',
-                        how='left'
-                    )
-                    merged_latest = merged[merged['ปี'] == latest_year].dropna(subset=['lat', 'lon'])
-
-                    min_pm, max_pm = merged_latest['PM2.5_พยากรณ์'].min(), merged_latest['PM2.5_พยากรณ์'].max()
-                    merged_latest['color'] = merged_latest['PM2.5_พยากรณ์'].apply(
-                        lambda x: [int(255*(x-min_pm)/(max_pm-min_pm)), 50, int(255*(1-(x-min_pm)/(max_pm-min_pm))), 180]
-                    )
-                    merged_latest['radius'] = merged_latest['PM2.5_พยากรณ์'].apply(
-                        lambda x: 200 + (x - min_pm) / (max_pm - min_pm + 1e-6) * 600
-                    )
-
-                    view_state = pdk.ViewState(
-                        latitude=merged_latest['lat'].mean(),
-                        longitude=merged_latest['lon'].mean(),
-                        zoom=11,
-                        pitch=45
-                    )
-
-                    layer = pdk.Layer(
-                        "ScatterplotLayer",
-                        data=merged_latest,
-                        get_position='[lon, lat]',
-                        get_fill_color='color',
-                        get_radius='radius',
-                        pickable=True
-                    )
-
-                    tooltip = {
-                        "html": "<b>{สถานที่}</b><br/>PM2.5 พยากรณ์: {PM2.5_พยากรณ์:.2f}",
-                        "style": {"color": "white"}
-                    }
-
-                    st.pydeck_chart(pdk.Deck(
-                        map_style='mapbox://styles/mapbox/dark-v11',
-                        initial_view_state=view_state,
-                        layers=[layer],
-                        tooltip=tooltip
-                    ))
+            if forecast_map["missing"]:
+                st.warning("ไม่พบพิกัดของสถานที่ต่อไปนี้: " + ", ".join(forecast_map["missing"]))
+
+            if forecast_table.empty:
+                st.warning("ไม่มีข้อมูลพยากรณ์รายสวนที่มีพิกัดสำหรับแสดงบนแผนที่")
+            else:
+                show_forecast_map(forecast_table, best_model, future_years)
         else:
             st.info("ฟีเจอร์แผนที่สามารถใช้ได้เฉพาะเมื่อเลือกสถานที่ 'ทั้งหมด'")
 
@@ -893,5 +913,209 @@ def show_forecast_page():
             st.warning("⚡ ข้อควรระวัง: ค่าพยากรณ์เฉลี่ยอยู่ในระดับปานกลาง (25-50 μg/m³) ควรติดตามอย่างใกล้ชิด")
         else:
             st.success("ค่าพยากรณ์เฉลี่ยอยู่ในเกณฑ์ดี (≤25 μg/m³)")
+
+    with tab7:
+        show_exceedance_simulation(df_processed, version, forecast_location)
+
+@st.fragment
+def show_exceedance_simulation(df_processed, version, location):
+    """Monte Carlo of future exceedance days (fragment-scoped)"""
+    st.subheader("จำลองจำนวนวันเกินมาตรฐานในอนาคต (Monte Carlo)")
+
+    try:
+        # จำลองทุกสวนพร้อมกันครั้งเดียวต่อชุดข้อมูล (แคชร่วมกันทุก session)
+        simulation = get_exceedance_simulation(df_processed, version)
+    except Exception as e:
+        st.error(f"ข้อผิดพลาดในการจำลอง: {str(e)}")
+        return
+
+    st.caption(
+        f"{simulation['n_samples']:,} สถานการณ์ต่อสวน: ค่าเฉลี่ยรายเดือน = แนวโน้ม + ฤดูกาล + residual ที่สุ่มจากอดีต, "
+        f"ค่ารายวันแบบ lognormal (σ = {simulation['sigma']:.2f}) เทียบมาตรฐาน {DAILY_STANDARD} μg/m³"
+    )
+
+    years = [int(y) for y in simulation["years"]]
+    col1, col2 = st.columns(2)
+    sim_year = col1.select_slider("ปีที่จำลอง", options=years, value=years[0])
+    threshold = col2.slider("จำนวนวันเกินมาตรฐานต่อปี (เกณฑ์)", 1, 120, 30)
+
+    annual = annual_exceed_probability(simulation, threshold)
+    probability_column = annual.columns[-1]
+    annual = annual[annual['ปี'] == sim_year]
+
+    if location == 'ทั้งหมด':
+        annual = annual.sort_values('วันเกินมาตรฐาน_คาด', ascending=False)
+        fig = px.bar(
+            annual, x='วันเกินมาตรฐาน_คาด', y='สถานที่', orientation='h',
+            color=probability_column, color_continuous_scale='RdYlGn_r', range_color=(0, 1),
+            title=f'จำนวนวันเกินมาตรฐานที่คาดในปี {sim_year} (สี: โอกาสเกิน {threshold} วัน)'
+        )
+        fig.update_layout(height=600)
+        show_chart(fig, "exceedance_parks")
+        st.dataframe(annual.round(3), use_container_width=True, hide_index=True)
+        return
+
+    park = annual[annual['สถานที่'] == location]
+    if park.empty:
+        st.info("ไม่มีข้อมูลเพียงพอสำหรับจำลองสถานที่นี้")
+        return
+
+    col1, col2 = st.columns(2)
+    col1.metric(f"วันเกินมาตรฐานที่คาดในปี {sim_year}", f"{park['วันเกินมาตรฐาน_คาด'].iloc[0]:.1f} วัน")
+    col2.metric(f"โอกาสเกิน {threshold} วันในปี {sim_year}", f"{park[probability_column].iloc[0]:.0%}")
+
+    monthly = simulation["monthly"]
+    monthly = monthly[(monthly['สถานที่'] == location) & (monthly['ปี'] == sim_year)].copy()
+    monthly['เดือน'] = [MONTH_ORDER[m - 1] for m in monthly['เดือนที่']]
+
+    fig = go.Figure(go.Bar(
+        x=monthly['เดือน'],
+        y=monthly['วันเกินมาตรฐาน_คาด'],
+        name='ค่าคาดหมาย',
+        error_y=dict(
+            type='data', symmetric=False,
+            array=monthly['วันเกินมาตรฐาน_p90'] - monthly['วันเกินมาตรฐาน_คาด'],
+            arrayminus=monthly['วันเกินมาตรฐาน_คาด'] - monthly['วันเกินมาตรฐาน_p10']
+        )
+    ))
+    fig.update_layout(
+        title=f"จำนวนวันเกินมาตรฐานรายเดือน ปี {sim_year} (ช่วง p10-p90) - {location}",
+        xaxis_title="เดือน", yaxis_title="วัน", height=500
+    )
+    show_chart(fig, "exceedance_monthly")
+    st.dataframe(monthly.drop(columns='เดือนที่').round(3), use_container_width=True, hide_index=True)
+
+def show_monthly_forecast(df_processed, version, location, model_choice):
+    """Monthly-resolution forecast with seasonal features"""
+    series = monthly_series(df_processed, version, location)
+
+    st.subheader(f"ข้อมูลค่าเฉลี่ย PM2.5 รายเดือน - {location}")
+    if len(series) < 24:
+        st.warning("ต้องมีข้อมูลอย่างน้อย 24 เดือนสำหรับการพยากรณ์รายเดือน")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("จำนวนเดือนที่มีข้อมูล", len(series))
+    with col2:
+        st.metric("ค่าเฉลี่ยทั้งหมด", f"{series['ค่าเฉลี่ย'].mean():.1f} μg/m³")
+    with col3:
+        st.metric("เดือนล่าสุด", f"{MONTH_ORDER[int(series['เดือนที่'].iloc[-1]) - 1]} {int(series['ปี'].iloc[-1])}")
+
+    # โมเดลใช้ร่วมกันทุก session; เมื่อมีเดือนใหม่ต่อท้าย จะปรับโมเดลเดิมแทนการ train ใหม่
+    forecast = get_monthly_forecast(df_processed, version, location)
+    future = forecast["future"]
+    best_model = forecast["best_model"]
+
+    st.subheader(f"ประเมินโมเดลด้วย {HOLDOUT_MONTHS} เดือนล่าสุด (out-of-sample)")
+    st.dataframe(forecast["results"], use_container_width=True)
+    st.success(f"โมเดลที่ดีที่สุด: {best_model}")
+    if forecast["mode"] == "incremental":
+        st.caption(f"ปรับโมเดลจากข้อมูลชุดก่อนด้วยเดือนที่เพิ่มเข้ามา (partial fit / warm start) ครั้งที่ {forecast['updates']}")
+    else:
+        st.caption("train โมเดลใหม่ทั้งหมดจากข้อมูลชุดนี้")
+
+    models = MONTHLY_MODEL_NAMES if model_choice == "แสดงทุกโมเดล" else [model_choice]
+
+    # ข้อมูลจริงต่อด้วยค่าพยากรณ์ของแต่ละโมเดล
+    def period(frame):
+        return frame['ปี'].astype(str) + '-' + frame['เดือนที่'].astype(int).map('{:02d}'.format)
+
+    actual = pd.DataFrame({'ช่วงเวลา': period(series), 'PM2.5': series['ค่าเฉลี่ย'], 'ประเภท': 'ข้อมูลจริง'})
+    predicted = future.assign(ช่วงเวลา=period(future)).melt(
+        id_vars=['ช่วงเวลา'], value_vars=models, var_name='ประเภท', value_name='PM2.5'
+    )
+    fig = line_figure(
+        pd.concat([actual, predicted], ignore_index=True),
+        x='ช่วงเวลา', y='PM2.5', color='ประเภท', markers=True,
+        title=f"PM2.5 รายเดือน: ข้อมูลจริง vs การพยากรณ์ ({location})"
+    )
+    fig.add_hline(y=25, line_dash="dot", line_color="red", annotation_text="มาตรฐานไทย (25 μg/m³)")
+    show_chart(fig, "monthly_forecast")
+
+    # สรุปเป็นค่าเฉลี่ยรายปี เพื่อเทียบกับการพยากรณ์แบบรายปี
+    yearly = future.groupby('ปี')[MONTHLY_MODEL_NAMES].mean().reset_index()
+    yearly['ค่าเฉลี่ย'] = yearly[MONTHLY_MODEL_NAMES].mean(axis=1)
+    st.subheader("ค่าเฉลี่ยรายปีจากการพยากรณ์รายเดือน")
+    st.dataframe(yearly.round(2), use_container_width=True)
+
+    csv = future.drop(columns='t').to_csv(index=False, encoding='utf-8-sig')
+    st.download_button(
+        label="ดาวน์โหลดข้อมูลการพยากรณ์รายเดือน",
+        data=csv,
+        file_name=f"PM25_Monthly_Forecast_{location}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.csv",
+        mime="text/csv"
+    )
+
+@st.fragment
+def show_forecast_map(forecast_table, best_model, future_years):
+    """Forecast map for one selected year (fragment-scoped)"""
+    map_year = st.select_slider(
+        "เลือกปีที่พยากรณ์",
+        options=[int(y) for y in future_years],
+        value=int(future_years[-1])
+    )
+    st.info(f"แสดงผลพยากรณ์สำหรับปี {map_year} (โมเดล: {best_model})")
+
+    merged_latest = forecast_table[forecast_table['ปี'] == map_year]
+
+    view_state = pdk.ViewState(
+        latitude=float(merged_latest['lat'].mean()),
+        longitude=float(merged_latest['lon'].mean()),
+        zoom=11,
+        pitch=45
+    )
+
+    tooltip = {
+        "html": "<b>{สถานที่}</b><br/>PM2.5 พยากรณ์: {pm25_forecast}",
+        "style": {"color": "white"}
+    }
+
+    st.pydeck_chart(pdk.Deck(
+        map_style='mapbox://styles/mapbox/dark-v11',
+        initial_view_state=view_state,
+        layers=[forecast_layer(merged_latest)],
+        tooltip=tooltip
+    ))
+
+def show_sql_page():
+    st.header("คิวรี SQL")
+    st.markdown(
+        "เขียน SQL เพื่อวิเคราะห์ข้อมูลเพิ่มเติม ตาราง `pm25` (ข้อมูลรายเดือนแบบ long + `เดือนที่`, `เขต`) "
+        "และ `parks` (พิกัดสวน) · อ่านอย่างเดียว แสดงผลไม่เกิน {:,} แถว".format(MAX_ROWS)
+    )
+
+    if not sql_available():
+        st.info("ต้องติดตั้ง DuckDB ก่อนใช้งานหน้านี้: `pip install duckdb`")
+        return
+
+    partitions = list_partitions()
+    df_processed, version = load_park_data(partitions)
+    if df_processed is None:
+        return
+
+    example = st.selectbox("ตัวอย่างคิวรี", list(EXAMPLE_QUERIES))
+    sql = st.text_area("SQL", EXAMPLE_QUERIES[example].strip(), height=220)
+
+    if not st.button("รันคิวรี", type="primary"):
+        return
+
+    start = pd.Timestamp.now()
+    try:
+        result = run_query(df_processed, version, sql)
+    except QueryError as e:
+        st.error(f"คิวรีไม่สำเร็จ: {e}")
+        return
+    elapsed = (pd.Timestamp.now() - start).total_seconds() * 1000
+
+    st.caption(f"{len(result):,} แถว · {elapsed:.0f} ms")
+    st.dataframe(result, use_container_width=True)
+    st.download_button(
+        label="ดาวน์โหลดผลลัพธ์",
+        data=result.to_csv(index=False, encoding='utf-8-sig'),
+        file_name=f"PM25_Query_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.csv",
+        mime="text/csv"
+    )
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
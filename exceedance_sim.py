@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+from park_data import park_month_matrix
+from shared_cache import get_shared_cache
+
+# จำลอง Monte Carlo ของจำนวนวันที่ PM2.5 เกินมาตรฐานในอนาคต แยกตามสวนและเดือน
+#
+# 1. ค่าเฉลี่ยรายเดือนของทุกสวน: trend + ฤดูกาล (Fourier) fit ด้วย least squares พร้อมกันทุกสวน
+# 2. สุ่มค่าเฉลี่ยรายเดือนในอนาคต = ค่าพยากรณ์ + residual ที่สุ่มจากอดีตของสวนนั้น (bootstrap)
+# 3. ค่ารายวันในเดือนถือเป็น lognormal รอบค่าเฉลี่ย -> P(วันหนึ่งเกินมาตรฐาน)
+#    แล้วสุ่มจำนวนวันเกินมาตรฐานแบบ binomial
+# ทุกขั้นเป็น array ขนาด สวน x เดือน x ตัวอย่าง (แบ่งเป็น block ของสวนเพื่อคุมหน่วยความจำ)
+
+DAILY_STANDARD = 37.5  # มาตรฐานค่าเฉลี่ย 24 ชม. ของไทย (μg/m³)
+N_SAMPLES = 20_000
+MAX_BLOCK_ELEMENTS = 8_000_000
+MIN_RESIDUALS = 6
+
+
+def _features(t, center):
+    # trend วัดจากจุดกึ่งกลางของช่วงที่ fit (ต้องใช้ center เดิมกับเดือนในอนาคต)
+    t = np.asarray(t, dtype=float)
+    angle = 2 * np.pi * (t % 12) / 12
+    return np.column_stack([np.ones_like(t), (t - center) / 12, np.sin(angle), np.cos(angle),
+                            np.sin(2 * angle), np.cos(2 * angle)])
+
+
+def _days_in_month(t):
+    """Days per month for t = ปี(พ.ศ.)*12 + เดือน-1"""
+    t = np.asarray(t)
+    return pd.to_datetime(pd.DataFrame({
+        'year': t // 12 - 543, 'month': t % 12 + 1, 'day': 1
+    })).dt.days_in_month.to_numpy()
+
+
+def fit_seasonal_trend(t, means):
+    """Per-park least squares of trend + seasonality, solved for all parks at once (masked normal equations)
+
+    คืน (coef, residuals, center) โดย center คือจุดกึ่งกลางของ t ที่ใช้สร้าง feature
+    """
+    center = float(np.mean(t))
+    X = _features(t, center)
+    observed = ~np.isnan(means)
+    W = observed.astype(float)
+    Y = np.where(observed, means, 0.0)
+
+    # X^T W X และ X^T W y ของทุกสวนพร้อมกัน: (P, k, k) และ (P, k)
+    XtWX = np.einsum('pt,ti,tj->pij', W, X, X) + 1e-6 * np.eye(X.shape[1])
+    XtWy = np.einsum('pt,ti,pt->pi', W, X, Y)
+    coef = np.linalg.solve(XtWX, XtWy[..., None])[..., 0]
+
+    residuals = np.where(observed, means - coef @ X.T, np.nan)
+    return coef, residuals, center
+
+
+def exceed_probability(mean, sigma, standard=DAILY_STANDARD):
+    """P(daily value > standard) when daily values are lognormal with the given monthly mean"""
+    mu = np.log(np.maximum(mean, 0.1)) - sigma ** 2 / 2
+    return ndtr((mu - np.log(standard)) / sigma)
+
+
+def fit_daily_dispersion(means, exceed, days, grid=np.linspace(0.05, 1.5, 146)):
+    """Log-sd of daily values that best explains the historical exceedance counts (binomial likelihood)"""
+    valid = ~np.isnan(means) & ~np.isnan(exceed)
+    m, k, n = means[valid], np.minimum(exceed[valid], days[valid]), days[valid]
+    p = np.clip(exceed_probability(m[None, :], grid[:, None]), 1e-9, 1 - 1e-9)
+    loglik = (k * np.log(p) + (n - k) * np.log1p(-p)).sum(axis=1)
+    return float(grid[np.argmax(loglik)])
+
+
+def simulate_exceedance(df, horizon_years=4, n_samples=N_SAMPLES, seed=42):
+    """Monte Carlo of future exceedance days per park and month"""
+    rng = np.random.default_rng(seed)
+    parks, t, means, exceed = park_month_matrix(df)
+    days_hist = np.broadcast_to(_days_in_month(t), means.shape)
+
+    coef, residuals, center = fit_seasonal_trend(t, means)
+    sigma = fit_daily_dispersion(means, exceed, days_hist)
+
+    # เริ่มที่มกราคมของปีถัดจากข้อมูลล่าสุด ทุกปีในผลจำลองจึงครบ 12 เดือน
+    first = (t.max() // 12 + 1) * 12
+    future_t = np.arange(first, first + horizon_years * 12)
+    forecast = coef @ _features(future_t, center).T          # (P, H)
+    days = _days_in_month(future_t)                           # (H,)
+    years = future_t // 12
+    year_values, year_start = np.unique(years, return_index=True)
+    year_edges = np.append(year_start, len(years))
+
+    # residual ของแต่ละสวน จัดเรียงให้ค่าที่มีอยู่ก่อน เพื่อสุ่ม index ได้ทั้ง array
+    observed = ~np.isnan(residuals)
+    counts = observed.sum(axis=1)
+    pooled = residuals[observed].astype(np.float32)
+    if not pooled.size:
+        raise ValueError("ไม่มีข้อมูลรายเดือนเพียงพอสำหรับการจำลอง (ไม่มี residual จากอดีต)")
+    order = np.argsort(~observed, axis=1, kind='stable')
+    packed = np.take_along_axis(residuals, order, axis=1)
+
+    P, H = forecast.shape
+    expected = np.empty((P, H))
+    p_any = np.empty((P, H))
+    p10 = np.empty((P, H))
+    p90 = np.empty((P, H))
+    annual_expected = np.empty((P, len(year_values)))
+    max_days = int(days.max()) * 12 + 1
+    annual_survival = np.empty((P, len(year_values), max_days))
+
+    block = max(1, MAX_BLOCK_ELEMENTS // (H * n_samples))
+    for start in range(0, P, block):
+        rows = slice(start, min(start + block, P))
+        n_rows = rows.stop - rows.start
+
+        # bootstrap residual: สวนที่มี residual น้อยเกินไปใช้ residual รวมของทุกสวน
+        high = np.maximum(counts[rows], 1)[:, None, None]
+        pick = rng.integers(0, high, size=(n_rows, H, n_samples))
+        noise = np.take_along_axis(packed[rows].astype(np.float32), pick.reshape(n_rows, -1), axis=1)
+        noise = noise.reshape(pick.shape)
+        sparse = counts[rows] < MIN_RESIDUALS
+        if sparse.any():
+            noise[sparse] = pooled[rng.integers(0, len(pooled), size=(sparse.sum(), H, n_samples))]
+
+        scenario = forecast[rows, :, None].astype(np.float32) + noise     # (p, H, S)
+        prob = exceed_probability(scenario, np.float32(sigma))
+        sim_days = rng.binomial(days[None, :, None], prob).astype(np.int16)  # (p, H, S)
+
+        expected[rows] = sim_days.mean(axis=2)
+        p_any[rows] = (sim_days > 0).mean(axis=2)
+        p10[rows], p90[rows] = np.percentile(sim_days, [10, 90], axis=2)
+
+        # รวมเป็นรายปีด้วยผลต่างของผลรวมสะสม ณ ขอบปี แล้วเก็บ survival function P(รวมทั้งปี >= k วัน)
+        cumulative = np.concatenate([np.zeros((n_rows, 1, n_samples), dtype=np.int32),
+                                     sim_days.cumsum(axis=1, dtype=np.int32)], axis=1)
+        annual = np.diff(cumulative[:, year_edges], axis=1)                # (p, Y, S)
+        annual_expected[rows] = annual.mean(axis=2)
+        flat = (np.arange(n_rows * len(year_values))[:, None] * max_days + annual.reshape(-1, n_samples)).ravel()
+        hist = np.bincount(flat, minlength=n_rows * len(year_values) * max_days)
+        hist = hist.reshape(n_rows, len(year_values), max_days)
+        annual_survival[rows] = hist[..., ::-1].cumsum(axis=2)[..., ::-1] / n_samples
+
+    monthly = pd.DataFrame({
+        'สถานที่': np.repeat(parks, H),
+        'ปี': np.tile(years, P),
+        'เดือนที่': np.tile(future_t % 12 + 1, P),
+        'PM2.5_พยากรณ์': forecast.ravel(),
+        'วันเกินมาตรฐาน_คาด': expected.ravel(),
+        'วันเกินมาตรฐาน_p10': p10.ravel(),
+        'วันเกินมาตรฐาน_p90': p90.ravel(),
+        'P(เกิน≥1วัน)': p_any.ravel(),
+    })
+    yearly = pd.DataFrame({
+        'สถานที่': np.repeat(parks, len(year_values)),
+        'ปี': np.tile(year_values, P),
+        'วันเกินมาตรฐาน_คาด': annual_expected.ravel(),
+    })
+    return {
+        "monthly": monthly,
+        "yearly": yearly,
+        "parks": parks,
+        "years": year_values,
+        "annual_survival": annual_survival,
+        "sigma": sigma,
+        "n_samples": n_samples,
+    }
+
+
+def annual_exceed_probability(simulation, threshold):
+    """P(annual exceedance days >= threshold) per park and year"""
+    survival = simulation["annual_survival"]
+    k = int(np.clip(threshold, 0, survival.shape[2] - 1))
+    return simulation["yearly"].assign(**{f'P(≥{k}วัน)': survival[..., k].ravel()})
+
+
+def get_exceedance_simulation(df_processed, version, horizon_years=4, n_samples=N_SAMPLES):
+    """Exceedance-day simulation for every park, cached per dataset version"""
+    return get_shared_cache().get_or_compute(
+        ("exceedance_sim", version, horizon_years, n_samples),
+        lambda: simulate_exceedance(df_processed, horizon_years, n_samples)
+    )
@@ -0,0 +1,179 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# ชั้นสร้างกราฟ Plotly ที่ส่งข้อมูลไปยัง browser ให้น้อยที่สุด
+# - Box Plot ส่งเฉพาะค่าสถิติ (q1, median, q3, fences) + outliers แทนข้อมูลทุกแถว
+# - Scatter/Line ใช้ WebGL เมื่อจำนวนจุดเกิน WEBGL_THRESHOLD
+# - อนุกรมเวลายาวๆ ถูกลดจำนวนจุดด้วย LTTB ให้เหลือไม่เกิน MAX_LINE_POINTS ต่อเส้น
+# - Heatmap ความคล้ายที่มีสถานีเกิน MAX_HEATMAP_SIZE แสดงเป็นค่าเฉลี่ยระดับกลุ่มแทน
+
+WEBGL_THRESHOLD = 1000
+MAX_LINE_POINTS = 2000
+MAX_BOX_TRACES = 50
+MAX_HEATMAP_SIZE = 400
+
+logger = logging.getLogger(__name__)
+
+# ตั้ง PM25_FIGURE_LOG=1 เพื่อ log ขนาด payload ของแต่ละกราฟ
+if os.environ.get("PM25_FIGURE_LOG"):
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+
+
+def log_payload(fig, name):
+    """Log the serialized size of a figure and return the figure unchanged"""
+    if logger.isEnabledFor(logging.INFO):
+        size = len(fig.to_json())
+        logger.info("figure %s: %.1f KB", name, size / 1024)
+    return fig
+
+
+def box_stats(df, x, y):
+    """Per-group box statistics (Tukey fences at 1.5 IQR) and the outlier rows"""
+    data = df[[x, y]].dropna()
+    # Categorical เรียงตามลำดับหมวดหมู่ (เช่น เดือน) นอกนั้นเรียงตามลำดับที่พบในข้อมูล
+    ordered = isinstance(data[x].dtype, pd.CategoricalDtype)
+    grouped = data.groupby(x, observed=True, sort=ordered)[y]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    stats['mean'] = grouped.mean()
+
+    iqr = stats['q3'] - stats['q1']
+    low_limit = (stats['q1'] - 1.5 * iqr).rename('low_limit')
+    high_limit = (stats['q3'] + 1.5 * iqr).rename('high_limit')
+    data = data.join(low_limit, on=x).join(high_limit, on=x)
+
+    inside = data[(data[y] >= data['low_limit']) & (data[y] <= data['high_limit'])]
+    stats['lowerfence'] = inside.groupby(x, observed=True)[y].min()
+    stats['upperfence'] = inside.groupby(x, observed=True)[y].max()
+
+    outliers = data.loc[(data[y] < data['low_limit']) | (data[y] > data['high_limit']), [x, y]]
+    return stats.reset_index(), outliers
+
+
+def box_figure(df, x, y, title, color=True):
+    """Box plot from precomputed statistics instead of raw points"""
+    stats, outliers = box_stats(df, x, y)
+    fig = go.Figure()
+
+    if color and len(stats) <= MAX_BOX_TRACES:
+        palette = px.colors.qualitative.Plotly
+        groups = [(i, stats.iloc[[i]]) for i in range(len(stats))]
+    else:
+        palette = [px.colors.qualitative.Plotly[0]]
+        groups = [(0, stats)]
+
+    for i, part in groups:
+        name = str(part[x].iloc[0]) if len(part) == 1 else y
+        fig.add_trace(go.Box(
+            x=part[x].astype(str),
+            q1=part['q1'], median=part['median'], q3=part['q3'],
+            lowerfence=part['lowerfence'], upperfence=part['upperfence'],
+            mean=part['mean'],
+            name=name,
+            marker_color=palette[i % len(palette)],
+            showlegend=len(groups) > 1
+        ))
+
+    if not outliers.empty:
+        fig.add_trace(go.Scatter(
+            x=outliers[x].astype(str),
+            y=outliers[y],
+            mode='markers',
+            name='Outliers',
+            marker=dict(color='rgba(0,0,0,0.5)', size=5),
+            showlegend=False
+        ))
+
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+    # คงลำดับกล่องตาม box_stats: ลำดับหมวดหมู่ของ Categorical หรือลำดับที่พบในข้อมูล
+    fig.update_xaxes(categoryorder='array', categoryarray=stats[x].astype(str).tolist())
+    return fig
+
+
+def scatter_figure(df, **kwargs):
+    """px.scatter that switches to WebGL for large frames"""
+    render_mode = 'webgl' if len(df) > WEBGL_THRESHOLD else 'svg'
+    return px.scatter(df, render_mode=render_mode, **kwargs)
+
+
+def lttb_indices(x, y, n_out):
+    """Indices kept by Largest-Triangle-Three-Buckets downsampling"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(df, x, y, max_points=MAX_LINE_POINTS, group=None):
+    """Shape-preserving LTTB downsampling of one or several (grouped) series"""
+    if len(df) <= max_points:
+        return df
+    if group is None:
+        ordered = df.sort_values(x)
+        x_values = ordered[x]
+        if not pd.api.types.is_numeric_dtype(x_values):
+            x_values = pd.Series(np.arange(len(ordered)), index=ordered.index)
+        return ordered.iloc[lttb_indices(x_values.to_numpy(), ordered[y].to_numpy(), max_points)]
+    return pd.concat(
+        [downsample(part, x, y, max_points) for _, part in df.groupby(group, observed=True, sort=False)],
+        ignore_index=True
+    )
+
+
+def line_figure(df, x, y, color=None, max_points=MAX_LINE_POINTS, **kwargs):
+    """px.line with LTTB downsampling for long series and WebGL for large ones"""
+    data = downsample(df, x, y, max_points, group=color)
+    render_mode = 'webgl' if len(data) > WEBGL_THRESHOLD else 'svg'
+    return px.line(data, x=x, y=y, color=color, render_mode=render_mode, **kwargs)
+
+
+def similarity_heatmap(matrix, names, order, groups, title):
+    """Distance heatmap in dendrogram order; large matrices are averaged per group"""
+    matrix = np.asarray(matrix)[np.ix_(order, order)]
+    names = np.asarray(names)[order]
+    groups = np.asarray(groups)[order]
+
+    if len(names) > MAX_HEATMAP_SIZE:
+        labels, inverse = np.unique(groups, return_inverse=True)
+        onehot = np.zeros((len(groups), len(labels)))
+        onehot[np.arange(len(groups)), inverse] = 1.0
+        counts = onehot.sum(axis=0)
+        matrix = (onehot.T @ matrix @ onehot) / np.outer(counts, counts)
+        names = np.array([f"กลุ่ม {label} ({int(n)} สวน)" for label, n in zip(labels, counts)])
+
+    fig = go.Figure(go.Heatmap(
+        z=np.round(matrix.astype(float), 3),
+        x=names,
+        y=names,
+        colorscale='Viridis_r',
+        colorbar=dict(title='ระยะห่าง')
+    ))
+    fig.update_layout(title=title, height=max(500, min(len(names), 60) * 18))
+    fig.update_xaxes(showticklabels=len(names) <= 60, tickangle=45)
+    fig.update_yaxes(showticklabels=len(names) <= 60, autorange='reversed')
+    return fig
@@ -0,0 +1,317 @@
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LinearRegression, SGDRegressor
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.svm import SVR
+from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
+
+from metrics import timed
+from park_data import MONTH_ORDER, yearly_means
+from shared_cache import get_shared_cache
+
+# การพยากรณ์ค่าเฉลี่ย PM2.5 รายปี (ไม่ขึ้นกับ Streamlit)
+
+FORECAST_HORIZON = 4
+
+MODEL_NAMES = ["Linear Regression", "Random Forest", "Gradient Boosting", "SVM (RBF)"]
+
+
+def build_models():
+    """Create fresh (unfitted) forecast models"""
+    return {
+        "Linear Regression": LinearRegression(),
+        "Random Forest": RandomForestRegressor(random_state=42),
+        "Gradient Boosting": GradientBoostingRegressor(random_state=42),
+        "SVM (RBF)": SVR(kernel="rbf")
+    }
+
+
+def fit_forecast_models(df_yearly, horizon=FORECAST_HORIZON):
+    """Fit every model on yearly means, score on the last 20% and forecast `horizon` years"""
+    # แบ่งข้อมูล train/test
+    X = df_yearly[["ปี"]]
+    y = df_yearly["ค่าเฉลี่ย"]
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    models = build_models()
+
+    results = []
+    future_preds = {}
+    last_year = int(df_yearly["ปี"].max())
+    future_years = np.array([last_year + i for i in range(1, horizon + 1)]).reshape(-1, 1)
+    future_scaled = scaler.transform(pd.DataFrame(future_years, columns=["ปี"]))
+
+    for name, model in models.items():
+        with timed("pm25_model_fit_seconds", model=name, mode="full"):
+            model.fit(X_train_scaled, y_train)
+        y_pred = model.predict(X_test_scaled)
+
+        results.append({
+            "Model": name,
+            "R² Score": r2_score(y_test, y_pred),
+            "MAE": mean_absolute_error(y_test, y_pred),
+            "RMSE": np.sqrt(mean_squared_error(y_test, y_pred))
+        })
+
+        # ทำนายปีข้างหน้า
+        future_preds[name] = model.predict(future_scaled)
+
+    results_df = pd.DataFrame(results).sort_values(by="R² Score", ascending=False)
+
+    return {
+        "results": results_df,
+        "best_model": results_df.iloc[0]['Model'],
+        "last_year": last_year,
+        "future_years": future_years.flatten(),
+        "future_preds": future_preds,
+        "models": models,
+        "scaler": scaler,
+    }
+
+
+def forecast_park(df_loc_yearly, model_name, future_years):
+    """Fit one model on a single park's yearly means and predict future_years"""
+    X_loc = df_loc_yearly[["ปี"]]
+    y_loc = df_loc_yearly["ค่าเฉลี่ย"]
+
+    scaler = StandardScaler()
+    X_loc_scaled = scaler.fit_transform(X_loc)
+
+    model = build_models()[model_name]
+    with timed("pm25_model_fit_seconds", model=model_name, mode="full"):
+        model.fit(X_loc_scaled, y_loc)
+
+    future_scaled = scaler.transform(pd.DataFrame(np.asarray(future_years).reshape(-1, 1), columns=["ปี"]))
+    return model.predict(future_scaled)
+
+
+def get_forecast(df_processed, version, location='ทั้งหมด', horizon=FORECAST_HORIZON):
+    """Fitted models and forecasts for one location, shared across sessions"""
+    return get_shared_cache().get_or_compute(
+        ("forecast", version, location, horizon),
+        lambda: fit_forecast_models(yearly_means(df_processed, version, location), horizon)
+    )
+
+
+def get_forecast_table(df_processed, version, model_name, future_years):
+    """Long per-park forecast table (สถานที่, ปี, PM2.5_พยากรณ์) for parks with at least 3 years of data"""
+    def compute():
+        locations, years, preds = [], [], []
+        for location in df_processed['สถานที่'].unique():
+            df_loc_yearly = yearly_means(df_processed, version, location)
+
+            if len(df_loc_yearly) >= 3:  # ต้องมีข้อมูลอย่างน้อย 3 ปี
+                locations.extend([location] * len(future_years))
+                years.extend(int(y) for y in future_years)
+                preds.extend(forecast_park(df_loc_yearly, model_name, future_years))
+        return pd.DataFrame({'สถานที่': locations, 'ปี': years, 'PM2.5_พยากรณ์': preds})
+
+    return get_shared_cache().get_or_compute(
+        ("forecast_table", version, model_name, tuple(int(y) for y in future_years)),
+        compute
+    )
+
+
+def get_park_forecasts(df_processed, version, model_name, future_years):
+    """Per-park forecasts with one model, one column per forecast year"""
+    def compute():
+        table = get_forecast_table(df_processed, version, model_name, future_years)
+        location_forecasts = []
+        for location, part in table.groupby('สถานที่', sort=False):
+            future_loc_pred = part['PM2.5_พยากรณ์'].to_numpy()
+            location_forecasts.append({
+                'สถานที่': location,
+                # ชื่อคอลัมน์ตามปีที่พยากรณ์จริง (พ.ศ.)
+                **{f'ปี_{int(year)}': pred for year, pred in zip(future_years, future_loc_pred)},
+                'ค่าเฉลี่ย_พยากรณ์': future_loc_pred.mean()
+            })
+        return pd.DataFrame(location_forecasts)
+
+    return get_shared_cache().get_or_compute(
+        ("park_forecasts", version, model_name, tuple(int(y) for y in future_years)),
+        compute
+    )
+
+
+# การพยากรณ์รายเดือน: ใช้ข้อมูลทุกเดือน (มากกว่ารายปี 12 เท่า) + feature ฤดูกาล
+# เมื่อมีเดือนใหม่เข้ามา โมเดลเดิมจะถูกปรับเพิ่ม (partial_fit / warm start) แทนการ train ใหม่ทั้งหมด
+
+MONTHLY_MODEL_NAMES = ["Linear Regression (SGD)", "Random Forest", "Gradient Boosting"]
+
+HOLDOUT_MONTHS = 12
+PARTIAL_FIT_EPOCHS = 20
+WARM_START_TREES = 10
+MAX_TREES = 300
+
+
+def build_monthly_models():
+    """Create fresh (unfitted) monthly models that support incremental refits"""
+    return {
+        "Linear Regression (SGD)": SGDRegressor(max_iter=2000, tol=1e-4, random_state=42),
+        "Random Forest": RandomForestRegressor(n_estimators=100, warm_start=True, random_state=42),
+        "Gradient Boosting": GradientBoostingRegressor(n_estimators=100, warm_start=True, random_state=42),
+    }
+
+
+def monthly_series(df_processed, version, location='ทั้งหมด'):
+    """Monthly mean PM2.5 (ปี, เดือนที่, t = ปี*12 + เดือน-1), cached per dataset version"""
+    def compute():
+        df = df_processed if location == 'ทั้งหมด' else df_processed[df_processed['สถานที่'] == location]
+        month_no = df['เดือน'].astype(str).map({month: i + 1 for i, month in enumerate(MONTH_ORDER)})
+        series = df.groupby([df['ปี'], month_no.rename('เดือนที่')])['ค่าเฉลี่ย'].mean().dropna().reset_index()
+        series['t'] = series['ปี'] * 12 + series['เดือนที่'] - 1
+        return series.sort_values('t', ignore_index=True)
+
+    return get_shared_cache().get_or_compute(("monthly_series", version, location), compute)
+
+
+def seasonal_features(t):
+    """Trend + first two Fourier harmonics of the month (t = ปี*12 + เดือน-1)"""
+    t = np.asarray(t, dtype=float)
+    angle = 2 * np.pi * (t % 12) / 12
+    return np.column_stack([t, np.sin(angle), np.cos(angle), np.sin(2 * angle), np.cos(2 * angle)])
+
+
+class MonthlyForecaster:
+    """Monthly models with seasonal features that can absorb new months incrementally"""
+
+    def __init__(self):
+        self.models = build_monthly_models()
+        self.scaler = None
+        self.X = np.empty((0, 5))
+        self.y = np.empty(0)
+        self.last_t = None
+        # ค่าจริง/ค่าทำนายล่วงหน้าล่าสุด (out-of-sample) ใช้ประเมินโมเดล
+        self.holdout = {name: (np.empty(0), np.empty(0)) for name in self.models}
+        self.updates = 0
+
+    def fit(self, t, y):
+        """Full fit on the given months"""
+        # scaler คงที่หลัง fit ครั้งแรก เพื่อให้ค่าสัมประสิทธิ์เดิมยังใช้กับเดือนใหม่ได้
+        self.scaler = StandardScaler().fit(seasonal_features(t))
+        self.X = self.scaler.transform(seasonal_features(t))
+        self.y = np.asarray(y, dtype=float)
+        self.last_t = int(np.max(t))
+        for name, model in self.models.items():
+            with timed("pm25_model_fit_seconds", model=name, mode="full"):
+                model.fit(self.X, self.y)
+        return self
+
+    def update(self, t, y):
+        """Absorb months after last_t: score them first, then partial_fit / add warm-start trees"""
+        t, y = np.asarray(t), np.asarray(y, dtype=float)
+        new = t > self.last_t
+        if not new.any():
+            return self
+        X_new = self.scaler.transform(seasonal_features(t[new]))
+        y_new = y[new]
+
+        for name, model in self.models.items():
+            y_true, y_pred = self.holdout[name]
+            self.holdout[name] = (
+                np.concatenate([y_true, y_new])[-HOLDOUT_MONTHS:],
+                np.concatenate([y_pred, model.predict(X_new)])[-HOLDOUT_MONTHS:]
+            )
+
+        self.X = np.vstack([self.X, X_new])
+        self.y = np.concatenate([self.y, y_new])
+        self.last_t = int(t[new].max())
+
+        for name, model in self.models.items():
+            with timed("pm25_model_fit_seconds", model=name, mode="incremental"):
+                if hasattr(model, "partial_fit"):
+                    for _ in range(PARTIAL_FIT_EPOCHS):
+                        model.partial_fit(X_new, y_new)
+                elif model.n_estimators + WARM_START_TREES <= MAX_TREES:
+                    # warm start: สร้างเฉพาะต้นไม้/stage ใหม่ ต้นเดิมไม่ถูก train ซ้ำ
+                    model.n_estimators += WARM_START_TREES
+                    model.fit(self.X, self.y)
+                else:
+                    model.set_params(warm_start=False, n_estimators=100)
+                    model.fit(self.X, self.y)
+                    model.set_params(warm_start=True)
+        self.updates += 1
+        return self
+
+    def predict(self, t):
+        X = self.scaler.transform(seasonal_features(t))
+        return {name: model.predict(X) for name, model in self.models.items()}
+
+    def scores(self):
+        """R²/MAE/RMSE over the latest out-of-sample months, best model first"""
+        results = []
+        for name, (y_true, y_pred) in self.holdout.items():
+            results.append({
+                "Model": name,
+                "R² Score": r2_score(y_true, y_pred) if len(y_true) > 1 else np.nan,
+                "MAE": mean_absolute_error(y_true, y_pred) if len(y_true) else np.nan,
+                "RMSE": np.sqrt(mean_squared_error(y_true, y_pred)) if len(y_true) else np.nan
+            })
+        return pd.DataFrame(results).sort_values(by="R² Score", ascending=False)
+
+
+def _is_prefix(old, new):
+    """True when the new series only appends months to the old one"""
+    if len(old) > len(new):
+        return False
+    head = new.iloc[:len(old)]
+    return (np.array_equal(old['t'].to_numpy(), head['t'].to_numpy())
+            and np.allclose(old['ค่าเฉลี่ย'].to_numpy(), head['ค่าเฉลี่ย'].to_numpy()))
+
+
+def fit_monthly_forecaster(series, previous=None):
+    """Update a copy of the previous forecaster when months were only appended, otherwise fit from scratch"""
+    t, y = series['t'].to_numpy(), series['ค่าเฉลี่ย'].to_numpy()
+    if previous is not None and _is_prefix(previous["series"], series):
+        return previous["forecaster"].copy().update(t, y), "incremental"
+
+    # fit บนข้อมูลทั้งหมดยกเว้น 12 เดือนล่าสุด แล้ว update ด้วย 12 เดือนนั้น (ได้คะแนน out-of-sample)
+    split = max(len(t) - HOLDOUT_MONTHS, len(t) // 2)
+    forecaster = MonthlyForecaster().fit(t[:split], y[:split])
+    return forecaster.update(t[split:], y[split:]), "full"
+
+
+def _dataset_identity(version):
+    """The data source behind a version token, unchanged when months are appended to it"""
+    if version[0] == "partitions":
+        # ปีใหม่เป็น partition ใหม่ในโฟลเดอร์เมืองเดิม จึงระบุด้วยโฟลเดอร์ city=... ที่เลือก
+        return ("partitions",) + tuple(sorted({os.path.dirname(os.path.dirname(path)) for path, *_ in version[1:]}))
+    return os.path.abspath(version[0])
+
+
+def get_monthly_forecast(df_processed, version, location='ทั้งหมด', horizon=FORECAST_HORIZON):
+    """Monthly forecasts for `horizon` years, refitted incrementally when new months are appended"""
+    cache = get_shared_cache()
+    # state แยกตามแหล่งข้อมูล: คนละเมือง/คนละไฟล์ต้องไม่ใช้โมเดลของกันและกัน
+    state_key = ("monthly_state", _dataset_identity(version), location)
+
+    def compute():
+        series = monthly_series(df_processed, version, location)
+        forecaster, mode = fit_monthly_forecaster(series, cache.get(state_key))
+        cache.put(state_key, {"series": series, "forecaster": forecaster})
+
+        future_t = np.arange(forecaster.last_t + 1, forecaster.last_t + 1 + horizon * 12)
+        future = pd.DataFrame({'ปี': future_t // 12, 'เดือนที่': future_t % 12 + 1, 't': future_t})
+        for name, preds in forecaster.predict(future_t).items():
+            future[name] = preds
+
+        results = forecaster.scores()
+        return {
+            "series": series,
+            "future": future,
+            "results": results,
+            "best_model": results.iloc[0]['Model'],
+            "mode": mode,
+            "updates": forecaster.updates,
+        }
+
+    return cache.get_or_compute(("monthly_forecast", version, location, horizon), compute)
@@ -0,0 +1,214 @@
+"""Headless concurrent-session load test for the dashboard
+
+จำลองผู้ใช้ N คนพร้อมกันด้วย Streamlit AppTest แล้ววัด latency ของการ rerun,
+CPU และหน่วยความจำ (RSS) ต่อจำนวน session
+
+    python loadtest.py --sessions 1 4 8 --steps 20
+    python loadtest.py --sessions 8 --max-p95-ms 3000
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:  # psutil เป็น optional ใช้ /proc แทนถ้าไม่มี
+    psutil = None
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+REPORT_PAGE = "รายงานวิเคราะห์"
+FORECAST_PAGE = "การพยากรณ์ 4 ปีข้างหน้า"
+
+# label ของ widget ที่ผู้ใช้จำลองจะเปลี่ยนค่าในแต่ละหน้า
+REPORT_ACTIONS = ["เลือกสถานที่", "ช่วงเวลา", "เลือกเดือน", "เลือกประเภท Box Plot:"]
+FORECAST_ACTIONS = ["เลือกสถานที่สำหรับการพยากรณ์", "เลือกโมเดลที่ต้องการใช้"]
+
+# ตัวกรองใน sidebar อยู่ในฟอร์ม ต้องกดปุ่มนี้หลังเปลี่ยนค่า
+FORM_SUBMIT = {
+    "เลือกสถานที่": "ใช้ตัวกรอง",
+    "ช่วงเวลา": "ใช้ตัวกรอง",
+    "เลือกเดือน": "ใช้ตัวกรอง",
+    "เลือกสถานที่สำหรับการพยากรณ์": "ใช้การตั้งค่า",
+    "เลือกโมเดลที่ต้องการใช้": "ใช้การตั้งค่า",
+}
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # ru_maxrss เป็น KB บน Linux และ bytes บน macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+# st.error ที่เป็นคำเตือนระดับค่าฝุ่น (ไม่ใช่ความล้มเหลว) ขึ้นต้นด้วยไอคอนนี้
+ADVISORY_PREFIX = "⚠️"
+
+
+def _count_errors(at):
+    """(uncaught exceptions, st.error messages) shown after a rerun
+
+    แอปจับ exception ส่วนใหญ่แล้วแสดงเป็น st.error จึงต้องนับทั้งสองแบบ
+    """
+    alerts = [e for e in at.error if not str(e.value).startswith(ADVISORY_PREFIX)]
+    return len(at.exception), len(alerts)
+
+
+def _find_widget(at, label):
+    for widget in list(at.selectbox) + list(at.radio) + list(at.select_slider) + list(at.button):
+        if widget.label == label:
+            return widget
+    return None
+
+
+def run_session(session_id, steps, timeout, seed):
+    """Drive one simulated user; returns (per-rerun latencies in seconds, exceptions, st.error count)"""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed + session_id)
+    latencies = []
+    errors = alerts = 0
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    latencies.append(time.perf_counter() - start)
+    errors, alerts = _count_errors(at)
+
+    # ช่วงเวลาทั้งหมดจากค่าเริ่มต้นของ slider (ตัวเลือกแสดงเป็นข้อความ ค่าเป็นลำดับเดือน)
+    period_widget = _find_widget(at, "ช่วงเวลา")
+    full_period = period_widget.value if period_widget is not None else None
+
+    for _ in range(steps):
+        page_widget = _find_widget(at, "เลือกหน้า")
+        # ผู้ใช้ส่วนใหญ่อยู่หน้ารายงาน บางครั้งสลับไปหน้าพยากรณ์
+        if page_widget is not None and rng.random() < 0.2:
+            target = FORECAST_PAGE if page_widget.value == REPORT_PAGE else REPORT_PAGE
+            page_widget.set_value(target)
+        else:
+            page = page_widget.value if page_widget is not None else REPORT_PAGE
+            actions = REPORT_ACTIONS if page == REPORT_PAGE else FORECAST_ACTIONS
+            widget = _find_widget(at, rng.choice(actions))
+            if widget is None:
+                continue
+            if widget.label == "ช่วงเวลา" and full_period is not None:
+                low, high = full_period
+                widget.set_value(tuple(sorted(rng.sample(range(low, high + 1), 2))))
+            else:
+                widget.set_value(rng.choice(list(widget.options)))
+            if widget.label in FORM_SUBMIT:
+                submit = _find_widget(at, FORM_SUBMIT[widget.label])
+                if submit is not None:
+                    submit.click()
+
+        start = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - start)
+        exceptions, shown = _count_errors(at)
+        errors += exceptions
+        alerts += shown
+
+    return latencies, errors, alerts
+
+
+def run_load(sessions, steps, timeout=120, seed=0):
+    """Run `sessions` concurrent users and collect latency, CPU and RSS figures"""
+    peak_rss = [current_rss_mb()]
+    stop = threading.Event()
+
+    def sample_rss():
+        while not stop.wait(0.2):
+            peak_rss.append(current_rss_mb())
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    from streamlit.testing.v1.util import patch_config_options
+
+    # AppTest เปิด global.appTest ระหว่างแต่ละ run แล้วคืนค่าเดิมตอนจบ (เป็น config ระดับโปรเซส)
+    # ถ้าไม่เปิดค้างไว้ session ที่จบก่อนจะปิดให้ session อื่นที่ยังรันอยู่ และ widget บางตัวจะหาย
+    with patch_config_options({"global.appTest": True}), ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(lambda i: run_session(i, steps, timeout, seed), range(sessions)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    stop.set()
+    sampler.join()
+
+    latencies = [lat for session_lat, _, _ in results for lat in session_lat]
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "errors": sum(err for _, err, _ in results),
+        "st_errors": sum(alerts for _, _, alerts in results),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else float("nan"),
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "cpu_util": cpu / wall if wall else float("nan"),
+        "peak_rss_mb": max(peak_rss),
+    }
+
+
+REPORT_HEADER = (f"{'sessions':>8} {'reruns':>7} {'errors':>6} {'st.error':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+                 f"{'wall s':>8} {'cpu s':>8} {'cpu %':>6} {'rss MB':>8}")
+
+
+def format_row(r):
+    return (f"{r['sessions']:>8} {r['reruns']:>7} {r['errors']:>6} {r['st_errors']:>8} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+            f"{r['p99_ms']:>9.1f} {r['wall_s']:>8.1f} {r['cpu_s']:>8.1f} {r['cpu_util'] * 100:>6.0f} "
+            f"{r['peak_rss_mb']:>8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless concurrent-session load test for app.py")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="จำนวน session พร้อมกันที่จะทดสอบ (หลายค่าได้)")
+    parser.add_argument("--steps", type=int, default=10, help="จำนวนการเปลี่ยน widget ต่อ session")
+    parser.add_argument("--timeout", type=float, default=120, help="timeout ต่อการ rerun (วินาที)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="ให้ exit code เป็น 1 ถ้า p95 latency เกินค่านี้ (ใช้จับ regression ใน CI)")
+    args = parser.parse_args(argv)
+
+    # AppTest อ้างอิงไฟล์ข้อมูลแบบ relative path จึงต้องรันจากโฟลเดอร์ของแอป
+    os.chdir(os.path.dirname(APP_PATH))
+
+    print(REPORT_HEADER)
+    print("-" * len(REPORT_HEADER))
+    failed = 0
+    for n in args.sessions:
+        row = run_load(n, args.steps, args.timeout, args.seed)
+        failed += row["errors"] + row["st_errors"]
+        if args.max_p95_ms is not None and row["p95_ms"] > args.max_p95_ms:
+            failed += 1
+        print(format_row(row), flush=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
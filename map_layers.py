@@ -0,0 +1,250 @@
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+from forecasting import get_forecast_table
+from park_coordinates import PARK_COORDINATES
+from shared_cache import get_shared_cache
+
+# ชั้นข้อมูลแผนที่สำหรับเครือข่ายเซนเซอร์จำนวนมาก
+# พิกัดสถานีเตรียมเป็น array แบบ columnar ครั้งเดียวแล้วเก็บในแคชกลาง
+# เมื่อเปลี่ยนตัวกรองจะคำนวณใหม่เฉพาะค่าของแต่ละสถานี (payload ของ layer)
+
+RISK_LABELS = np.array(["🟢 ดี", "🟡 ปานกลาง", "🔴 เสี่ยงสูง", "ไม่มีข้อมูล"], dtype=object)
+RISK_COLORS = np.array([
+    [0, 200, 0],
+    [255, 215, 0],
+    [255, 0, 0],
+    [200, 200, 200],
+], dtype=np.uint8)
+
+# จำนวนจุดที่เกินค่านี้จะใช้ layer แบบรวมกลุ่ม (grid/heatmap) เป็นค่าเริ่มต้น
+DENSE_THRESHOLD = 2000
+DEFAULT_CELL_M = 1000
+
+MAP_MODES = ["จุด", "กริด", "Heatmap"]
+
+# สีของกลุ่มสวน (ชุดสี qualitative ของ Plotly)
+CLUSTER_COLORS = np.array([
+    [99, 110, 250], [239, 85, 59], [0, 204, 150], [171, 99, 250], [255, 161, 90],
+    [25, 211, 243], [255, 102, 146], [182, 232, 128], [255, 151, 255], [254, 203, 82],
+], dtype=np.uint8)
+
+
+def risk_codes(values):
+    """Vectorized PM2.5 risk level (0=ดี, 1=ปานกลาง, 2=เสี่ยงสูง, 3=ไม่มีข้อมูล)"""
+    values = np.asarray(values, dtype=float)
+    return np.select([np.isnan(values), values <= 25, values <= 50], [3, 0, 1], 2)
+
+
+def build_station_index(names):
+    """Columnar station arrays (name, lat, lon) for the parks that have coordinates"""
+    names = [name for name in names if name in PARK_COORDINATES]
+    lat = np.array([PARK_COORDINATES[n]['lat'] for n in names], dtype=np.float32)
+    lon = np.array([PARK_COORDINATES[n]['lon'] for n in names], dtype=np.float32)
+    return {
+        "name": np.array(names, dtype=object),
+        # ดัชนีชื่อสวน -> แถว ใช้ join พิกัดแบบ hash lookup แทนการ merge ทุกครั้ง
+        "index": pd.Index(names),
+        "name_en": np.array([PARK_COORDINATES[n]['name_en'] for n in names], dtype=object),
+        "lat": lat,
+        "lon": lon,
+        "center": (float(lat.mean()), float(lon.mean())) if len(names) else (13.75, 100.55),
+    }
+
+
+def get_station_index():
+    """Station index for every park with known coordinates, built once per process"""
+    return get_shared_cache().get_or_compute(
+        ("stations", len(PARK_COORDINATES)),
+        lambda: build_station_index(list(PARK_COORDINATES))
+    )
+
+
+def join_coordinates(df, stations, name_column='สถานที่'):
+    """Attach lat/lon from the station index; return (joined rows, names without coordinates)"""
+    rows = stations["index"].get_indexer(df[name_column])
+    found = rows >= 0
+    joined = df[found].copy()
+    joined['lat'] = stations["lat"][rows[found]]
+    joined['lon'] = stations["lon"][rows[found]]
+    missing = sorted(set(df.loc[~found, name_column]))
+    return joined, missing
+
+
+def get_forecast_map_table(df_processed, version, model_name, future_years):
+    """Per-park forecast table joined to coordinates once, plus parks that have no coordinates"""
+    def compute():
+        table = get_forecast_table(df_processed, version, model_name, future_years)
+        joined, missing = join_coordinates(table, get_station_index())
+        return {"table": joined, "missing": tuple(missing)}
+
+    return get_shared_cache().get_or_compute(
+        ("forecast_map", version, model_name, tuple(int(y) for y in future_years)),
+        compute
+    )
+
+
+def forecast_layer(table, value_column='PM2.5_พยากรณ์'):
+    """Scatter layer of forecast values: color and radius scaled between min and max (tooltip field: pm25_forecast)"""
+    pm = table[value_column].to_numpy(dtype=float)
+    scaled = (pm - pm.min()) / (pm.max() - pm.min() + 1e-6) if len(pm) else pm
+    data = pd.DataFrame({
+        "สถานที่": table['สถานที่'].to_numpy(),
+        "lon": table['lon'].to_numpy(),
+        "lat": table['lat'].to_numpy(),
+        "pm25_forecast": np.round(pm, 2),
+        "color": np.column_stack([
+            (255 * scaled).astype(int), np.full(len(pm), 50),
+            (255 * (1 - scaled)).astype(int), np.full(len(pm), 180)
+        ]).tolist(),
+        "radius": 200 + scaled * 600,
+    })
+    return pdk.Layer(
+        "ScatterplotLayer",
+        data=data,
+        get_position=["lon", "lat"],
+        get_fill_color="color",
+        get_radius="radius",
+        pickable=True
+    )
+
+
+def station_values(df, stations, column='ค่าเฉลี่ย'):
+    """Mean of `column` per station, aligned to the station index (NaN where no data)"""
+    means = df.groupby('สถานที่', observed=True)[column].mean()
+    return means.reindex(stations["name"]).to_numpy(dtype=np.float32)
+
+
+def aggregate_grid(lat, lon, values, cell_m=DEFAULT_CELL_M):
+    """Server-side square-grid aggregation: cell centers, mean value and point count"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    deg_lat = cell_m / 111_320.0
+    deg_lon = cell_m / (111_320.0 * np.cos(np.radians(np.nanmean(lat))))
+    cells = np.stack([np.floor(lat / deg_lat), np.floor(lon / deg_lon)], axis=1).astype(np.int64)
+    unique_cells, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    has_value = ~np.isnan(values)
+    count = np.bincount(inverse, minlength=len(unique_cells))
+    valid = np.bincount(inverse, weights=has_value, minlength=len(unique_cells))
+    total = np.bincount(inverse, weights=np.where(has_value, values, 0.0), minlength=len(unique_cells))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid > 0, total / valid, np.nan)
+
+    return {
+        "lat": ((unique_cells[:, 0] + 0.5) * deg_lat).astype(np.float32),
+        "lon": ((unique_cells[:, 1] + 0.5) * deg_lon).astype(np.float32),
+        "value": mean.astype(np.float32),
+        "count": count.astype(np.int32),
+    }
+
+
+def _layer_frame(lat, lon, values, extra=None):
+    codes = risk_codes(values)
+    frame = pd.DataFrame({
+        "lon": lon,
+        "lat": lat,
+        "pm25_avg": np.round(values.astype(float), 1),
+        "ระดับความเสี่ยง": RISK_LABELS[codes],
+        "color": RISK_COLORS[codes].tolist(),
+    })
+    if extra:
+        for key, column in extra.items():
+            frame[key] = column
+    return frame
+
+
+def scatter_layer(stations, values, radius=200):
+    """One point per station, colored by risk level"""
+    data = _layer_frame(stations["lat"], stations["lon"], values, {"name": stations["name"]})
+    return pdk.Layer(
+        "ScatterplotLayer",
+        data=data,
+        get_position=["lon", "lat"],
+        get_fill_color="color",
+        get_radius=radius,
+        pickable=True,
+    )
+
+
+def grid_layer(lat, lon, values, cell_m=DEFAULT_CELL_M):
+    """Extruded square cells of the server-side grid aggregation"""
+    grid = aggregate_grid(lat, lon, values, cell_m)
+    data = _layer_frame(grid["lat"], grid["lon"], grid["value"], {"name": grid["count"].astype(str) + " จุด"})
+    return pdk.Layer(
+        "ColumnLayer",
+        data=data,
+        get_position=["lon", "lat"],
+        get_fill_color="color",
+        get_elevation="pm25_avg",
+        elevation_scale=50,
+        radius=cell_m / np.sqrt(2),
+        disk_resolution=4,
+        angle=45,
+        extruded=True,
+        pickable=True,
+    )
+
+
+def heatmap_layer(lat, lon, values, cell_m=DEFAULT_CELL_M):
+    """Heatmap over pre-aggregated grid cells weighted by mean PM2.5"""
+    grid = aggregate_grid(lat, lon, values, cell_m)
+    keep = ~np.isnan(grid["value"])
+    data = pd.DataFrame({
+        "lon": grid["lon"][keep],
+        "lat": grid["lat"][keep],
+        "weight": np.round(grid["value"][keep].astype(float), 1),
+    })
+    return pdk.Layer(
+        "HeatmapLayer",
+        data=data,
+        get_position=["lon", "lat"],
+        get_weight="weight",
+        aggregation="MEAN",
+    )
+
+
+def station_deck(stations, values, mode=None, cell_m=DEFAULT_CELL_M, zoom=11):
+    """Deck for station values; dense networks default to server-side grid aggregation"""
+    if mode is None:
+        mode = "จุด" if len(stations["name"]) <= DENSE_THRESHOLD else "กริด"
+
+    if mode == "กริด":
+        layer = grid_layer(stations["lat"], stations["lon"], values, cell_m)
+    elif mode == "Heatmap":
+        layer = heatmap_layer(stations["lat"], stations["lon"], values, cell_m)
+    else:
+        layer = scatter_layer(stations, values)
+
+    lat, lon = stations["center"]
+    view_state = pdk.ViewState(latitude=lat, longitude=lon, zoom=zoom, pitch=45 if mode == "กริด" else 0)
+    tooltip = None if mode == "Heatmap" else {"text": "{name}\nค่าเฉลี่ย PM2.5: {pm25_avg}\n{ระดับความเสี่ยง}"}
+    return pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip=tooltip)
+
+
+def cluster_deck(clusters, stations, radius=300, zoom=11):
+    """Scatter deck of parks colored by cluster label (tooltip: name, กลุ่ม)"""
+    joined, _ = join_coordinates(clusters, stations)
+    labels = joined['กลุ่ม'].to_numpy()
+    data = pd.DataFrame({
+        "name": joined['สถานที่'].to_numpy(),
+        "lon": joined['lon'].to_numpy(),
+        "lat": joined['lat'].to_numpy(),
+        "กลุ่ม": labels,
+        "color": CLUSTER_COLORS[(labels - 1) % len(CLUSTER_COLORS)].tolist(),
+    })
+    layer = pdk.Layer(
+        "ScatterplotLayer",
+        data=data,
+        get_position=["lon", "lat"],
+        get_fill_color="color",
+        get_radius=radius,
+        pickable=True,
+    )
+    lat, lon = stations["center"]
+    view_state = pdk.ViewState(latitude=lat, longitude=lon, zoom=zoom)
+    return pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip={"text": "{name}\nกลุ่ม {กลุ่ม}"})
@@ -0,0 +1,233 @@
+"""Operational metrics in Prometheus text format
+
+ตัวชี้วัดที่เก็บ (ต่อโปรเซส):
+
+    pm25_rerun_seconds{page}              histogram เวลา rerun ของแต่ละหน้า
+    pm25_model_fit_seconds{model,mode}    histogram เวลา fit ของแต่ละโมเดล (full / incremental)
+    pm25_dataset_load_seconds{source}     histogram เวลาโหลดชุดข้อมูล (csv / shared / partitions)
+    pm25_prewarm_seconds{step}            histogram เวลาของแต่ละขั้นใน prewarm.py
+    pm25_cache_*                          hit, miss, eviction, hit ratio และขนาดของแคชกลาง
+    pm25_process_resident_memory_bytes    RSS ของโปรเซส
+
+เปิดใช้ด้วย environment variable (ไม่ตั้ง = ไม่ export):
+
+    PM25_METRICS_PORT=9108                  endpoint http://127.0.0.1:9108/metrics
+    PM25_METRICS_TEXTFILE=/var/lib/node_exporter/pm25.prom
+                                            เขียนไฟล์ทุก PM25_METRICS_INTERVAL วินาที (textfile collector)
+
+เมื่อรันหลายโปรเซส ใส่ {pid} ในชื่อไฟล์ (เช่น pm25-{pid}.prom) เพื่อให้แต่ละโปรเซสเขียนไฟล์ของตัวเอง
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from shared_cache import get_shared_cache
+
+try:
+    import psutil
+except ImportError:  # psutil เป็น optional (Linux อ่านจาก /proc ได้)
+    psutil = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+EXPORT_INTERVAL = float(os.environ.get("PM25_METRICS_INTERVAL", "15"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HELP = {
+    "pm25_rerun_seconds": "Duration of a Streamlit rerun per page",
+    "pm25_model_fit_seconds": "Duration of fitting one forecast model",
+    "pm25_dataset_load_seconds": "Duration of loading and preprocessing the dataset",
+    "pm25_prewarm_seconds": "Duration of one cache prewarm step",
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram for one label set"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Thread-safe histograms keyed by (name, labels)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: (h.buckets, list(h.counts), h.sum) for key, h in self._histograms.items()}
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+_registry = Registry()
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in the process-wide registry"""
+    _registry.observe(name, seconds, **labels)
+
+
+@contextmanager
+def timed(name, **labels):
+    """Time the enclosed block into histogram `name` (recorded even if the block raises)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registry.observe(name, time.perf_counter() - start, **labels)
+
+
+def resident_memory_bytes():
+    """Current RSS of this process, or None when it cannot be read"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics of this process in Prometheus text exposition format"""
+    lines = []
+
+    by_name = {}
+    for (name, labels), data in sorted(_registry.snapshot().items()):
+        by_name.setdefault(name, []).append((labels, data))
+    for name, series in by_name.items():
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, (buckets, counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(buckets + ("+Inf",), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(float(bound))
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(float(total))}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+    stats = get_shared_cache().stats()
+    for name, kind, value, help_text in (
+        ("pm25_cache_hits_total", "counter", stats["hits"], "Shared cache lookups served from the cache"),
+        ("pm25_cache_misses_total", "counter", stats["misses"], "Shared cache lookups that had to compute"),
+        ("pm25_cache_evictions_total", "counter", stats["evictions"], "Entries evicted to stay within budget"),
+        ("pm25_cache_hit_ratio", "gauge", stats["hit_ratio"], "Hits / lookups since process start"),
+        ("pm25_cache_entries", "gauge", stats["entries"], "Entries held by the shared cache"),
+        ("pm25_cache_bytes", "gauge", int(stats["used_mb"] * 1024 * 1024), "Estimated size of cached values"),
+        ("pm25_cache_budget_bytes", "gauge", int(stats["budget_mb"] * 1024 * 1024), "Memory budget of the cache"),
+        ("pm25_process_resident_memory_bytes", "gauge", resident_memory_bytes(), "Resident set size of the process"),
+    ):
+        if value is None:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {_number(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Write the metrics atomically for node_exporter's textfile collector"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrape ทุก 15 วินาที ไม่ต้อง log
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread of the current process"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="pm25-metrics", daemon=True).start()
+    return server
+
+
+def start_textfile_writer(path, interval=EXPORT_INTERVAL):
+    """Rewrite the textfile every `interval` seconds from a daemon thread"""
+    def loop():
+        while True:
+            try:
+                write_textfile(path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="pm25-metrics-textfile", daemon=True)
+    thread.start()
+    return thread
+
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def start_exporter():
+    """Start the exporters configured by environment variables, once per process"""
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+        port = os.environ.get("PM25_METRICS_PORT")
+        if port:
+            try:
+                start_http_server(int(port), os.environ.get("PM25_METRICS_HOST", "127.0.0.1"))
+            except OSError:
+                # หลายโปรเซสตั้ง port เดียวกัน: โปรเซสแรกได้ port ที่เหลือใช้ textfile แทน
+                pass
+        path = os.environ.get("PM25_METRICS_TEXTFILE")
+        if path:
+            start_textfile_writer(path.format(pid=os.getpid()))
+
@@ -0,0 +1,315 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from metrics import observe, timed
+from park_coordinates import PARK_COORDINATES
+from shared_cache import dataset_version, get_shared_cache
+from shared_dataset import map_dataset
+
+# การโหลดและประมวลผลข้อมูล AllParkYear.csv (ไม่ขึ้นกับ Streamlit)
+
+DATA_PATH = "Group_file/AllParkYear.csv"
+
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun',
+          'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+MONTHS_THAI = {
+    'jan': 'มกราคม', 'feb': 'กุมภาพันธ์', 'mar': 'มีนาคม',
+    'apr': 'เมษายน', 'may': 'พฤษภาคม', 'jun': 'มิถุนายน',
+    'jul': 'กรกฎาคม', 'aug': 'สิงหาคม', 'sep': 'กันยายน',
+    'oct': 'ตุลาคม', 'nov': 'พฤศจิกายน', 'dec': 'ธันวาคม'
+}
+
+MONTH_ORDER = [MONTHS_THAI[m] for m in MONTHS]
+
+# เลขเดือน 1-12 ของชื่อเดือนภาษาไทย
+MONTH_NUMBER = {month: i + 1 for i, month in enumerate(MONTH_ORDER)}
+
+
+METRICS = {
+    'ค่าต่ำสุด': 'lowest_PM2.5',
+    'ค่าสูงสุด': 'highest_PM2.5',
+    'ค่าเฉลี่ย': 'average_PM2.5',
+    'จำนวนวันเกินมาตรฐาน': 'day_exceeding_month'
+}
+
+METRIC_COLUMNS = [f'{month}_{suffix}' for month in MONTHS for suffix in METRICS.values()]
+
+# Dis_trict + 48 คอลัมน์ค่ารายเดือน + ปี
+RAW_COLUMNS = ['Dis_trict'] + METRIC_COLUMNS + ['ปี']
+
+
+# ค่าที่แหล่งข้อมูลใช้แทน "ไม่มีการตรวจวัด" เช่น " - " (ไม่นับเป็นค่าผิดรูปแบบ)
+MISSING_MARKERS = {'-', ''}
+
+
+def _coerce_metrics(wide):
+    """Numeric metric columns plus a mask of values that were present but not numeric"""
+    metrics = wide[METRIC_COLUMNS]
+    numeric = metrics.apply(pd.to_numeric, errors='coerce')
+    not_numeric = metrics.notna() & numeric.isna()
+    for column in not_numeric.columns[not_numeric.any()]:
+        failed = not_numeric[column]
+        markers = metrics.loc[failed, column].astype(str).str.strip().isin(MISSING_MARKERS)
+        not_numeric.loc[failed, column] = ~markers
+    return numeric, not_numeric
+
+
+def _reshape_long(wide, numeric, years):
+    """Wide rows -> one row per park, year and month (no rows dropped)"""
+    n = len(wide)
+    long_df = {
+        'สถานที่': np.repeat(wide['Dis_trict'].to_numpy(), len(MONTHS)),
+        'ปี': np.repeat(years.to_numpy(), len(MONTHS)),
+        'เดือน': np.tile(MONTH_ORDER, n),
+        'เดือนอังกฤษ': np.tile(MONTHS, n),
+    }
+    for name, suffix in METRICS.items():
+        columns = [f'{month}_{suffix}' for month in MONTHS]
+        long_df[name] = numeric[columns].to_numpy(dtype=float).ravel()
+    return pd.DataFrame(long_df)
+
+
+def _conform(df):
+    wide = df.reindex(columns=RAW_COLUMNS)
+    years = pd.to_numeric(wide['ปี'], errors='coerce')
+    valid = years.notna()
+    return wide[valid], years[valid].astype(int), wide[~valid]
+
+
+def preprocess_park_data(df):
+    """Preprocess park data for analysis (wide -> one row per park, year and month)"""
+    wide, years, _ = _conform(df)
+    numeric, _ = _coerce_metrics(wide)
+
+    # Convert to long format for easier analysis
+    long_df = _reshape_long(wide, numeric, years)
+
+    # ตัดเดือนที่ไม่มีการตรวจวัด PM2.5 เลย; ค่าที่ขาดบางส่วนคงเป็น NaN (ไม่แทนด้วย 0)
+    measured = long_df[['ค่าต่ำสุด', 'ค่าสูงสุด', 'ค่าเฉลี่ย']].notna().any(axis=1)
+    return long_df[measured].reset_index(drop=True)
+
+
+ISSUE_COLUMNS = ['ประเภท', 'สถานที่', 'ปี', 'เดือน', 'รายละเอียด']
+
+# การตรวจที่ต้องดูทั้งชุดข้อมูล (นำเข้าทีละ chunk ต้องรวมผลเองข้าม chunk)
+DUPLICATE_ISSUE = 'ข้อมูลซ้ำ (สวน-ปี)'
+UNKNOWN_PARK_ISSUE = 'ไม่รู้จักชื่อสวน'
+
+
+def _issue_rows(long_df, mask, issue, detail):
+    """Flagged rows of one check; detail is a string or a function of the flagged rows"""
+    flagged = long_df[mask]
+    rows = flagged[['สถานที่', 'ปี', 'เดือน']].copy()
+    rows.insert(0, 'ประเภท', issue)
+    rows['รายละเอียด'] = detail(flagged) if callable(detail) else detail
+    return rows
+
+
+def validate_park_data(raw):
+    """One-pass vectorized data quality checks on the raw wide table; returns a report dict"""
+    missing_columns = [c for c in RAW_COLUMNS if c not in raw.columns]
+    extra_columns = [c for c in raw.columns if c not in RAW_COLUMNS]
+    wide, years, bad_year_rows = _conform(raw)
+    numeric, not_numeric = _coerce_metrics(wide)
+    long_df = _reshape_long(wide, numeric, years)
+
+    issues = []
+
+    # ปีที่อ่านไม่ได้ (แถวนี้ถูกตัดออกจากข้อมูล)
+    if len(bad_year_rows):
+        issues.append(pd.DataFrame({
+            'ประเภท': 'ปีไม่ถูกต้อง',
+            'สถานที่': bad_year_rows['Dis_trict'],
+            'ปี': None,
+            'เดือน': None,
+            'รายละเอียด': bad_year_rows['ปี'].astype(str)
+        }))
+
+    # แยกค่าที่ไม่ใช่ตัวเลข ค่าที่ขาดบางส่วน และเดือนที่ไม่มีการตรวจวัดเลย
+    shape = (len(wide), len(MONTHS), len(METRICS))
+    not_numeric = not_numeric.to_numpy().reshape(shape).any(axis=2).ravel()
+    missing = numeric.isna().to_numpy().reshape(shape)
+    # 3 ค่าแรกของ METRICS คือค่า PM2.5 (ต่ำสุด สูงสุด เฉลี่ย)
+    no_measurement = missing[:, :, :3].all(axis=2).ravel()
+    partial = missing.any(axis=2).ravel() & ~no_measurement & ~not_numeric
+    issues.append(_issue_rows(long_df, not_numeric, 'ค่าไม่ใช่ตัวเลข', 'ถูกแปลงเป็น NaN'))
+    issues.append(_issue_rows(long_df, no_measurement & ~not_numeric, 'ไม่มีการตรวจวัด', 'ตัดเดือนนี้ออก'))
+    issues.append(_issue_rows(long_df, partial, 'ค่าว่าง', 'ไม่มีค่าในบางคอลัมน์'))
+
+    lowest, average, highest = long_df['ค่าต่ำสุด'], long_df['ค่าเฉลี่ย'], long_df['ค่าสูงสุด']
+    inconsistent = (lowest > average) | (average > highest) | (lowest > highest)
+    issues.append(_issue_rows(
+        long_df, inconsistent, 'ต่ำสุด ≤ เฉลี่ย ≤ สูงสุด ไม่เป็นจริง',
+        lambda rows: (rows['ค่าต่ำสุด'].astype(str) + ' / ' + rows['ค่าเฉลี่ย'].astype(str)
+                      + ' / ' + rows['ค่าสูงสุด'].astype(str))
+    ))
+
+    # วันเกินมาตรฐานต้องอยู่ระหว่าง 0 ถึงจำนวนวันในเดือน (ปี พ.ศ. - 543 = ค.ศ.)
+    days_in_month = pd.to_datetime(pd.DataFrame({
+        'year': long_df['ปี'] - 543,
+        'month': np.tile(np.arange(1, 13), len(long_df) // len(MONTHS)),
+        'day': 1
+    }), errors='coerce').dt.days_in_month
+    exceeding = long_df['จำนวนวันเกินมาตรฐาน']
+    bad_exceeding = (exceeding < 0) | (exceeding > days_in_month)
+    issues.append(_issue_rows(
+        long_df, bad_exceeding, 'วันเกินมาตรฐานเกินจำนวนวันในเดือน',
+        lambda rows: (rows['จำนวนวันเกินมาตรฐาน'].astype(str) + ' / '
+                      + days_in_month[rows.index].astype(str) + ' วัน')
+    ))
+
+    park_year = pd.DataFrame({'สถานที่': wide['Dis_trict'].to_numpy(), 'ปี': years.to_numpy()})
+    duplicated = park_year.duplicated(keep=False)
+    if duplicated.any():
+        issues.append(park_year[duplicated].drop_duplicates().assign(
+            ประเภท=DUPLICATE_ISSUE, เดือน=None, รายละเอียด='มีมากกว่า 1 แถว'
+        ))
+
+    unknown = sorted(set(wide['Dis_trict'].dropna()) - set(PARK_COORDINATES))
+    if unknown:
+        issues.append(pd.DataFrame({
+            'ประเภท': UNKNOWN_PARK_ISSUE,
+            'สถานที่': unknown,
+            'ปี': None,
+            'เดือน': None,
+            'รายละเอียด': 'ไม่มีใน PARK_COORDINATES'
+        }))
+
+    issues = [frame for frame in issues if len(frame)]
+    issues_df = pd.concat(issues, ignore_index=True)[ISSUE_COLUMNS] if issues else pd.DataFrame(columns=ISSUE_COLUMNS)
+    return {
+        "rows": len(raw),
+        "months": int((~no_measurement).sum()),
+        "missing_columns": missing_columns,
+        "extra_columns": extra_columns,
+        "issues": issues_df,
+        "summary": issues_df['ประเภท'].value_counts().to_dict(),
+    }
+
+
+def filter_park_data(df, location, year, month):
+    """Filter park data based on user selections"""
+    filtered = df.copy()
+
+    if location != 'ทั้งหมด':
+        filtered = filtered[filtered['สถานที่'] == location]
+
+    if year != 'ทั้งหมด':
+        year_int = int(year)
+        filtered = filtered[filtered['ปี'] == year_int]
+
+    if month != 'ทั้งหมด':
+        filtered = filtered[filtered['เดือน'] == month]
+
+    return filtered
+
+
+def period_key(year, month_no):
+    """Integer period of a (Buddhist-era year, month 1-12) pair: ปี*12 + เดือน-1 (consecutive months differ by 1)"""
+    return int(year) * 12 + int(month_no) - 1
+
+
+def period_label(key):
+    return f"{MONTH_ORDER[key % 12]} {key // 12}"
+
+
+def period_keys(df):
+    """Period key of every row"""
+    month_no = df['เดือน'].astype(str).map(MONTH_NUMBER)
+    return (df['ปี'] * 12 + month_no - 1).to_numpy(dtype=np.int64)
+
+
+def period_index(df_processed, version):
+    """Row positions sorted by period and the sorted keys, built once per dataset version"""
+    def compute():
+        keys = period_keys(df_processed)
+        order = np.argsort(keys, kind='stable')
+        return {"keys": keys[order], "order": order}
+
+    return get_shared_cache().get_or_compute(("period_index", version), compute)
+
+
+def filter_period(df_processed, version, start, end):
+    """Rows whose period lies in [start, end], located by binary search on the sorted period index"""
+    index = period_index(df_processed, version)
+    lo = np.searchsorted(index["keys"], start, side='left')
+    hi = np.searchsorted(index["keys"], end, side='right')
+    # เรียงตำแหน่งกลับตามลำดับเดิมของตาราง
+    return df_processed.iloc[np.sort(index["order"][lo:hi])]
+
+
+def park_month_matrix(df):
+    """Parks x months matrices of mean PM2.5 and exceedance days on a gap-free month grid
+
+    เดือนคือ t = ปี(พ.ศ.)*12 + เดือน-1 ตั้งแต่เดือนแรกถึงเดือนสุดท้ายของข้อมูล (เดือนที่ไม่ได้วัดเป็น NaN)
+    """
+    t = period_keys(df)
+    parks, park_idx = np.unique(df['สถานที่'].to_numpy(), return_inverse=True)
+    t_values = np.arange(t.min(), t.max() + 1) if len(t) else np.empty(0, dtype=np.int64)
+
+    means = np.full((len(parks), len(t_values)), np.nan)
+    exceed = np.full_like(means, np.nan)
+    if len(t):
+        means[park_idx, t - t.min()] = df['ค่าเฉลี่ย'].to_numpy(dtype=float)
+        exceed[park_idx, t - t.min()] = df['จำนวนวันเกินมาตรฐาน'].to_numpy(dtype=float)
+    return parks, t_values, means, exceed
+
+
+def _load_dataset(path):
+    version = dataset_version(path)
+
+    def compute():
+        # ใช้ snapshot ที่ loader เขียนไว้ใน shared memory ก่อน (ถ้าตรงกับไฟล์เวอร์ชันนี้)
+        start = time.perf_counter()
+        shared = map_dataset(version)
+        if shared is not None:
+            observe("pm25_dataset_load_seconds", time.perf_counter() - start, source="shared")
+            return shared
+        with timed("pm25_dataset_load_seconds", source="csv"):
+            raw = pd.read_csv(path)
+            return {"data": preprocess_park_data(raw), "quality": validate_park_data(raw)}
+
+    return get_shared_cache().get_or_compute(("dataset", version), compute), version
+
+
+def load_processed_data(path=DATA_PATH):
+    """Load, validate and preprocess the dataset once per file version, shared by all sessions"""
+    dataset, version = _load_dataset(path)
+    return dataset["data"], version
+
+
+def get_quality_report(path=DATA_PATH):
+    """Data quality report produced when the dataset was loaded"""
+    dataset, _ = _load_dataset(path)
+    return dataset["quality"]
+
+
+def yearly_means(df_processed, version, location='ทั้งหมด'):
+    """Yearly mean PM2.5 for one location (or all), cached per dataset version"""
+    def compute():
+        if location != 'ทั้งหมด':
+            df_filtered = df_processed[df_processed['สถานที่'] == location]
+        else:
+            df_filtered = df_processed
+        df_yearly = df_filtered.groupby("ปี")["ค่าเฉลี่ย"].mean().reset_index()
+        df_yearly["ค่าเฉลี่ย"] = pd.to_numeric(df_yearly["ค่าเฉลี่ย"], errors="coerce")
+        return df_yearly
+
+    return get_shared_cache().get_or_compute(("yearly_means", version, location), compute)
+
+
+def location_summary(df_filtered, version, filters):
+    """Per-location aggregates (mean/max/min/exceedance) of a filtered view, cached per dataset version"""
+    def compute():
+        summary = df_filtered.groupby('สถานที่', observed=True).agg({
+            'ค่าเฉลี่ย': 'mean',
+            'ค่าสูงสุด': 'max',
+            'ค่าต่ำสุด': 'min',
+            'จำนวนวันเกินมาตรฐาน': 'sum'
+        }).reset_index()
+        return summary
+
+    return get_shared_cache().get_or_compute(("location_summary", version, filters), compute)
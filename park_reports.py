@@ -0,0 +1,405 @@
+"""Standalone HTML report per park (plus a city summary) generated in parallel
+
+    python park_reports.py                     ทุกสวน -> reports/ (index.html + ไฟล์ละสวน)
+    python park_reports.py --jobs 8 --out /srv/reports
+    python park_reports.py --parks "สวนลุมพินี เขตปทุมวัน" "สวนจตุจักร เขตจตุจักร"
+
+แต่ละไฟล์เปิดได้โดยไม่ต้องต่ออินเทอร์เน็ต (ฝัง plotly.js ไว้ในไฟล์ครั้งเดียว) ประกอบด้วยตัวชี้วัด,
+แนวโน้มรายเดือน, วันเกินมาตรฐาน (จริง + จำลอง), การพยากรณ์รายปี และแผนที่ตำแหน่งสวน
+
+โปรเซสหลักโหลดชุดข้อมูล (เขียน snapshot ลง shared memory) และคำนวณผลระดับเมือง
+(โมเดลรวม, ตารางพยากรณ์รายสวน, การจำลองวันเกินมาตรฐาน, trend) ลงแคชกลางก่อนแยก worker
+บน Linux worker ถูก fork จึงได้แคชที่คำนวณแล้วโดยไม่ต้องคำนวณซ้ำ ส่วนแพลตฟอร์มที่ใช้ spawn
+worker จะ map ชุดข้อมูลจาก shared memory แล้วคำนวณผลระดับเมืองเองหนึ่งครั้งต่อ worker
+"""
+import argparse
+import hashlib
+import html
+import multiprocessing
+import os
+import re
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+from sklearn.exceptions import UndefinedMetricWarning
+
+from exceedance_sim import DAILY_STANDARD, get_exceedance_simulation
+from figures import line_figure
+from forecasting import MODEL_NAMES, get_forecast, get_forecast_table
+from map_layers import get_station_index, station_values
+from park_coordinates import PARK_COORDINATES
+from park_data import DATA_PATH, location_summary, period_keys, yearly_means
+from park_trends import get_trends, trend_frame
+from partitioned_data import PARTITION_ROOT
+from prewarm import load_default_dataset
+
+ALL = 'ทั้งหมด'
+REPORT_ROOT = "reports"
+INDEX_FILE = "index.html"
+PM25_STANDARD = 25  # มาตรฐานค่าเฉลี่ยรายปีของไทย (μg/m³)
+
+STYLE = """
+body { font-family: "Sarabun", "Noto Sans Thai", Tahoma, sans-serif; margin: 0 auto; max-width: 1100px;
+       padding: 24px; color: #222; }
+h1 { margin-bottom: 4px; }
+h2 { margin-top: 36px; border-bottom: 2px solid #eee; padding-bottom: 4px; }
+.meta, footer { color: #777; font-size: 0.9em; }
+footer { margin-top: 48px; }
+.cards { display: flex; flex-wrap: wrap; gap: 12px; }
+.card { flex: 1 1 150px; border: 1px solid #e3e3e3; border-radius: 8px; padding: 12px 16px; }
+.card .label { color: #666; font-size: 0.85em; }
+.card .value { font-size: 1.5em; font-weight: 600; }
+table { border-collapse: collapse; width: 100%; font-size: 0.9em; }
+th, td { border-bottom: 1px solid #eee; padding: 6px 8px; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+"""
+
+PAGE = """<!DOCTYPE html>
+<html lang="th">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>{style}</style>
+<script type="text/javascript">{plotly_js}</script>
+</head>
+<body>
+<h1>{title}</h1>
+<p class="meta">{subtitle}</p>
+{body}
+<footer>สร้างเมื่อ {generated} จากข้อมูล {source}</footer>
+</body>
+</html>
+"""
+
+# สถานะของ worker แต่ละโปรเซส (ตั้งใน _init_worker)
+_state = {}
+
+
+@lru_cache(maxsize=1)
+def _plotly_js():
+    # อ่านครั้งเดียวต่อโปรเซส (~3.5 MB)
+    return get_plotlyjs()
+
+
+def report_filename(park):
+    """ASCII file name of a park's report (English name when known, otherwise a hash of the Thai name)"""
+    name_en = PARK_COORDINATES.get(park, {}).get('name_en')
+    if name_en:
+        return re.sub(r'[^a-z0-9]+', '-', name_en.lower()).strip('-') + ".html"
+    return "park-" + hashlib.sha1(park.encode("utf-8")).hexdigest()[:10] + ".html"
+
+
+def _figure_html(fig):
+    return fig.to_html(full_html=False, include_plotlyjs=False, config={"displaylogo": False})
+
+
+def _table_html(df, escape=True):
+    return df.to_html(index=False, border=0, escape=escape, na_rep="–",
+                      float_format=lambda value: f"{value:,.2f}")
+
+
+def _cards_html(cards):
+    items = "".join(
+        f'<div class="card"><div class="label">{html.escape(label)}</div>'
+        f'<div class="value">{html.escape(value)}</div></div>'
+        for label, value in cards
+    )
+    return f'<div class="cards">{items}</div>'
+
+
+def _section(title, *parts):
+    return f"<h2>{html.escape(title)}</h2>\n" + "\n".join(parts)
+
+
+def _page(title, subtitle, sections, source):
+    return PAGE.format(
+        title=html.escape(title),
+        subtitle=subtitle,
+        style=STYLE,
+        plotly_js=_plotly_js(),
+        body="\n".join(sections),
+        generated=pd.Timestamp.now().strftime('%Y-%m-%d %H:%M'),
+        source=html.escape(str(source)),
+    )
+
+
+def _format(value, unit="", digits=1):
+    return "N/A" if value is None or pd.isna(value) else f"{value:,.{digits}f}{unit}"
+
+
+def _period_labels(t):
+    t = np.asarray(t)
+    return [f"{year}-{month:02d}" for year, month in zip(t // 12, t % 12 + 1)]
+
+
+def map_snapshot(df, highlight=None, title="ตำแหน่งสวนและค่าเฉลี่ย PM2.5"):
+    """Static lon/lat scatter of every park colored by mean PM2.5 (no map tiles, works offline)"""
+    stations = get_station_index()
+    values = station_values(df, stations)
+    keep = ~np.isnan(values)
+    names, lat, lon = stations["name"][keep], stations["lat"][keep], stations["lon"][keep]
+
+    fig = go.Figure(go.Scatter(
+        x=lon, y=lat, mode='markers', text=names,
+        marker=dict(size=14, color=values[keep], colorscale='RdYlGn_r',
+                    colorbar=dict(title='PM2.5'), line=dict(width=1, color='white')),
+        hovertemplate='%{text}<br>PM2.5 เฉลี่ย: %{marker.color:.1f}<extra></extra>',
+        showlegend=False
+    ))
+    if highlight is not None and highlight in set(names):
+        row = int(np.flatnonzero(names == highlight)[0])
+        fig.add_trace(go.Scatter(
+            x=[lon[row]], y=[lat[row]], mode='markers+text', text=[highlight], textposition='top center',
+            marker=dict(size=24, symbol='star', color='rgba(0,0,0,0)', line=dict(width=3, color='black')),
+            hoverinfo='skip', showlegend=False
+        ))
+    center_lat = float(lat.mean()) if len(lat) else stations["center"][0]
+    fig.update_layout(title=title, height=550, xaxis_title='ลองจิจูด', yaxis_title='ละติจูด')
+    # 1 องศาลองจิจูดสั้นกว่า 1 องศาละติจูด cos(lat) เท่า
+    fig.update_yaxes(scaleanchor='x', scaleratio=1 / np.cos(np.radians(center_lat)))
+    return fig
+
+
+def warm_city(df, version):
+    """City-wide results every park report reads; computed once before the workers start"""
+    forecast = get_forecast(df, version, ALL)
+    summary = location_summary(df, version, (ALL, ALL, ALL))
+    table = get_forecast_table(df, version, forecast["best_model"], forecast["future_years"])
+    simulation = get_exceedance_simulation(df, version)
+    trends = get_trends(df, version, ALL)
+    get_station_index()
+    return {"forecast": forecast, "summary": summary, "table": table,
+            "simulation": simulation, "trends": trends}
+
+
+def render_park_report(df, version, park, city, source=DATA_PATH):
+    """HTML of one park's report"""
+    part = df[df['สถานที่'] == park]
+    summary = city["summary"].sort_values('ค่าเฉลี่ย', ascending=False, ignore_index=True)
+    rank = int(np.flatnonzero(summary['สถานที่'] == park)[0]) + 1
+    trends = city["trends"]
+    trend_row = trends["summary"][trends["summary"]['สถานที่'] == park].iloc[0]
+    simulation = city["simulation"]
+    sim_yearly = simulation["yearly"][simulation["yearly"]['สถานที่'] == park]
+    next_year = int(simulation["years"][0])
+    expected_next = sim_yearly.loc[sim_yearly['ปี'] == next_year, 'วันเกินมาตรฐาน_คาด']
+
+    sections = [_cards_html([
+        ("PM2.5 เฉลี่ย", _format(part['ค่าเฉลี่ย'].mean(), " μg/m³")),
+        ("ค่าสูงสุด", _format(part['ค่าสูงสุด'].max(), " μg/m³")),
+        ("วันเกินมาตรฐาน (รวม)", _format(part['จำนวนวันเกินมาตรฐาน'].sum(), " วัน", 0)),
+        ("อันดับค่าเฉลี่ยในเมือง", f"{rank} / {len(summary)}"),
+        ("trend เปลี่ยนแปลง", _format(trend_row['trend เปลี่ยนแปลง'], " μg/m³")),
+        (f"วันเกินมาตรฐานที่คาด ปี {next_year}",
+         _format(expected_next.iloc[0] if len(expected_next) else None, " วัน")),
+    ])]
+
+    # แนวโน้มรายเดือน: ค่าจริง + ค่าเฉลี่ยเคลื่อนที่ 12 เดือน + trend จากการแยกองค์ประกอบ
+    frame = trend_frame(trends, park, 12)
+    series = frame.melt(id_vars=['ช่วงเวลา'], value_vars=['ค่าเฉลี่ย', 'ค่าเฉลี่ยเคลื่อนที่ 12 เดือน', 'trend'],
+                        var_name='ชุดข้อมูล', value_name='PM2.5').dropna()
+    fig = line_figure(series, x='ช่วงเวลา', y='PM2.5', color='ชุดข้อมูล', markers=True,
+                      title=f'PM2.5 รายเดือน - {park}')
+    fig.add_hline(y=PM25_STANDARD, line_dash="dot", line_color="red", annotation_text="มาตรฐานไทย (25 μg/m³)")
+    fig.update_layout(height=450)
+    sections.append(_section("แนวโน้มรายเดือน", _figure_html(fig)))
+
+    # วันเกินมาตรฐาน: ข้อมูลจริงต่อด้วยค่าคาดหมายจากการจำลอง (ช่วง p10-p90)
+    history = part.assign(t=period_keys(part)).sort_values('t')
+    future = simulation["monthly"][simulation["monthly"]['สถานที่'] == park]
+    fig = go.Figure([
+        go.Bar(x=_period_labels(history['t']), y=history['จำนวนวันเกินมาตรฐาน'], name='ข้อมูลจริง'),
+        go.Bar(
+            x=_period_labels(future['ปี'] * 12 + future['เดือนที่'] - 1), y=future['วันเกินมาตรฐาน_คาด'],
+            name='จำลอง (ค่าคาดหมาย)', marker_color='indianred',
+            error_y=dict(type='data', symmetric=False,
+                         array=future['วันเกินมาตรฐาน_p90'] - future['วันเกินมาตรฐาน_คาด'],
+                         arrayminus=future['วันเกินมาตรฐาน_คาด'] - future['วันเกินมาตรฐาน_p10'])
+        ),
+    ])
+    fig.update_layout(title=f"จำนวนวันที่ค่ารายวันเกิน {DAILY_STANDARD} μg/m³ ต่อเดือน",
+                      xaxis_title="เดือน", yaxis_title="วัน", height=450)
+    sections.append(_section("วันเกินมาตรฐาน", _figure_html(fig),
+                             _table_html(sim_yearly.drop(columns='สถานที่').round(1))))
+
+    # การพยากรณ์รายปี (ต้องมีข้อมูลอย่างน้อย 3 ปี เหมือนตารางพยากรณ์รายสวน)
+    df_yearly = yearly_means(df, version, park)
+    if len(df_yearly) >= 3:
+        forecast = get_forecast(df, version, park)
+        fig = go.Figure(go.Scatter(x=df_yearly['ปี'], y=df_yearly['ค่าเฉลี่ย'], mode='lines+markers',
+                                   name='ข้อมูลจริง', line=dict(color='blue', width=3)))
+        for model_name in MODEL_NAMES:
+            best = model_name == forecast["best_model"]
+            fig.add_trace(go.Scatter(
+                x=forecast["future_years"], y=forecast["future_preds"][model_name], mode='lines+markers',
+                name=f'พยากรณ์ - {model_name}' + (' (ดีที่สุด)' if best else ''),
+                line=dict(dash='dash', width=3 if best else 1.5)
+            ))
+        fig.update_layout(title=f"ค่าเฉลี่ย PM2.5 รายปี: ข้อมูลจริง vs การพยากรณ์ {len(forecast['future_years'])} ปี",
+                          xaxis_title="ปี", yaxis_title="PM2.5 (μg/m³)", hovermode='x unified', height=450)
+        sections.append(_section("การพยากรณ์", _figure_html(fig), _table_html(forecast["results"])))
+    else:
+        sections.append(_section("การพยากรณ์", "<p>ต้องมีข้อมูลอย่างน้อย 3 ปีสำหรับการพยากรณ์</p>"))
+
+    sections.append(_section("แผนที่", _figure_html(map_snapshot(df, highlight=park))))
+
+    years = sorted(part['ปี'].unique().tolist())
+    subtitle = html.escape(f"รายงาน PM2.5 ปี {years[0]}–{years[-1]}") if years else ""
+    subtitle += f' · <a href="{INDEX_FILE}">สรุปทั้งเมือง</a>'
+    return _page(park, subtitle, sections, source)
+
+
+def render_city_report(df, version, city, source=DATA_PATH):
+    """HTML of the city summary with links to every park report"""
+    forecast = city["forecast"]
+    first_year = int(forecast["future_years"][0])
+    simulation = city["simulation"]
+
+    table = city["summary"].copy()
+    predictions = city["table"][city["table"]['ปี'] == first_year].set_index('สถานที่')['PM2.5_พยากรณ์']
+    expected = simulation["yearly"][simulation["yearly"]['ปี'] == int(simulation["years"][0])]
+    table[f'พยากรณ์ปี {first_year}'] = table['สถานที่'].map(predictions)
+    table[f'วันเกินมาตรฐานที่คาด ปี {int(simulation["years"][0])}'] = (
+        table['สถานที่'].map(expected.set_index('สถานที่')['วันเกินมาตรฐาน_คาด'])
+    )
+    table['trend เปลี่ยนแปลง'] = table['สถานที่'].map(
+        city["trends"]["summary"].set_index('สถานที่')['trend เปลี่ยนแปลง']
+    )
+    table = table.sort_values('ค่าเฉลี่ย', ascending=False, ignore_index=True)
+    fig = go.Figure(go.Bar(x=table['ค่าเฉลี่ย'], y=table['สถานที่'], orientation='h',
+                           marker=dict(color=table['ค่าเฉลี่ย'], colorscale='RdYlGn_r')))
+    fig.update_layout(title='ค่าเฉลี่ย PM2.5 แยกตามสถานที่', height=600, yaxis=dict(autorange='reversed'))
+
+    # ชื่อสวนเป็นลิงก์ไปยังรายงานของสวน (escape เองเพราะตารางนี้ไม่ escape)
+    table['สถานที่'] = [f'<a href="{report_filename(p)}">{html.escape(p)}</a>' for p in table['สถานที่']]
+    for column in table.columns[1:]:
+        table[column] = table[column].map(lambda value: _format(value, digits=2))
+
+    yearly = yearly_means(df, version, ALL)
+    sections = [
+        _cards_html([
+            ("PM2.5 เฉลี่ย", _format(df['ค่าเฉลี่ย'].mean(), " μg/m³")),
+            ("จำนวนสถานที่", f"{df['สถานที่'].nunique()} แห่ง"),
+            ("วันเกินมาตรฐาน (รวม)", _format(df['จำนวนวันเกินมาตรฐาน'].sum(), " วัน", 0)),
+            ("โมเดลที่ดีที่สุด", forecast["best_model"]),
+            (f"พยากรณ์ปี {first_year}", _format(forecast["future_preds"][forecast["best_model"]][0], " μg/m³")),
+        ]),
+        _section("สวนสาธารณะ", _table_html(table, escape=False), _figure_html(fig)),
+        _section("ค่าเฉลี่ยรายปีทั้งเมือง", _table_html(yearly)),
+        _section("แผนที่", _figure_html(map_snapshot(df))),
+    ]
+    return _page("รายงาน PM2.5 สวนสาธารณะ - สรุปทั้งเมือง", "", sections, source)
+
+
+def _write(path, text):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(path, root, publish=False):
+    # fork: ชุดข้อมูลและผลระดับเมืองอยู่ในแคชที่สืบทอดมาแล้ว (cache hit ทั้งหมด)
+    # R² ของชุดทดสอบ 1 ปีเป็น NaN เหมือนในแดชบอร์ด ไม่ต้องเตือนซ้ำทุกสวน
+    warnings.simplefilter("ignore", UndefinedMetricWarning)
+    df, version = load_default_dataset(path, root, publish)
+    _state.update(df=df, version=version, city=warm_city(df, version), source=path)
+
+
+def _render_task(park, out_dir):
+    start = time.perf_counter()
+    text = render_park_report(_state["df"], _state["version"], park, _state["city"], _state["source"])
+    file_path = os.path.join(out_dir, report_filename(park))
+    _write(file_path, text)
+    return file_path, time.perf_counter() - start
+
+
+def _pool_context():
+    # fork ให้ worker ใช้แคชของโปรเซสหลักร่วมกัน (copy-on-write) ถ้าระบบรองรับ
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("fork" if "fork" in methods else None)
+
+
+def generate_reports(path=DATA_PATH, root=PARTITION_ROOT, out_dir=REPORT_ROOT, parks=None, jobs=None,
+                     report=print):
+    """Write index.html and one report per park; returns {park: file path} of the reports written"""
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+
+    _init_worker(path, root, publish=True)
+    df, version = _state["df"], _state["version"]
+    all_parks = sorted(df['สถานที่'].unique().tolist())
+    unknown = sorted(set(parks or []) - set(all_parks))
+    if unknown:
+        raise ValueError("ไม่พบสถานที่: " + ", ".join(unknown))
+    parks = all_parks if not parks else [p for p in all_parks if p in set(parks)]
+
+    _write(os.path.join(out_dir, INDEX_FILE), render_city_report(df, version, _state["city"], path))
+    if report is not None:
+        report(f"  {INDEX_FILE}: {time.perf_counter() - start:.2f} s (รวมโหลดข้อมูลและผลระดับเมือง)")
+
+    written, failed = {}, {}
+    jobs = min(jobs or os.cpu_count() or 1, len(parks))
+    if jobs <= 1:
+        for park in parks:
+            try:
+                written[park], seconds = _render_task(park, out_dir)
+            except Exception as e:
+                # เหมือนแบบหลายโปรเซส: สวนที่ล้มเหลวไม่หยุดสวนอื่น
+                failed[park] = e
+                continue
+            if report is not None:
+                report(f"  {os.path.basename(written[park])}: {seconds:.2f} s")
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=_pool_context(),
+                                 initializer=_init_worker, initargs=(path, root)) as pool:
+            futures = {pool.submit(_render_task, park, out_dir): park for park in parks}
+            for future in as_completed(futures):
+                park = futures[future]
+                try:
+                    written[park], seconds = future.result()
+                except Exception as e:
+                    # สวนที่ล้มเหลวไม่หยุดสวนอื่น รายงานรวมตอนจบ
+                    failed[park] = e
+                    continue
+                if report is not None:
+                    report(f"  {os.path.basename(written[park])}: {seconds:.2f} s")
+
+    if report is not None:
+        for park, error in failed.items():
+            report(f"  ล้มเหลว {park}: {error}")
+        report(f"เขียน {len(written)} รายงาน + {INDEX_FILE} ใน {time.perf_counter() - start:.2f} s "
+               f"({jobs} โปรเซส) -> {out_dir}")
+    if failed:
+        raise RuntimeError(f"สร้างรายงานไม่สำเร็จ {len(failed)} สวน")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a standalone HTML PM2.5 report per park")
+    parser.add_argument("--data", default=DATA_PATH, help="path ของ AllParkYear.csv")
+    parser.add_argument("--root", default=PARTITION_ROOT, help="โฟลเดอร์ข้อมูลแบบ partition")
+    parser.add_argument("--out", default=REPORT_ROOT, help="โฟลเดอร์ที่เขียนรายงาน")
+    parser.add_argument("--parks", nargs="+", help="สร้างเฉพาะสวนที่ระบุ (ค่าเริ่มต้น: ทุกสวน)")
+    parser.add_argument("--jobs", type=int, default=None, help="จำนวนโปรเซส (ค่าเริ่มต้น: จำนวน CPU)")
+    args = parser.parse_args(argv)
+
+    print("park reports:")
+    try:
+        generate_reports(args.data, args.root, args.out, args.parks, args.jobs)
+    except (ValueError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
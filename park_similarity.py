@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import fcluster, leaves_list, linkage
+from scipy.spatial.distance import squareform
+
+from park_data import MONTH_ORDER
+from shared_cache import get_shared_cache
+
+# ความคล้ายของสวนจากรูปแบบ PM2.5 รายเดือน (12 เดือน) และการจัดกลุ่มแบบ hierarchical
+# เมทริกซ์ระยะทางคำนวณด้วย matrix multiplication ทีละ block ของแถว (ไม่มี loop ระดับคู่สวน)
+
+SIMILARITY_METRICS = {
+    "สหสัมพันธ์ (รูปแบบฤดูกาล)": "correlation",
+    "ระยะทางยุคลิด (ระดับค่า)": "euclidean",
+}
+
+BLOCK_SIZE = 1024
+MIN_MONTHS = 6
+
+
+def seasonal_profiles(df):
+    """Parks x 12 months mean PM2.5; parks with fewer than MIN_MONTHS months are dropped"""
+    profiles = df.pivot_table(index='สถานที่', columns='เดือน', values='ค่าเฉลี่ย', aggfunc='mean', observed=True)
+    profiles = profiles.reindex(columns=MONTH_ORDER)
+    profiles = profiles[profiles.notna().sum(axis=1) >= MIN_MONTHS]
+    # เดือนที่ขาดแทนด้วยค่าเฉลี่ยของเดือนนั้นจากทุกสวน
+    return profiles.fillna(profiles.mean())
+
+
+def pairwise_distance(X, metric="correlation", block_size=BLOCK_SIZE):
+    """Full pairwise distance matrix (float32), computed blockwise over rows"""
+    X = np.asarray(X, dtype=np.float64)
+    n = len(X)
+    out = np.empty((n, n), dtype=np.float32)
+
+    if metric == "correlation":
+        # 1 - Pearson r = 1 - ผลคูณภายในของแถวที่ปรับให้ mean 0 และ norm 1
+        Z = X - X.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(Z, axis=1, keepdims=True)
+        Z = np.divide(Z, norms, out=np.zeros_like(Z), where=norms > 0)
+        for start in range(0, n, block_size):
+            block = 1.0 - Z[start:start + block_size] @ Z.T
+            out[start:start + block_size] = np.clip(block, 0.0, 2.0)
+    elif metric == "euclidean":
+        squared = (X ** 2).sum(axis=1)
+        for start in range(0, n, block_size):
+            rows = X[start:start + block_size]
+            block = squared[start:start + block_size, None] + squared[None, :] - 2.0 * rows @ X.T
+            out[start:start + block_size] = np.sqrt(np.maximum(block, 0.0))
+    else:
+        raise ValueError(f"ไม่รู้จัก metric: {metric}")
+
+    np.fill_diagonal(out, 0.0)
+    return out
+
+
+def get_similarity(df_processed, version, period='ทั้งหมด', metric="correlation"):
+    """Seasonal profiles, distance matrix and average-linkage tree, cached per dataset version
+
+    df_processed คือข้อมูลของช่วงเวลา `period` ที่กรองแล้ว (period ใช้เป็นส่วนหนึ่งของ cache key)
+    """
+    def compute():
+        profiles = seasonal_profiles(df_processed)
+        matrix = pairwise_distance(profiles.to_numpy(), metric)
+        tree = linkage(squareform(matrix, checks=False), method="average") if len(profiles) > 1 else None
+        return {
+            # copy: freeze ทำให้ array เป็น read-only จึงต้องไม่ใช่ view ของ index ใน profiles
+            "parks": profiles.index.to_numpy(copy=True),
+            "profiles": profiles,
+            "matrix": matrix,
+            "linkage": tree,
+            "order": leaves_list(tree) if tree is not None else np.arange(len(profiles)),
+        }
+
+    return get_shared_cache().get_or_compute(("similarity", version, period, metric), compute)
+
+
+def get_clusters(df_processed, version, period='ทั้งหมด', metric="correlation", n_clusters=4):
+    """Cluster label per park (numbered in dendrogram order), cached per dataset version"""
+    def compute():
+        similarity = get_similarity(df_processed, version, period, metric)
+        parks = similarity["parks"]
+        if similarity["linkage"] is None:
+            return pd.DataFrame({'สถานที่': parks, 'กลุ่ม': np.ones(len(parks), dtype=int)})
+
+        labels = fcluster(similarity["linkage"], t=n_clusters, criterion="maxclust")
+        # เรียงหมายเลขกลุ่มตามลำดับใน dendrogram เพื่อให้ตรงกับ heatmap
+        ordered = pd.unique(labels[similarity["order"]])
+        renumber = {label: i + 1 for i, label in enumerate(ordered)}
+        return pd.DataFrame({'สถานที่': parks, 'กลุ่ม': [renumber[label] for label in labels]})
+
+    return get_shared_cache().get_or_compute(("clusters", version, period, metric, n_clusters), compute)
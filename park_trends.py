@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from scipy.ndimage import correlate1d
+
+from park_data import park_month_matrix
+from shared_cache import get_shared_cache
+
+# ค่าเฉลี่ยเคลื่อนที่, การเปลี่ยนแปลงเทียบปีก่อน (YoY) และการแยกองค์ประกอบ trend/seasonal/residual
+# ของอนุกรมรายเดือนทุกสวน คำนวณบนเมทริกซ์ สวน x เดือน ครั้งเดียว (ไม่มี loop ต่อสวน)
+# ทุกขั้นรองรับเดือนที่ไม่ได้วัด (NaN) โดยถ่วงน้ำหนักเฉพาะค่าที่มีอยู่
+
+ROLLING_WINDOWS = (3, 6, 12)
+MIN_TREND_MONTHS = 24
+DECOMPOSITION_ITERATIONS = 3
+MIN_TREND_WEIGHT = 0.5
+
+# ค่าเฉลี่ยเคลื่อนที่แบบ 2x12 (centered) สำหรับ trend ของข้อมูลรายเดือน
+TREND_WEIGHTS = np.r_[0.5, np.ones(11), 0.5] / 12
+
+
+def rolling_mean(values, window):
+    """Trailing mean over `window` months per row, ignoring NaN (needs at least half the window)"""
+    observed = ~np.isnan(values)
+    sums = np.cumsum(np.where(observed, values, 0.0), axis=1)
+    counts = np.cumsum(observed, axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    counts[:, window:] = counts[:, window:] - counts[:, :-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts >= (window + 1) // 2, sums / counts, np.nan)
+
+
+def year_over_year(values):
+    """Change from the same month one year earlier (NaN for the first year)"""
+    yoy = np.full_like(values, np.nan)
+    yoy[:, 12:] = values[:, 12:] - values[:, :-12]
+    return yoy
+
+
+def _weighted_smooth(values, weights, min_weight=MIN_TREND_WEIGHT):
+    """Centered weighted moving average that renormalizes over the months present (edges included)"""
+    observed = ~np.isnan(values)
+    numerator = correlate1d(np.where(observed, values, 0.0), weights, axis=1, mode="constant")
+    denominator = correlate1d(observed.astype(float), weights, axis=1, mode="constant")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator >= min_weight * weights.sum(), numerator / denominator, np.nan)
+
+
+def decompose(values, t, iterations=DECOMPOSITION_ITERATIONS):
+    """Additive trend + seasonal + residual for every row, alternating the two smoothers like STL
+
+    trend: ค่าเฉลี่ยเคลื่อนที่ 2x12 ของข้อมูลที่หักฤดูกาลแล้ว
+    seasonal: ค่าเฉลี่ยของแต่ละเดือนปฏิทินจากข้อมูลที่หัก trend แล้ว (ปรับให้ผลรวม 12 เดือนเป็นศูนย์)
+    """
+    month = np.asarray(t) % 12
+    onehot = (month[:, None] == np.arange(12)).astype(float)       # (T, 12)
+    observed = ~np.isnan(values)
+    seasonal = np.zeros_like(values)
+
+    for _ in range(iterations):
+        trend = _weighted_smooth(values - seasonal, TREND_WEIGHTS)
+        detrended = values - trend
+        valid = ~np.isnan(detrended)
+        sums = np.where(valid, detrended, 0.0) @ onehot                # (P, 12)
+        counts = valid.astype(float) @ onehot
+        with np.errstate(invalid="ignore", divide="ignore"):
+            profile = sums / counts
+        profile = profile - np.nanmean(profile, axis=1, keepdims=True)
+        seasonal = np.nan_to_num(profile)[:, month]
+
+    trend = _weighted_smooth(values - seasonal, TREND_WEIGHTS)
+    seasonal = np.where(observed, seasonal, np.nan)
+    residual = values - trend - seasonal
+    return trend, seasonal, residual
+
+
+def _strength(component, residual):
+    # ความแรงของ trend/ฤดูกาล: 1 - Var(residual) / Var(component + residual) (0 = ไม่มี, 1 = ชัดเจนมาก)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.nanvar(residual, axis=1) / np.nanvar(component + residual, axis=1)
+    return np.clip(1.0 - ratio, 0.0, 1.0)
+
+
+def _row_mean(values):
+    counts = (~np.isnan(values)).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, np.nansum(values, axis=1) / counts, np.nan)
+
+
+def _first_last(values):
+    """First and last non-NaN value of every row (NaN for rows without any)"""
+    valid = ~np.isnan(values)
+    if not values.shape[1]:
+        empty = np.full(len(values), np.nan)
+        return empty, empty
+    rows = np.arange(len(values))
+    first = values[rows, np.argmax(valid, axis=1)]
+    last = values[rows, values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)]
+    found = valid.any(axis=1)
+    return np.where(found, first, np.nan), np.where(found, last, np.nan)
+
+
+def compute_trends(df):
+    """Rolling means, YoY deltas and decomposition of every park's monthly series"""
+    parks, t, values, _ = park_month_matrix(df)
+    trend, seasonal, residual = decompose(values, t)
+    yoy = year_over_year(values)
+
+    trend_first, trend_last = _first_last(trend)
+    _, last_yoy = _first_last(yoy)
+
+    summary = pd.DataFrame({
+        'สถานที่': parks,
+        'จำนวนเดือน': (~np.isnan(values)).sum(axis=1),
+        'ความแรงของ trend': _strength(trend, residual),
+        'ความแรงของฤดูกาล': _strength(seasonal, residual),
+        'trend เปลี่ยนแปลง': trend_last - trend_first,
+        'YoY เฉลี่ย': _row_mean(yoy),
+        'YoY ล่าสุด': last_yoy,
+    })
+
+    return {
+        "parks": parks,
+        "t": t,
+        "values": values,
+        "rolling": {window: rolling_mean(values, window) for window in ROLLING_WINDOWS},
+        "yoy": yoy,
+        "trend": trend,
+        "seasonal": seasonal,
+        "residual": residual,
+        "summary": summary,
+    }
+
+
+def get_trends(df_processed, version, location='ทั้งหมด', period='ทั้งหมด'):
+    """Trend statistics for one location (or every park), cached per dataset version
+
+    df_processed คือข้อมูลของช่วงเวลา `period` ที่กรองแล้ว (period ใช้เป็นส่วนหนึ่งของ cache key)
+    """
+    def compute():
+        df = df_processed if location == 'ทั้งหมด' else df_processed[df_processed['สถานที่'] == location]
+        return compute_trends(df)
+
+    return get_shared_cache().get_or_compute(("park_trends", version, location, period), compute)
+
+
+def trend_frame(trends, park, window=12):
+    """Long table of one park's series and components for plotting"""
+    row = int(np.flatnonzero(trends["parks"] == park)[0])
+    t = trends["t"]
+    return pd.DataFrame({
+        'ช่วงเวลา': [f"{year}-{month:02d}" for year, month in zip(t // 12, t % 12 + 1)],
+        'ปี': t // 12,
+        'เดือนที่': t % 12 + 1,
+        'ค่าเฉลี่ย': trends["values"][row],
+        f'ค่าเฉลี่ยเคลื่อนที่ {window} เดือน': trends["rolling"][window][row],
+        'YoY': trends["yoy"][row],
+        'trend': trends["trend"][row],
+        'seasonal': trends["seasonal"][row],
+        'residual': trends["residual"][row],
+    })
@@ -0,0 +1,186 @@
+"""Partitioned PM2.5 dataset (one Parquet file per city and year)
+
+โครงสร้างไฟล์แบบ hive-style:
+
+    Group_file/dataset/city=กรุงเทพมหานคร/year=2564/data.parquet
+
+แต่ละไฟล์เก็บตารางที่ประมวลผลแล้ว (long format แบบเดียวกับ preprocess_park_data)
+การเลือกเมืองและปีใน sidebar จะอ่านเฉพาะ partition ที่ตรงกัน
+
+    python partitioned_data.py --csv Group_file/AllParkYear.csv --city กรุงเทพมหานคร
+"""
+import argparse
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from metrics import timed
+from park_data import DATA_PATH, preprocess_park_data, validate_park_data
+from shared_cache import dataset_version, get_shared_cache
+
+PARTITION_ROOT = "Group_file/dataset"
+DEFAULT_CITY = "กรุงเทพมหานคร"
+PARTITION_FILE = "data.parquet"
+KEY_COLUMNS = ['สถานที่', 'ปี', 'เดือน']
+
+
+def partition_path(city, year, root=PARTITION_ROOT):
+    return os.path.join(root, f"city={city}", f"year={int(year)}", PARTITION_FILE)
+
+
+class PartitionWriter:
+    """Append processed chunks to per-year partitions without holding the whole table
+
+    แต่ละปีเขียนลงไฟล์ชั่วคราวทีละ row group แล้ว rename ตอน close()
+    เพื่อไม่ให้ผู้อ่านเห็นไฟล์ที่เขียนไม่เสร็จ
+    ถ้ามี partition เดิมอยู่แล้ว จะรวมแถวเดิมไว้ด้วย (แถวใหม่แทนที่แถวเดิมที่มี สวน/ปี/เดือน ตรงกัน)
+    และบันทึก (สวน, ปี) ที่ถูกแทนที่ไว้ใน replaced
+    """
+
+    def __init__(self, city=DEFAULT_CITY, root=PARTITION_ROOT):
+        self.city = city
+        self.root = root
+        self._writers = {}
+        self.rows = 0
+        self.replaced = set()
+
+    def write(self, df_processed):
+        for year, part in df_processed.groupby('ปี'):
+            table = pa.Table.from_pandas(part.assign(เมือง=self.city), preserve_index=False)
+            path = partition_path(self.city, year, self.root)
+            if path not in self._writers:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._writers[path] = pq.ParquetWriter(path + ".tmp", table.schema)
+            writer = self._writers[path]
+            writer.write_table(table.cast(writer.schema))
+            self.rows += len(part)
+
+    def close(self):
+        """Finish every partition; returns the written paths"""
+        paths = sorted(self._writers)
+        for path in paths:
+            self._writers[path].close()
+            if os.path.exists(path):
+                self._merge_existing(path)
+            os.replace(path + ".tmp", path)
+        self._writers = {}
+        return paths
+
+    def _merge_existing(self, path):
+        """Add the stored rows that the new rows do not replace to the temporary file"""
+        new = pq.read_table(path + ".tmp")
+        stored = pq.read_table(path)
+        keys = pd.MultiIndex.from_frame(new.select(KEY_COLUMNS).to_pandas().astype(object))
+        stored_keys = stored.select(KEY_COLUMNS).to_pandas().astype(object)
+        overlap = pd.MultiIndex.from_frame(stored_keys).isin(keys)
+        self.replaced.update(zip(stored_keys.loc[overlap, 'สถานที่'], stored_keys.loc[overlap, 'ปี'].astype(int)))
+        if overlap.all():
+            return
+        kept = stored.filter(pa.array(~overlap)).select(new.schema.names).cast(new.schema)
+        pq.write_table(pa.concat_tables([kept, new]), path + ".tmp")
+
+    def abort(self):
+        """Discard the partially written partitions"""
+        for path, writer in self._writers.items():
+            writer.close()
+            os.remove(path + ".tmp")
+        self._writers = {}
+
+
+def write_partitions(df_processed, city=DEFAULT_CITY, root=PARTITION_ROOT):
+    """Write a processed long table as one Parquet file per year; returns the written paths"""
+    writer = PartitionWriter(city, root)
+    try:
+        writer.write(df_processed)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def list_partitions(root=PARTITION_ROOT):
+    """Partition listing from directory names only (no data is read)"""
+    rows = []
+    if os.path.isdir(root):
+        for city_dir in os.scandir(root):
+            if not (city_dir.is_dir() and city_dir.name.startswith("city=")):
+                continue
+            for year_dir in os.scandir(city_dir.path):
+                if not (year_dir.is_dir() and year_dir.name.startswith("year=")):
+                    continue
+                path = os.path.join(year_dir.path, PARTITION_FILE)
+                if os.path.exists(path):
+                    rows.append({
+                        'city': city_dir.name[len("city="):],
+                        'year': int(year_dir.name[len("year="):]),
+                        'path': path
+                    })
+    return pd.DataFrame(rows, columns=['city', 'year', 'path']).sort_values(['city', 'year'], ignore_index=True)
+
+
+def prune_partitions(partitions, city='ทั้งหมด', year='ทั้งหมด'):
+    """Keep only the partitions matching the city/year selection"""
+    if city != 'ทั้งหมด':
+        partitions = partitions[partitions['city'] == city]
+    if year != 'ทั้งหมด':
+        partitions = partitions[partitions['year'] == int(year)]
+    return partitions
+
+
+def read_partition(path):
+    """Read one partition, cached per file version"""
+    return get_shared_cache().get_or_compute(
+        ("partition", dataset_version(path)),
+        lambda: pd.read_parquet(path)
+    )
+
+
+def partition_locations(partitions):
+    """Sorted park names in the given partitions, reading only the สถานที่ column"""
+    paths = partitions['path'].tolist()
+
+    def compute():
+        names = set()
+        for path in paths:
+            names.update(pd.read_parquet(path, columns=['สถานที่'])['สถานที่'].unique())
+        return sorted(names)
+
+    version = tuple(dataset_version(path) for path in paths)
+    return get_shared_cache().get_or_compute(("partition_locations", version), compute)
+
+
+def load_partitioned_data(city='ทั้งหมด', year='ทั้งหมด', root=PARTITION_ROOT):
+    """Load only the partitions matching the selection; returns (long table, version)"""
+    paths = prune_partitions(list_partitions(root), city, year)['path'].tolist()
+    version = ("partitions",) + tuple(dataset_version(path) for path in paths)
+
+    def compute():
+        with timed("pm25_dataset_load_seconds", source="partitions"):
+            frames = [read_partition(path) for path in paths]
+            if not frames:
+                return pd.DataFrame()
+            return pd.concat(frames, ignore_index=True)
+
+    return get_shared_cache().get_or_compute(("partition_set", version), compute), version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the partitioned dataset from an AllParkYear-style CSV")
+    parser.add_argument("--csv", default=DATA_PATH, help="ไฟล์ CSV ต้นทาง (schema แบบ AllParkYear.csv)")
+    parser.add_argument("--city", default=DEFAULT_CITY, help="ชื่อเมือง/จังหวัดของข้อมูลชุดนี้")
+    parser.add_argument("--root", default=PARTITION_ROOT)
+    args = parser.parse_args(argv)
+
+    raw = pd.read_csv(args.csv)
+    report = validate_park_data(raw)
+    for issue, count in report["summary"].items():
+        print(f"  {issue}: {count}")
+
+    for path in write_partitions(preprocess_park_data(raw), args.city, args.root):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Fill the shared cache for the dashboard's default views before traffic arrives
+
+ค่าเริ่มต้นของแดชบอร์ด (สถานที่/ปี/เดือน = 'ทั้งหมด' และการพยากรณ์ทุกสวน) ต้อง parse CSV,
+ประมวลผล, รวมค่า และ fit โมเดลทุกตัวของทุกสวน สคริปต์นี้คำนวณทุกอย่างล่วงหน้าแล้วรายงานเวลา
+
+    python prewarm.py                       warm ในโปรเซสนี้ + เขียน snapshot ของชุดข้อมูลให้โปรเซสอื่น map
+    python prewarm.py --serve -- --server.port 8501
+                                            warm แล้วเปิด Streamlit ในโปรเซสเดียวกัน (แคชพร้อมตั้งแต่ผู้ใช้คนแรก)
+
+แคชเป็นของแต่ละโปรเซส: การรันแยกก่อนเปิดเซิร์ฟเวอร์ช่วยได้เฉพาะชุดข้อมูล (ผ่าน shared_dataset)
+ส่วนตารางสรุปและโมเดลต้อง warm ในโปรเซสของเซิร์ฟเวอร์เอง (--serve หรือ api.py --prewarm)
+"""
+import argparse
+import os
+import sys
+import time
+
+from exceedance_sim import get_exceedance_simulation
+from forecasting import (MODEL_NAMES, get_forecast, get_monthly_forecast, get_park_forecasts,
+                         monthly_series)
+from map_layers import get_forecast_map_table, get_station_index
+from metrics import observe, start_exporter
+from park_data import (DATA_PATH, filter_park_data, get_quality_report, load_processed_data,
+                       location_summary, period_index, yearly_means)
+from park_similarity import get_clusters, get_similarity
+from park_trends import get_trends
+from partitioned_data import (PARTITION_ROOT, list_partitions, load_partitioned_data,
+                              partition_locations, prune_partitions)
+from shared_cache import get_shared_cache
+from shared_dataset import map_dataset, write_dataset
+
+ALL = 'ทั้งหมด'
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def load_default_dataset(path=DATA_PATH, root=PARTITION_ROOT, publish=False):
+    """The dataset the dashboard opens with: first city's partitions, otherwise the CSV
+
+    publish=True เขียนชุดข้อมูลจาก CSV ลง shared memory (ถ้ายังไม่มี snapshot ของเวอร์ชันนี้)
+    เพื่อให้โปรเซสอื่นของเซิร์ฟเวอร์ map ได้ทันทีโดยไม่ต้อง parse CSV เอง; root=None ใช้เฉพาะ CSV
+    """
+    partitions = list_partitions(root) if root is not None else None
+    if partitions is None or partitions.empty:
+        df, version = load_processed_data(path)
+        quality = get_quality_report(path)
+        if publish and map_dataset(version) is None:
+            write_dataset(df, quality, version)
+        return df, version
+    # sidebar เลือกเมืองแรกตามลำดับตัวอักษรเป็นค่าเริ่มต้น
+    city = sorted(partitions['city'].unique().tolist())[0]
+    partition_locations(prune_partitions(partitions, city))
+    return load_partitioned_data(city, ALL, root)
+
+
+def warm_report(df, version):
+    """Aggregates of the analysis report with every filter at 'ทั้งหมด'"""
+    filtered = filter_park_data(df, ALL, ALL, ALL)
+    period_index(df, version)
+    location_summary(filtered, version, (ALL, ALL, ALL))
+    get_station_index()
+    similarity = get_similarity(filtered, version, ALL, "correlation")
+    get_clusters(filtered, version, ALL, "correlation", min(4, len(similarity["parks"])))
+    get_trends(filtered, version, ALL)
+
+
+def warm_forecasts(df, version):
+    """All-parks yearly forecast plus every model for every park"""
+    yearly_means(df, version, ALL)
+    forecast = get_forecast(df, version, ALL)
+    for model_name in MODEL_NAMES:
+        get_park_forecasts(df, version, model_name, forecast["future_years"])
+    get_forecast_map_table(df, version, forecast["best_model"], forecast["future_years"])
+
+
+def warm_monthly(df, version):
+    monthly_series(df, version, ALL)
+    get_monthly_forecast(df, version, ALL)
+
+
+def warm_exceedance(df, version):
+    get_exceedance_simulation(df, version)
+
+
+def warm_locations(df, version):
+    """Yearly forecast page for each park selected on its own"""
+    for location in sorted(df['สถานที่'].unique().tolist()):
+        yearly_means(df, version, location)
+        get_forecast(df, version, location)
+
+
+STEPS = [
+    ("report", warm_report),
+    ("forecast", warm_forecasts),
+    ("monthly_forecast", warm_monthly),
+    ("exceedance", warm_exceedance),
+]
+
+
+def prewarm(path=DATA_PATH, root=PARTITION_ROOT, locations=False, publish=False, report=print):
+    """Warm the shared cache for the default views; returns {step: seconds} including "total" """
+    timings = {}
+    start = time.perf_counter()
+
+    def run(name, fn, *args):
+        step_start = time.perf_counter()
+        result = fn(*args)
+        timings[name] = time.perf_counter() - step_start
+        observe("pm25_prewarm_seconds", timings[name], step=name)
+        if report is not None:
+            report(f"  {name}: {timings[name]:.2f} s")
+        return result
+
+    df, version = run("dataset", load_default_dataset, path, root, publish)
+    for name, fn in STEPS:
+        run(name, fn, df, version)
+    if locations:
+        run("locations", warm_locations, df, version)
+
+    timings["total"] = time.perf_counter() - start
+    if report is not None:
+        stats = get_shared_cache().stats()
+        report(f"warm เสร็จใน {timings['total']:.2f} s · แคช {stats['entries']} รายการ {stats['used_mb']:.1f} MB")
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prewarm the PM2.5 dashboard caches")
+    parser.add_argument("--data", default=DATA_PATH, help="path ของ AllParkYear.csv")
+    parser.add_argument("--root", default=PARTITION_ROOT, help="โฟลเดอร์ข้อมูลแบบ partition")
+    parser.add_argument("--locations", action="store_true", help="warm การพยากรณ์ของแต่ละสวนด้วย")
+    parser.add_argument("--no-publish", action="store_true", help="ไม่เขียน snapshot ของชุดข้อมูลลง shared memory")
+    parser.add_argument("--serve", action="store_true", help="เปิด Streamlit ในโปรเซสนี้หลัง warm เสร็จ")
+    parser.add_argument("streamlit_args", nargs="*", help="อาร์กิวเมนต์ที่ส่งต่อให้ streamlit run (หลัง --)")
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        # export metrics ตั้งแต่ตอนบูต (รวมเวลาของ prewarm เอง)
+        start_exporter()
+    print("prewarm:")
+    prewarm(args.data, args.root, args.locations, publish=not args.no_publish)
+
+    if args.serve:
+        from streamlit.web import cli as stcli
+
+        # Streamlit รันสคริปต์ในโปรเซสนี้และ import โมดูลชุดเดียวกัน จึงเห็นแคชที่ warm ไว้
+        sys.argv = ["streamlit", "run", APP_PATH, *args.streamlit_args]
+        stcli.main()
+
+
+if __name__ == "__main__":
+    main()
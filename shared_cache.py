@@ -0,0 +1,223 @@
+import copy
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+# แคชกลางระดับโปรเซส (ใช้ร่วมกันทุก session ของ Streamlit)
+
+DEFAULT_BUDGET_MB = float(os.environ.get("PM25_CACHE_MB", "512"))
+
+# pandas 2.x ต้องเปิด copy-on-write เอง (pandas 3 เปิดเป็นค่าเริ่มต้น)
+# เพื่อให้การแก้ไข DataFrame ที่ได้จากแคชไม่ย้อนกลับไปแก้ข้อมูลที่แชร์กัน
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+def dataset_version(path):
+    """Return a version token for a data file (changes when the file changes)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (str(path), None)
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def estimate_size(obj):
+    """Estimate the memory footprint of a cached value in bytes"""
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        try:
+            usage = obj.memory_usage(deep=True)
+        except ValueError:
+            # pandas วัดแบบ deep ไม่ได้เมื่อ array ของ object เป็น read-only (เช่น index ว่างภายใต้ copy-on-write)
+            usage = obj.memory_usage(deep=False)
+        return int(usage.sum()) if isinstance(obj, pd.DataFrame) else int(usage)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (dict, MappingProxyType)):
+        return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj)
+    if isinstance(obj, ReadOnlyModel):
+        return estimate_size(obj._model)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return sys.getsizeof(obj)
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(obj)
+
+
+class ReadOnlyModel:
+    """Read-only view of a fitted estimator: predict/transform are allowed, refitting is not"""
+
+    _blocked = ("fit", "partial_fit", "fit_transform", "set_params")
+
+    def __init__(self, model):
+        object.__setattr__(self, "_model", model)
+
+    def __getattr__(self, name):
+        if name in self._blocked:
+            raise AttributeError(f"โมเดลในแคชเป็นแบบอ่านอย่างเดียว ไม่สามารถเรียก {name}() ได้")
+        return getattr(self._model, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("โมเดลในแคชเป็นแบบอ่านอย่างเดียว")
+
+    def copy(self):
+        """Private mutable deep copy of the wrapped model (e.g. for incremental refits)"""
+        return copy.deepcopy(self._model)
+
+    def __repr__(self):
+        return f"ReadOnlyModel({self._model!r})"
+
+
+def freeze(obj):
+    """Make a value safe to share between sessions"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        # ป้องกันด้วย copy-on-write + shallow copy ตอนคืนค่า (ดู _share)
+        return obj
+    if isinstance(obj, np.ndarray):
+        obj.flags.writeable = False
+        return obj
+    if isinstance(obj, dict):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(v) for v in obj)
+    if isinstance(obj, tuple):
+        return tuple(freeze(v) for v in obj)
+    if hasattr(obj, "fit") and (hasattr(obj, "predict") or hasattr(obj, "transform")):
+        return ReadOnlyModel(obj)
+    return obj
+
+
+def thaw(obj):
+    """Plain (picklable) copy of a frozen value: read-only mappings become dicts"""
+    if isinstance(obj, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return tuple(thaw(v) for v in obj)
+    if isinstance(obj, ReadOnlyModel):
+        return obj.copy()
+    return obj
+
+
+def _share(obj):
+    # DataFrame ที่แชร์กันต้องคืนเป็น shallow copy เพื่อไม่ให้การเพิ่มคอลัมน์ไปกระทบ session อื่น
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return obj.copy(deep=False)
+    if isinstance(obj, MappingProxyType):
+        return MappingProxyType({k: _share(v) for k, v in obj.items()})
+    if isinstance(obj, tuple):
+        return tuple(_share(v) for v in obj)
+    return obj
+
+
+class SharedCache:
+    """Process-wide LRU cache with a memory budget"""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _share(self._entries[key][0])
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size=None):
+        """Freeze and store a value, evicting least recently used entries if needed
+
+        size: optional function value -> bytes for values estimate_size cannot see into
+        """
+        value = freeze(value)
+        size = size(value) if size is not None else estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.budget_bytes:
+                # ใหญ่กว่างบหน่วยความจำทั้งหมด ไม่เก็บลงแคช
+                return _share(value)
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+        return _share(value)
+
+    def get_or_compute(self, key, compute, size=None):
+        """Return the cached value for key, computing it once across all sessions"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _share(self._entries[key][0])
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _share(self._entries[key][0])
+                self.misses += 1
+            try:
+                return self.put(key, compute(), size)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+
+    def _evict(self):
+        while self.current_bytes > self.budget_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def set_budget(self, budget_mb):
+        with self._lock:
+            self.budget_bytes = int(budget_mb * 1024 * 1024)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "used_mb": self.current_bytes / (1024 * 1024),
+                "budget_mb": self.budget_bytes / (1024 * 1024),
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """Return the cache shared by every session in this process"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SharedCache()
+        return _shared_cache
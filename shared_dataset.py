@@ -0,0 +1,192 @@
+"""Memory-mapped processed dataset shared by several server processes
+
+โปรเซส loader ประมวลผล AllParkYear.csv ครั้งเดียวแล้วเขียนแต่ละคอลัมน์เป็นไฟล์ .npy
+(ค่าเริ่มต้นอยู่ใน /dev/shm ซึ่งเป็นหน่วยความจำ) ทุกโปรเซสของ Streamlit/API map ไฟล์แบบ
+อ่านอย่างเดียว คอลัมน์ตัวเลขจึงใช้หน้าหน่วยความจำชุดเดียวกัน (zero-copy) และโปรเซสใหม่
+เริ่มได้ทันทีโดยไม่ต้อง parse CSV ซ้ำ
+
+    python shared_dataset.py --data Group_file/AllParkYear.csv
+
+คอลัมน์ข้อความเก็บเป็นรหัส category + รายการค่าใน manifest แล้ว map กลับเป็น pd.Categorical
+ที่ใช้รหัสบนหน้าหน่วยความจำเดียวกัน (ไม่ขยายเป็น object array ในทุกโปรเซส)
+
+โฟลเดอร์ต้องเป็นของผู้ใช้ที่รันเท่านั้น (mode 0700) เพราะ /dev/shm ทุกคนเขียนได้; ถ้าเจ้าของไม่ตรง
+จะไม่เขียนและไม่ map (กลับไปอ่าน CSV) และไม่มีไฟล์ใดถูกอ่านด้วย pickle
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from shared_cache import thaw
+
+SHARED_ROOT = os.environ.get(
+    "PM25_SHARED_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "pm25_dataset")
+)
+MANIFEST = "current.json"
+# เพิ่มเมื่อรูปแบบ snapshot เปลี่ยน (2: category ของเดือนเรียงตามปฏิทิน) snapshot รุ่นเก่าจะไม่ถูก map
+SNAPSHOT_FORMAT = 2
+
+
+def _private_directory(root, create=False):
+    """True when `root` is a real directory owned by this user and closed to everyone else"""
+    if create:
+        os.makedirs(root, mode=0o700, exist_ok=True)
+    try:
+        st = os.lstat(root)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        return False
+    if hasattr(os, "getuid"):
+        if st.st_uid != os.getuid():
+            return False
+        if st.st_mode & 0o077:
+            if not create:
+                return False
+            # โฟลเดอร์ของเราเองที่สร้างไว้ก่อนด้วย mode อื่น: ปิดสิทธิ์ก่อนเขียน
+            os.chmod(root, 0o700)
+    return True
+
+
+def _quality_to_json(quality):
+    quality = thaw(quality)
+    issues = quality["issues"]
+    return {
+        **{key: value for key, value in quality.items() if key != "issues"},
+        "issues": json.loads(issues.to_json(orient="split", index=False, force_ascii=False)),
+    }
+
+
+def _quality_from_json(data):
+    issues = data["issues"]
+    return {**data, "issues": pd.DataFrame(issues["data"], columns=issues["columns"])}
+
+
+def _source_key(version):
+    # path เดียวกันแต่เขียนต่างกัน (relative/absolute) ต้องได้ key เดียวกัน
+    path, *stat = version
+    return [os.path.abspath(path)] + stat
+
+
+def _snapshot_name(version):
+    return hashlib.sha1(repr(_source_key(version)).encode("utf-8")).hexdigest()[:16]
+
+
+def _categories(column, values):
+    """Category order for a text column: calendar order for months, otherwise pandas' sorted order"""
+    # import ตอนเรียกใช้เพื่อเลี่ยง circular import (park_data ใช้ map_dataset)
+    from park_data import MONTH_ORDER, MONTHS
+
+    order = {'เดือน': MONTH_ORDER, 'เดือนอังกฤษ': MONTHS}.get(column)
+    if order is not None and set(values.dropna().unique()) <= set(order):
+        return order
+    return None
+
+
+def write_dataset(df, quality, version, root=SHARED_ROOT):
+    """Write a processed table column by column and switch the manifest to it atomically"""
+    if not _private_directory(root, create=True):
+        raise PermissionError(f"{root} ต้องเป็นโฟลเดอร์ของผู้ใช้นี้ที่ผู้อื่นเข้าถึงไม่ได้ (mode 0700)")
+    name = _snapshot_name(version)
+    directory = os.path.join(root, name)
+    tmp_directory = directory + f".tmp{os.getpid()}"
+    os.makedirs(tmp_directory, mode=0o700, exist_ok=True)
+
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        entry = {"name": column, "file": f"{i}.npy"}
+        if pd.api.types.is_numeric_dtype(values):
+            array = values.to_numpy()
+        else:
+            # dtype ของรหัสตรงกับที่ pandas ใช้ (int8 เมื่อมีไม่เกิน 127 ค่า) ตอน map จึงไม่ต้อง cast/copy
+            categorical = pd.Categorical(values, categories=_categories(column, values))
+            array = categorical.codes
+            entry["categories"] = categorical.categories.tolist()
+        np.save(os.path.join(tmp_directory, entry["file"]), np.ascontiguousarray(array))
+        columns.append(entry)
+
+    with open(os.path.join(tmp_directory, "quality.json"), "w", encoding="utf-8") as f:
+        json.dump(_quality_to_json(quality), f, ensure_ascii=False)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+
+    manifest = {"format": SNAPSHOT_FORMAT, "version": _source_key(version), "snapshot": name,
+                "rows": len(df), "columns": columns}
+    tmp_manifest = os.path.join(root, MANIFEST + f".tmp{os.getpid()}")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_manifest, os.path.join(root, MANIFEST))
+
+    # snapshot เก่าลบได้ทันที: โปรเซสที่ยัง map อยู่ใช้ต่อได้จนกว่าจะโหลดใหม่ (Linux)
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.name != name and ".tmp" not in entry.name:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return directory
+
+
+def read_manifest(root=SHARED_ROOT):
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def map_dataset(version, root=SHARED_ROOT):
+    """Map the shared snapshot of `version` read-only; returns {"data", "quality"} or None"""
+    if not _private_directory(root):
+        return None
+    manifest = read_manifest(root)
+    if manifest is None or manifest.get("format") != SNAPSHOT_FORMAT:
+        return None
+    if tuple(manifest["version"]) != tuple(_source_key(version)):
+        return None
+
+    directory = os.path.join(root, manifest["snapshot"])
+    try:
+        data = {}
+        for entry in manifest["columns"]:
+            # np.asarray: view ธรรมดาบนหน้าหน่วยความจำเดียวกัน (ไม่ให้ผลลัพธ์การคำนวณเป็น memmap)
+            array = np.asarray(np.load(os.path.join(directory, entry["file"]), mmap_mode="r"))
+            if "categories" in entry:
+                # รหัส -1 คือค่าว่าง (NaN)
+                array = pd.Categorical.from_codes(array, categories=entry["categories"])
+            data[entry["name"]] = array
+        with open(os.path.join(directory, "quality.json"), encoding="utf-8") as f:
+            quality = _quality_from_json(json.load(f))
+    except (OSError, ValueError, KeyError):
+        # snapshot ถูกแทนที่ระหว่างอ่าน หรือเป็นรูปแบบเก่า ให้ผู้เรียกโหลดจาก CSV แทน
+        return None
+
+    return {"data": pd.DataFrame(data, copy=False), "quality": quality}
+
+
+def main(argv=None):
+    # import ตอนเรียกใช้เพื่อเลี่ยง circular import (park_data ใช้ map_dataset)
+    from park_data import DATA_PATH, preprocess_park_data, validate_park_data
+    from shared_cache import dataset_version
+
+    parser = argparse.ArgumentParser(description="Publish the processed dataset for memory-mapped sharing")
+    parser.add_argument("--data", default=DATA_PATH, help="path ของ AllParkYear.csv")
+    parser.add_argument("--root", default=SHARED_ROOT)
+    args = parser.parse_args(argv)
+
+    version = dataset_version(args.data)
+    raw = pd.read_csv(args.data)
+    df = preprocess_park_data(raw)
+    directory = write_dataset(df, validate_park_data(raw), version, args.root)
+    print(f"{len(df)} แถว -> {directory}")
+
+
+if __name__ == "__main__":
+    main()
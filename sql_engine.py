@@ -0,0 +1,168 @@
+"""Embedded SQL (DuckDB) over the processed PM2.5 long table
+
+ตารางที่ลงทะเบียนไว้:
+
+    pm25   ตารางแบบ long (สถานที่, ปี, เดือน, เดือนอังกฤษ, ค่าต่ำสุด, ค่าสูงสุด, ค่าเฉลี่ย,
+           จำนวนวันเกินมาตรฐาน) + เดือนที่ (1-12) และ เขต
+    parks  พิกัดสวน (สถานที่, name_en, lat, lon)
+
+    python sql_engine.py "SELECT เขต, avg(ค่าเฉลี่ย) FROM pm25 GROUP BY เขต"
+
+DuckDB เป็น optional dependency (pip install duckdb)
+"""
+import argparse
+import re
+
+import pandas as pd
+
+from park_coordinates import PARK_COORDINATES
+from park_data import DATA_PATH, MONTH_ORDER, load_processed_data
+from shared_cache import get_shared_cache
+
+try:
+    import duckdb
+except ImportError:  # duckdb เป็น optional
+    duckdb = None
+
+MAX_ROWS = 10_000
+
+EXAMPLE_QUERIES = {
+    "ค่าเฉลี่ยช่วงฤดูฝุ่น (ธ.ค.-มี.ค.) แยกตามเขต": """
+SELECT เขต, ปี, round(avg(ค่าเฉลี่ย), 2) AS ค่าเฉลี่ยฤดูฝุ่น, sum(จำนวนวันเกินมาตรฐาน) AS วันเกินมาตรฐาน
+FROM pm25
+WHERE เดือนที่ IN (12, 1, 2, 3)
+GROUP BY เขต, ปี
+ORDER BY เขต, ปี""",
+    "การเปลี่ยนแปลงเทียบปีก่อน (YoY) แยกตามสวน": """
+WITH yearly AS (
+    SELECT สถานที่, ปี, avg(ค่าเฉลี่ย) AS ค่าเฉลี่ย
+    FROM pm25
+    GROUP BY สถานที่, ปี
+)
+SELECT สถานที่, ปี, round(ค่าเฉลี่ย, 2) AS ค่าเฉลี่ย,
+       round(ค่าเฉลี่ย - lag(ค่าเฉลี่ย) OVER (PARTITION BY สถานที่ ORDER BY ปี), 2) AS เปลี่ยนแปลง
+FROM yearly
+ORDER BY สถานที่, ปี""",
+    "สวนที่มีวันเกินมาตรฐานมากที่สุด พร้อมพิกัด": """
+SELECT p.สถานที่, p.lat, p.lon, sum(d.จำนวนวันเกินมาตรฐาน) AS วันเกินมาตรฐาน
+FROM pm25 d JOIN parks p USING (สถานที่)
+GROUP BY ALL
+ORDER BY วันเกินมาตรฐาน DESC
+LIMIT 10""",
+}
+
+# อนุญาตเฉพาะคำสั่งอ่านข้อมูลคำสั่งเดียว
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH|FROM|VALUES|DESCRIBE|SUMMARIZE|SHOW)\b", re.IGNORECASE)
+
+# comment (-- หรือ /* */) ที่อยู่หน้าคำสั่ง ตัดออกก่อนตรวจชนิดคำสั่ง
+_LEADING_COMMENTS = re.compile(r"^(?:\s*(?:--[^\n]*(?:\n|$)|/\*.*?\*/))*", re.DOTALL)
+
+
+class QueryError(ValueError):
+    """Rejected or failed SQL query"""
+
+
+def available():
+    return duckdb is not None
+
+
+def _park_table():
+    return pd.DataFrame({
+        'สถานที่': list(PARK_COORDINATES),
+        'name_en': [c['name_en'] for c in PARK_COORDINATES.values()],
+        'lat': [c['lat'] for c in PARK_COORDINATES.values()],
+        'lon': [c['lon'] for c in PARK_COORDINATES.values()],
+    })
+
+
+def _long_table(df_processed):
+    month_no = {month: i + 1 for i, month in enumerate(MONTH_ORDER)}
+    return df_processed.assign(
+        เดือน=df_processed['เดือน'].astype(str),
+        เดือนที่=df_processed['เดือน'].astype(str).map(month_no).astype('int8'),
+        เขต=df_processed['สถานที่'].str.extract(r'(เขต\S+)\s*$', expand=False)
+    )
+
+
+def build_database(df_processed):
+    """In-memory DuckDB database holding the pm25 and parks tables (columnar copies)"""
+    if duckdb is None:
+        raise QueryError("ต้องติดตั้ง duckdb ก่อน: pip install duckdb")
+
+    con = duckdb.connect(":memory:")
+    pm25, parks = _long_table(df_processed), _park_table()
+    con.execute("CREATE TABLE pm25 AS SELECT * FROM pm25")
+    con.execute("CREATE TABLE parks AS SELECT * FROM parks")
+    # ห้ามอ่าน/เขียนไฟล์หรือ URL จากคิวรีของผู้ใช้
+    con.execute("SET enable_external_access = false")
+    con.execute("SET lock_configuration = true")
+    return con
+
+
+def _database_size(con):
+    """Bytes held by DuckDB for the database (estimate_size cannot see inside a connection)"""
+    return int(con.execute("SELECT sum(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0] or 0)
+
+
+def get_database(df_processed, version):
+    """Database for one dataset version, built once and shared by every session"""
+    return get_shared_cache().get_or_compute(
+        ("sql_db", version), lambda: build_database(df_processed), size=_database_size
+    )
+
+
+def _normalize(sql):
+    sql = sql.strip().rstrip(";").strip()
+    if not sql:
+        raise QueryError("คิวรีว่าง")
+    if duckdb is None:
+        raise QueryError("ต้องติดตั้ง duckdb ก่อน: pip install duckdb")
+    # ให้ parser ของ DuckDB แยกคำสั่ง (";" ใน string หรือ comment ไม่นับเป็นตัวคั่น)
+    try:
+        statements = duckdb.extract_statements(sql)
+    except duckdb.Error as e:
+        raise QueryError(str(e)) from e
+    if len(statements) != 1:
+        raise QueryError("รองรับคิวรีครั้งละหนึ่งคำสั่งเท่านั้น")
+    if not _READ_ONLY.match(_LEADING_COMMENTS.sub('', sql)):
+        raise QueryError("รองรับเฉพาะคำสั่งอ่านข้อมูล (SELECT / WITH)")
+    return sql
+
+
+def run_query(df_processed, version, sql, max_rows=MAX_ROWS):
+    """Run a read-only query; results are cached per dataset version and query text"""
+    sql = _normalize(sql)
+
+    def compute():
+        # แต่ละ thread ใช้ cursor ของตัวเองบนฐานข้อมูลเดียวกัน
+        cursor = get_database(df_processed, version).cursor()
+        try:
+            # ขึ้นบรรทัดใหม่ก่อนวงเล็บปิด: คิวรีที่จบด้วย -- comment จะไม่กลืนส่วนที่ต่อท้าย
+            return cursor.execute(f"SELECT * FROM ({sql}\n) LIMIT {int(max_rows)}").df()
+        except duckdb.Error as e:
+            raise QueryError(str(e)) from e
+        finally:
+            cursor.close()
+
+    return get_shared_cache().get_or_compute(("sql", version, sql, max_rows), compute)
+
+
+def query(sql, path=DATA_PATH, max_rows=MAX_ROWS):
+    """Python API: run a query against the processed dataset at `path`"""
+    df, version = load_processed_data(path)
+    return run_query(df, version, sql, max_rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an ad-hoc SQL query on the PM2.5 long table")
+    parser.add_argument("sql")
+    parser.add_argument("--data", default=DATA_PATH, help="path ของ AllParkYear.csv")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS)
+    args = parser.parse_args(argv)
+
+    with pd.option_context("display.max_rows", 200, "display.width", 200):
+        print(query(args.sql, args.data, args.max_rows))
+
+
+if __name__ == "__main__":
+    main()
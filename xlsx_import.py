@@ -0,0 +1,195 @@
+"""Streaming import of .xlsx workbooks into the partitioned dataset
+
+อ่านทีละแถวด้วย openpyxl แบบ read_only (ไม่โหลดทั้ง workbook เข้าหน่วยความจำ)
+แปลงทีละ CHUNK_ROWS แถวเป็น schema ของ AllParkYear แล้วเขียนลง partition ทันที
+
+รองรับทั้งแบบหนึ่ง sheet ต่อปี (ชื่อ sheet เป็นปี เช่น "2566") และหนึ่ง sheet ต่อสวน
+(ชื่อ sheet เป็นชื่อสวน) เมื่อไม่มีคอลัมน์ ปี หรือ Dis_trict ในตาราง
+
+    python xlsx_import.py PM25_Report_2566.xlsx --city กรุงเทพมหานคร
+"""
+import argparse
+import re
+from collections import Counter
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from park_coordinates import PARK_COORDINATES
+from park_data import (DUPLICATE_ISSUE, METRIC_COLUMNS, MONTHS, RAW_COLUMNS, UNKNOWN_PARK_ISSUE,
+                       preprocess_park_data, validate_park_data)
+from partitioned_data import DEFAULT_CITY, PARTITION_ROOT, PartitionWriter
+
+CHUNK_ROWS = 5_000
+HEADER_SCAN_ROWS = 20
+REPLACED_ISSUE = "แทนที่ข้อมูลเดิมใน partition (สวน-ปี)"
+
+MONTH_NAMES = {
+    'january': 'jan', 'february': 'feb', 'march': 'mar', 'april': 'apr', 'june': 'jun', 'july': 'jul',
+    'august': 'aug', 'september': 'sep', 'october': 'oct', 'november': 'nov', 'december': 'dec'
+}
+
+COLUMN_ALIASES = {
+    'dis_trict': 'Dis_trict', 'district': 'Dis_trict', 'park': 'Dis_trict', 'สถานที่': 'Dis_trict', 'สวน': 'Dis_trict',
+    'ปี': 'ปี', 'year': 'ปี', 'ปี_พ.ศ.': 'ปี',
+}
+
+
+def _column_key(name):
+    key = re.sub(r'[\s\-]+', '_', str(name).strip()).lower()
+    month, _, rest = key.partition('_')
+    if month in MONTH_NAMES:
+        key = f"{MONTH_NAMES[month]}_{rest}"
+    return key
+
+
+_RAW_KEYS = {_column_key(column): column for column in RAW_COLUMNS}
+
+
+def map_columns(header):
+    """Map header cells onto AllParkYear columns: {AllParkYear column: position}"""
+    mapping = {}
+    for position, cell in enumerate(header):
+        if cell is None:
+            continue
+        key = _column_key(cell)
+        column = COLUMN_ALIASES.get(key) or _RAW_KEYS.get(key)
+        if column is not None and column not in mapping:
+            mapping[column] = position
+    return mapping
+
+
+def _sheet_year(title):
+    """Buddhist-era year from a sheet title such as "2566" or "2023" (None if there is none)"""
+    match = re.search(r'(?<!\d)(\d{4})(?!\d)', title)
+    if match is None:
+        return None
+    year = int(match.group(1))
+    return year + 543 if year < 2400 else year
+
+
+def iter_sheet_chunks(ws, chunk_rows=CHUNK_ROWS):
+    """Yield AllParkYear-shaped DataFrames of at most chunk_rows rows from one worksheet"""
+    # มิติของ sheet ในไฟล์อาจไม่ถูกต้อง ให้อ่านจนถึงแถวสุดท้ายจริง
+    ws.reset_dimensions()
+    rows = ws.iter_rows(values_only=True)
+
+    mapping = None
+    for _, header in zip(range(HEADER_SCAN_ROWS), rows):
+        candidate = map_columns(header)
+        if sum(column in candidate for column in METRIC_COLUMNS) >= len(MONTHS):
+            mapping = candidate
+            break
+    if mapping is None:
+        return
+
+    constants = {}
+    if 'Dis_trict' not in mapping:
+        constants['Dis_trict'] = ws.title.strip()
+    if 'ปี' not in mapping:
+        constants['ปี'] = _sheet_year(ws.title)
+
+    columns = list(mapping)
+    positions = list(mapping.values())
+
+    def frame(buffer):
+        chunk = pd.DataFrame(buffer, columns=columns).assign(**constants)
+        return chunk.reindex(columns=RAW_COLUMNS)
+
+    buffer = []
+    for row in rows:
+        values = [row[p] if p < len(row) else None for p in positions]
+        if all(v is None for v in values):
+            continue
+        buffer.append(values)
+        if len(buffer) >= chunk_rows:
+            yield frame(buffer)
+            buffer = []
+    if buffer:
+        yield frame(buffer)
+
+
+def _park_years(chunk):
+    """(สวน, ปี) of the chunk's rows that have a valid year"""
+    years = pd.to_numeric(chunk['ปี'], errors='coerce')
+    valid = years.notna()
+    return zip(chunk.loc[valid, 'Dis_trict'], years[valid].astype(int))
+
+
+def import_workbook(path, city=DEFAULT_CITY, root=PARTITION_ROOT, chunk_rows=CHUNK_ROWS):
+    """Stream every sheet of a workbook into partitions; returns an import report dict"""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    writer = PartitionWriter(city, root)
+    sheets, skipped, issues = {}, [], Counter()
+    # นับ (สวน, ปี) ข้ามทุก chunk และทุก sheet: แถวซ้ำที่อยู่คนละ chunk ก็ต้องถูกรายงาน
+    park_years = Counter()
+    try:
+        for ws in wb.worksheets:
+            rows = 0
+            for chunk in iter_sheet_chunks(ws, chunk_rows):
+                rows += len(chunk)
+                summary = validate_park_data(chunk)["summary"]
+                issues.update({k: v for k, v in summary.items() if k not in (DUPLICATE_ISSUE, UNKNOWN_PARK_ISSUE)})
+                park_years.update(_park_years(chunk))
+                writer.write(preprocess_park_data(chunk))
+            if rows:
+                sheets[ws.title] = rows
+            else:
+                skipped.append(ws.title)
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        wb.close()
+
+    duplicates = sorted(key for key, count in park_years.items() if count > 1)
+    unknown = sorted({park for park, _ in park_years if pd.notna(park)} - set(PARK_COORDINATES))
+    if duplicates:
+        issues[DUPLICATE_ISSUE] = len(duplicates)
+    if unknown:
+        issues[UNKNOWN_PARK_ISSUE] = len(unknown)
+
+    # close() รวมกับ partition เดิม จึงรู้ว่า (สวน, ปี) ใดทับข้อมูลที่นำเข้าไว้ก่อนหน้า
+    paths = writer.close()
+    replaced = sorted(writer.replaced)
+    if replaced:
+        issues[REPLACED_ISSUE] = len(replaced)
+
+    return {
+        "sheets": sheets,
+        "skipped": skipped,
+        "rows": writer.rows,
+        "issues": dict(issues),
+        "duplicates": duplicates,
+        "replaced": replaced,
+        "paths": paths,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream .xlsx workbooks into the partitioned dataset")
+    parser.add_argument("workbooks", nargs="+")
+    parser.add_argument("--city", default=DEFAULT_CITY, help="ชื่อเมือง/จังหวัดของข้อมูลชุดนี้")
+    parser.add_argument("--root", default=PARTITION_ROOT)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    for path in args.workbooks:
+        report = import_workbook(path, args.city, args.root, args.chunk_rows)
+        print(f"{path}: {report['rows']} แถวข้อมูลรายเดือน")
+        for title, rows in report["sheets"].items():
+            print(f"  sheet {title}: {rows} แถว")
+        for title in report["skipped"]:
+            print(f"  sheet {title}: ข้าม (ไม่พบหัวตารางแบบ AllParkYear)")
+        for issue, count in report["issues"].items():
+            print(f"  {issue}: {count}")
+        for park, year in report["duplicates"]:
+            print(f"  ซ้ำ: {park} ปี {year}")
+        for park, year in report["replaced"]:
+            print(f"  แทนที่ข้อมูลเดิม: {park} ปี {year}")
+        for written in report["paths"]:
+            print(f"  {written}")
+
+
+if __name__ == "__main__":
+    main()